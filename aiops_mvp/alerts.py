@@ -0,0 +1,306 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from assignment import assign_batch, capacity_index
+
+
+# القراءات الشاذة اللي بينها أقل من كذا دقيقة تعتبر نفس الحادثة (ونفس التذكرة)
+ALERT_COOLDOWN_MINUTES = int(os.environ.get("ALERT_COOLDOWN_MINUTES", "30"))
+
+# الحادثة الجديدة لازم يكون فيها كذا قراءة شاذة على الأقل (قراءة وحدة غالباً ضوضاء)
+ALERT_MIN_POINTS = int(os.environ.get("ALERT_MIN_POINTS", "2"))
+
+# الحادثة اللي فيها كذا قراءة أو أكثر تنرفع High
+ALERT_HIGH_POINTS = int(os.environ.get("ALERT_HIGH_POINTS", "6"))
+
+# حساب النظام (migrations/0003) والتصنيف اللي تروح له تذاكر الـ CPU
+ALERT_REPORTER_ID = int(os.environ.get("ALERT_REPORTER_ID", "0"))
+ALERT_CATEGORY = os.environ.get("ALERT_CATEGORY", "Cloud Computing")
+
+# مهمة التنبيهات (app.raise_anomaly_incidents) تقرأ الأجهزة اللي وصلتها قراءات خلال كذا دقيقة؛
+# النافذة أطول من فترة المهمة عشان تغيير القائد ما يضيّع قراءات (raise_incidents يتجاهل اللي انحسب قبل)
+ALERT_SCAN_MINUTES = int(os.environ.get("ALERT_SCAN_MINUTES", "60"))
+
+# حالات التذكرة اللي تعتبر فيها الحادثة مفتوحة (تتمدد بدل ما نفتح تذكرة جديدة)
+ALERT_OPEN_STATUSES = ('New', 'In Progress')
+
+MODEL_DIR = Path(__file__).resolve().parent / "cpu-anomaly-detection" / "model"
+
+
+# -----------------------------------
+#  تجميع القراءات الشاذة المتتالية لكل جهاز في حوادث (بدون DB)
+def group_incidents(timestamps, values, predictions, cooldown_minutes=ALERT_COOLDOWN_MINUTES, after=None):
+    # after: آخر قراءة انحسبت للجهاز من قبل، اللي قبلها ما نعيد حسابه
+    timestamps = np.asarray(timestamps, dtype="datetime64[ns]")
+    values = np.asarray(values, dtype=float)
+    mask = np.asarray(predictions) == -1
+    if after is not None:
+        mask &= timestamps > np.datetime64(after, "ns")
+
+    ts = timestamps[mask]
+    vals = values[mask]
+    if len(ts) == 0:
+        return []
+
+    order = np.argsort(ts, kind="stable")
+    ts, vals = ts[order], vals[order]
+
+    # فجوة أكبر من الـ cooldown تبدأ حادثة جديدة
+    cooldown = np.timedelta64(cooldown_minutes, "m")
+    breaks = np.flatnonzero(np.diff(ts) > cooldown) + 1
+    starts = np.concatenate([[0], breaks])
+    stops = np.concatenate([breaks, [len(ts)]])
+
+    return [
+        {
+            "started_at": ts[a].astype("datetime64[us]").item(),
+            "last_seen_at": ts[b - 1].astype("datetime64[us]").item(),
+            "points": int(b - a),
+            "peak_value": float(vals[a:b].max()),
+        }
+        for a, b in zip(starts, stops)
+    ]
+
+
+def _ticket_text(host, incident):
+    title = f"شذوذ في استهلاك CPU على {host}"
+    description = (
+        f"تم رصد {incident['points']} قراءة شاذة على {host} "
+        f"من {incident['started_at']:%Y-%m-%d %H:%M} إلى {incident['last_seen_at']:%Y-%m-%d %H:%M} "
+        f"(أعلى قيمة {incident['peak_value']:.3f})."
+    )
+    priority = "High" if incident["points"] >= ALERT_HIGH_POINTS else "Medium"
+    return title, description, priority
+
+
+# -----------------------------------
+#  من مخرجات predict_anomalies لكل جهاز إلى تذاكر:
+#  عدد الاستعلامات ثابت مهما كان عدد الأجهزة أو الحوادث
+def raise_incidents(conn, predictions, cooldown_minutes=ALERT_COOLDOWN_MINUTES, min_points=ALERT_MIN_POINTS):
+    # predictions: {host: DataFrame فيه timestamp, value, prediction}
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    hosts = list(predictions)
+
+    stats = {
+        "hosts": len(hosts),
+        "anomalies": 0,
+        "created": 0,
+        "extended": 0,
+        "suppressed": 0,
+        "assigned": 0,
+        "assigned_fallback": 0,
+        "unassigned": 0,
+    }
+
+    # تشغيلين بنفس الوقت ممكن يفتحون نفس الحادثة مرتين، فنمشيهم واحد واحد
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext('anomaly_incidents'))")
+
+    # آخر حادثة لكل جهاز؛ تعتبر مفتوحة إذا تذكرتها لسا شغالة (ALERT_OPEN_STATUSES)
+    cursor.execute("""
+        SELECT i.incident_id, i.host, i.last_seen_at, t.status
+        FROM (
+            SELECT DISTINCT ON (host) incident_id, host, last_seen_at, ticket_id
+            FROM anomaly_incidents
+            WHERE host = ANY(%s)
+            ORDER BY host, last_seen_at DESC
+        ) i
+        LEFT JOIN tickets t ON t.ticket_id = i.ticket_id
+    """, (hosts,))
+    latest = {row[1]: row for row in cursor.fetchall()}
+
+    cooldown = np.timedelta64(cooldown_minutes, "m")
+    new_rows = []
+    extend_rows = []
+
+    for host in hosts:
+        frame = predictions[host]
+        last = latest.get(host)
+        after = last[2] if last else None
+
+        incidents = group_incidents(
+            frame["timestamp"], frame["value"], frame["prediction"],
+            cooldown_minutes=cooldown_minutes, after=after
+        )
+        stats["anomalies"] += sum(i["points"] for i in incidents)
+
+        # أول حادثة تكمّل الحادثة المفتوحة إذا كانت ضمن الـ cooldown؛
+        # تذكرة مرفوضة أو محذوفة (status = NULL من الـ LEFT JOIN) = حادثة جديدة بتذكرة جديدة
+        if incidents and last and last[3] in ALERT_OPEN_STATUSES:
+            gap = np.datetime64(incidents[0]["started_at"]) - np.datetime64(last[2])
+            if gap <= cooldown:
+                first = incidents.pop(0)
+                extend_rows.append((last[0], first["last_seen_at"], first["points"], first["peak_value"]))
+
+        for incident in incidents:
+            if incident["points"] < min_points:
+                stats["suppressed"] += 1
+                continue
+            new_rows.append((host, incident) + _ticket_text(host, incident))
+
+    if extend_rows:
+        incident_ids, last_seen, points, peaks = zip(*extend_rows)
+        cursor.execute("""
+            UPDATE anomaly_incidents i
+            SET last_seen_at = GREATEST(i.last_seen_at, u.last_seen_at),
+                points = i.points + u.points,
+                peak_value = GREATEST(i.peak_value, u.peak_value)
+            FROM unnest(%s::int[], %s::timestamp[], %s::int[], %s::float8[])
+                 AS u(incident_id, last_seen_at, points, peak_value)
+            WHERE i.incident_id = u.incident_id
+        """, (list(incident_ids), list(last_seen), list(points), list(peaks)))
+        stats["extended"] = cursor.rowcount
+
+    ticket_ids = []
+    assignees = {}
+    if new_rows:
+        # رقم التذكرة ينحجز من الـ sequence قبل، عشان التذكرة والحادثة ينكتبون بنفس الجملة
+        cursor.execute("""
+            WITH new AS (
+                SELECT
+                    n.*,
+                    nextval(pg_get_serial_sequence('tickets', 'ticket_id')) AS ticket_id
+                FROM unnest(
+                    %(hosts)s::text[], %(started)s::timestamp[], %(last_seen)s::timestamp[],
+                    %(points)s::int[], %(peaks)s::float8[],
+                    %(titles)s::text[], %(descriptions)s::text[], %(priorities)s::text[]
+                ) AS n(host, started_at, last_seen_at, points, peak_value, title, description, priority)
+            ),
+            created AS (
+                INSERT INTO tickets
+                (ticket_id, employee_id, title, description, category, priority, status, created_at)
+                SELECT ticket_id, %(reporter)s, title, description, %(category)s, priority, 'New', NOW()
+                FROM new
+            )
+            INSERT INTO anomaly_incidents (host, started_at, last_seen_at, points, peak_value, ticket_id)
+            SELECT host, started_at, last_seen_at, points, peak_value, ticket_id
+            FROM new
+            RETURNING ticket_id
+        """, {
+            "hosts": [r[0] for r in new_rows],
+            "started": [r[1]["started_at"] for r in new_rows],
+            "last_seen": [r[1]["last_seen_at"] for r in new_rows],
+            "points": [r[1]["points"] for r in new_rows],
+            "peaks": [r[1]["peak_value"] for r in new_rows],
+            "titles": [r[2] for r in new_rows],
+            "descriptions": [r[3] for r in new_rows],
+            "priorities": [r[4] for r in new_rows],
+            "reporter": ALERT_REPORTER_ID,
+            "category": ALERT_CATEGORY,
+        })
+        ticket_ids = [r[0] for r in cursor.fetchall()]
+        stats["created"] = len(ticket_ids)
+
+        # نفس توزيع assign_ticket_auto (التخصص ثم 'Other'، الأقل حملاً أول) بس للدفعة كلها
+        assigned = assign_batch(cursor, ticket_ids)
+        remaining = [t for t in ticket_ids if t not in assigned]
+        fallback = assign_batch(cursor, remaining, specialization='Other')
+
+        stats["assigned"] = len(assigned)
+        stats["assigned_fallback"] = len(fallback)
+        stats["unassigned"] = len(remaining) - len(fallback)
+        assignees = {**assigned, **fallback}
+
+    conn.commit()
+
+    # assign_batch يعدّل it_team مباشرة، فنحدّث فهرس السعة في هذا الـ process
+    if stats["assigned"] or stats["assigned_fallback"]:
+        capacity_index.resync(conn)
+        conn.commit()
+
+    stats["ticket_ids"] = ticket_ids
+    # {ticket_id: employee_id}: المستدعي ينبّه الموظفين ويمسح كاش لوحاتهم (app.ticket_assigned)
+    stats["assignees"] = assignees
+    stats["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return stats
+
+
+# -----------------------------------
+#  نتائج /api/anomaly/score المحفوظة لكل جهاز (anomaly_host_state.recent) بنفس شكل predictions
+def recent_predictions(cursor, minutes=ALERT_SCAN_MINUTES):
+    import pandas as pd
+
+    cursor.execute("""
+        SELECT host, recent
+        FROM anomaly_host_state
+        WHERE updated_at >= NOW() - %s * INTERVAL '1 minute'
+    """, (minutes,))
+
+    predictions = {}
+    for host, recent in cursor.fetchall():
+        frame = pd.DataFrame(recent, columns=["timestamp", "value", "score", "prediction"])
+        if not (frame["prediction"] == -1).any():
+            continue
+
+        # القراءات اللي انرسلت بدون timestamp ما نقدر نرتبها بالوقت ولا نحسب لها cooldown
+        timestamps = pd.to_datetime(frame["timestamp"], errors="coerce", utc=True)
+        frame["timestamp"] = timestamps.dt.tz_localize(None)
+        frame = frame.dropna(subset=["timestamp"])
+        if len(frame):
+            predictions[host] = frame
+
+    return predictions
+
+
+# -----------------------------------
+#  تشغيل من سطر الأوامر: كل CSV = جهاز، نقيّمه بالمودل ونرفع الحوادث
+def score_csv(paths):
+    sys.path.insert(0, str(MODEL_DIR))
+    import pandas as pd
+    from artifact import ArtifactError, load_artifact
+    from features import add_features
+    from ingest import load_series
+
+    try:
+        model, scaler = load_artifact(), None
+        feature_cols = model.feature_cols
+    except ArtifactError:
+        import joblib
+        artifacts = joblib.load(MODEL_DIR / "cpu_anomaly_iso_forest.pkl")
+        model, scaler, feature_cols = artifacts["model"], artifacts["scaler"], artifacts["feature_cols"]
+
+    predictions = {}
+    for path in paths:
+        series = load_series(path)
+        df = add_features(pd.DataFrame({"timestamp": series.timestamps, "value": series.values}), feature_cols)
+        X = df[feature_cols].fillna(0).values
+        df["prediction"] = model.predict(X if scaler is None else scaler.transform(X))
+        predictions[Path(path).stem] = df
+
+    return predictions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Score CPU metric CSVs and open one ticket per anomaly incident")
+    parser.add_argument("csv", nargs="*", help="metric files (default: every CSV in cpu-anomaly-detection/data)")
+    parser.add_argument("--cooldown", type=int, default=ALERT_COOLDOWN_MINUTES, help="minutes")
+    parser.add_argument("--min-points", type=int, default=ALERT_MIN_POINTS)
+    args = parser.parse_args()
+
+    import psycopg2
+    from db import DB_CONFIG
+
+    paths = args.csv or sorted((MODEL_DIR.parent / "data").glob("*.csv"))
+    predictions = score_csv(paths)
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        stats = raise_incidents(conn, predictions, args.cooldown, args.min_points)
+        # بدون التطبيق: التنبيه (NOTIFY يوصل الـ SSE عند كل الـ workers)، وكاش اللوحات ينتهي بالـ TTL
+        if stats["assignees"]:
+            from notifications import ASSIGNED_MESSAGE, write_notifications
+            write_notifications(conn.cursor(), [
+                (employee_id, ticket_id, ASSIGNED_MESSAGE) for ticket_id, employee_id in stats["assignees"].items()
+            ])
+            conn.commit()
+    finally:
+        conn.close()
+
+    stats.pop("ticket_ids")
+    stats.pop("assignees")
+    print(stats)
@@ -0,0 +1,276 @@
+import hmac
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+
+MODEL_DIR = Path(__file__).resolve().parent / "cpu-anomaly-detection" / "model"
+
+# آخر كذا نتيجة نحفظها لكل جهاز (288 = يوم كامل بقراءات كل 5 دقائق)
+ANOMALY_HISTORY = int(os.environ.get("ANOMALY_HISTORY", "288"))
+
+# أقصى عدد قراءات في الطلب الواحد (كل الأجهزة)
+ANOMALY_MAX_READINGS = int(os.environ.get("ANOMALY_MAX_READINGS", "50000"))
+
+# كل كم ثانية نتأكد إذا انبدّل الـ artifact (train.py --install) ونحمّل الجديد
+ANOMALY_MODEL_CHECK_SECONDS = float(os.environ.get("ANOMALY_MODEL_CHECK_SECONDS", "30"))
+
+# جهاز ما وصلت له قراءات من كذا ساعة تنمسح حالته (expire_hosts)
+ANOMALY_HOST_IDLE_HOURS = float(os.environ.get("ANOMALY_HOST_IDLE_HOURS", "24"))
+
+# token للأنظمة اللي ترسل القراءات بدون session (فاضي = بس المستخدمين المسجلين)
+ANOMALY_API_TOKEN = os.environ.get("ANOMALY_API_TOKEN", "")
+
+
+class ModelUnavailable(Exception):
+    pass
+
+
+def token_ok(header):
+    if not ANOMALY_API_TOKEN or not header or not header.startswith("Bearer "):
+        return False
+    return hmac.compare_digest(header[len("Bearer "):].encode(), ANOMALY_API_TOKEN.encode())
+
+
+# -----------------------------------
+#  قراءة الطلب: {"hosts": {"i-1": [0.1, ...]}} أو {"hosts": {"i-1": {"values": [...], "timestamps": [...]}}}
+def parse_readings(payload, max_readings=ANOMALY_MAX_READINGS):
+    hosts = payload.get("hosts") if isinstance(payload, dict) else None
+    if not isinstance(hosts, dict) or not hosts:
+        raise ValueError("body must be {\"hosts\": {host_id: [values...]}}")
+
+    readings = {}
+    total = 0
+    for host, item in hosts.items():
+        if isinstance(item, dict):
+            values, timestamps = item.get("values"), item.get("timestamps")
+        else:
+            values, timestamps = item, None
+
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"host '{host}': values must be a non-empty list")
+        if timestamps is not None and (not isinstance(timestamps, list) or len(timestamps) != len(values)):
+            raise ValueError(f"host '{host}': timestamps must match values")
+
+        try:
+            values = [float(v) for v in values]
+        except (TypeError, ValueError):
+            raise ValueError(f"host '{host}': values must be numbers")
+        if not all(math.isfinite(v) for v in values):
+            raise ValueError(f"host '{host}': values must be finite")
+
+        total += len(values)
+        if total > max_readings:
+            raise ValueError(f"too many readings (max {max_readings} per request)")
+
+        readings[str(host)] = (values, timestamps)
+
+    return readings
+
+
+# -----------------------------------
+#  مودل واحد لكل process (للقراءة فقط)، وحالة الـ rolling لكل جهاز بالقاعدة (anomaly_host_state):
+#  مع أكثر من worker قراءات الجهاز الواحد تتوزع عليهم، فلو الحالة بذاكرة كل process
+#  كل واحد يقيّم نافذة ناقصة مختلفة، وتكبر مع كل اسم جهاز يرسله أي عميل
+class AnomalyService:
+
+    def __init__(self, history=ANOMALY_HISTORY, check_seconds=ANOMALY_MODEL_CHECK_SECONDS):
+        self.history = history
+        self.check_seconds = check_seconds
+        self.detector = None
+        self.version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if str(MODEL_DIR) not in sys.path:
+            sys.path.insert(0, str(MODEL_DIR))
+        from artifact import ArtifactError, load_artifact
+
+        try:
+            # load_artifact يرجع نفس الكائن ما دام الـ metadata ما تغيّر
+            forest = load_artifact()
+            return forest, None, forest.feature_cols, forest.metadata["source_sha256"][:12]
+        except ArtifactError:
+            pass
+
+        # بدون artifact: الـ pickle (أبطأ بكثير بالتحميل، فما نعيد تحميله إلا إذا تغيّر الملف)
+        path = MODEL_DIR / "cpu_anomaly_iso_forest.pkl"
+        try:
+            version = f"pickle:{path.stat().st_mtime_ns}"
+        except FileNotFoundError:
+            raise ModelUnavailable(f"no model artifact or pickle in {MODEL_DIR}")
+        if self.detector is not None and self.version == version:
+            return self.detector.model, self.detector.scaler, self.detector.feature_cols, version
+
+        try:
+            import joblib
+        except ImportError as e:
+            raise ModelUnavailable(str(e))
+        artifacts = joblib.load(path)
+        return artifacts["model"], artifacts["scaler"], artifacts["feature_cols"], version
+
+    def _ensure_model(self):
+        # داخل الـ lock
+        now = time.monotonic()
+        if self.detector is not None and now - self._checked_at < self.check_seconds:
+            return
+        self._checked_at = now
+
+        # _load يضيف MODEL_DIR لـ sys.path، فالاستيراد بعده
+        model, scaler, feature_cols, version = self._load()
+        from streaming import StreamingDetector
+
+        if self.detector is not None and self.detector.model is model:
+            return
+
+        # الـ detector هنا يشيل المودل بس؛ حالة الأجهزة تنقرأ من القاعدة لكل طلب
+        self.detector = StreamingDetector(model, scaler, feature_cols)
+        self.version = version
+
+    def score(self, readings, stateless=False, cursor=None):
+        # readings: ناتج parse_readings
+        # stateless: تقييم السلسلة كاملة بدون ما نلمس حالة الأجهزة (مثلاً الداشبورد)
+        # غير كذا cursor لازم، والمستدعي يسوي commit (الأقفال والحالة بنفس الـ transaction)
+        with self._lock:
+            self._ensure_model()
+            detector, version = self.detector, self.version
+        model = (detector.model, detector.scaler, detector.feature_cols)
+
+        # المودل نفسه للقراءة فقط، فالتقييم برا الـ lock
+        if stateless:
+            results = _score_series(*model, readings)
+        else:
+            results = self._score_stateful(cursor, model, version, readings)
+
+        return {
+            "model": version,
+            "hosts": {
+                host: {
+                    "predictions": r["prediction"].tolist(),
+                    "scores": np.round(r["score"], 6).tolist(),
+                    "anomalies": int((r["prediction"] == -1).sum()),
+                }
+                for host, r in results.items()
+            },
+        }
+
+    def _score_stateful(self, cursor, model, version, readings):
+        from streaming import SeriesState, StreamingDetector
+
+        model, scaler, feature_cols = model
+        hosts = sorted(readings)
+
+        # قفل لكل جهاز لين الـ commit: طلبين لنفس الجهاز (ولو من workers مختلفة) يمشون ورا بعض.
+        # بترتيب المفتاح عشان ما يصير deadlock بين طلبات فيها نفس الأجهزة
+        cursor.execute("""
+            SELECT pg_advisory_xact_lock(k)
+            FROM (
+                SELECT DISTINCT hashtext('anomaly_host:' || h) AS k
+                FROM unnest(%s::text[]) AS h
+                ORDER BY k
+            ) keys
+        """, (hosts,))
+        cursor.execute("""
+            SELECT host, feature_cols, state, points, recent
+            FROM anomaly_host_state
+            WHERE host = ANY(%s)
+        """, (hosts,))
+        stored = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        detector = StreamingDetector(model, scaler, feature_cols)
+        saved = {}
+        for host in hosts:
+            row = stored.get(host)
+            # features مختلفة (مودل جديد بـ spec ثاني) = الحالة القديمة ما تنفع، نبدأ من جديد
+            if row is not None and list(row[0]) == detector.feature_cols:
+                detector.series[host] = SeriesState.from_dict(feature_cols, row[1])
+                saved[host] = (row[2], deque(row[3], maxlen=self.history))
+            else:
+                saved[host] = (0, deque(maxlen=self.history))
+
+        results = detector.update_many({h: readings[h][0] for h in hosts})
+
+        states, points, recent = [], [], []
+        for host in hosts:
+            values, timestamps = readings[host]
+            r = results[host]
+            count, rows = saved[host]
+            rows.extend(zip(timestamps or [None] * len(values), values,
+                            r["score"].tolist(), r["prediction"].tolist()))
+            states.append(json.dumps(detector.series[host].to_dict()))
+            points.append(count + len(values))
+            recent.append(json.dumps(list(rows)))
+
+        cursor.execute("""
+            INSERT INTO anomaly_host_state AS s (host, model, feature_cols, state, points, recent, updated_at)
+            SELECT h, %s, %s, st, p, r, NOW()
+            FROM unnest(%s::text[], %s::json[], %s::bigint[], %s::json[]) AS u(h, st, p, r)
+            ON CONFLICT (host) DO UPDATE
+            SET model = EXCLUDED.model,
+                feature_cols = EXCLUDED.feature_cols,
+                state = EXCLUDED.state,
+                points = EXCLUDED.points,
+                recent = EXCLUDED.recent,
+                updated_at = EXCLUDED.updated_at
+        """, (version, list(feature_cols), hosts, states, points, recent))
+        return results
+
+    def host(self, cursor, host, limit=None):
+        cursor.execute("""
+            SELECT model, points, recent
+            FROM anomaly_host_state
+            WHERE host = %s
+        """, (host,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        version, points, recent = row
+
+        rows = [
+            {"timestamp": ts, "value": value, "score": round(score, 6), "prediction": prediction}
+            for ts, value, score, prediction in recent
+        ]
+        return {
+            "host": host,
+            "model": version,
+            "points": points,
+            "last": rows[-1] if rows else None,
+            # الشذوذ ضمن آخر ANOMALY_HISTORY قراءة
+            "anomalies": sum(1 for row in rows if row["prediction"] == -1),
+            "recent": rows if limit is None else rows[len(rows) - min(limit, len(rows)):],
+        }
+
+
+def expire_hosts(cursor, idle_hours=ANOMALY_HOST_IDLE_HOURS):
+    # الأجهزة اللي وقفت ترسل (أو أسماء أرسلها عميل مرة وحدة) ما تبقى للأبد
+    cursor.execute(
+        "DELETE FROM anomaly_host_state WHERE updated_at < NOW() - %s * INTERVAL '1 hour'",
+        (idle_hours,)
+    )
+    return cursor.rowcount
+
+
+def _score_series(model, scaler, feature_cols, readings):
+    from features import compute_features
+
+    hosts = list(readings)
+    arrays = [np.asarray(readings[h][0], dtype=float) for h in hosts]
+    X = compute_features(np.concatenate(arrays), [len(a) for a in arrays], feature_cols)
+    scores = model.decision_function(X if scaler is None else scaler.transform(X))
+
+    results = {}
+    bounds = np.cumsum([0] + [len(a) for a in arrays])
+    for host, start, stop in zip(hosts, bounds[:-1], bounds[1:]):
+        results[host] = {"score": scores[start:stop], "prediction": np.where(scores[start:stop] < 0, -1, 1)}
+    return results
+
+
+service = AnomalyService()
@@ -1,8 +1,23 @@
-from flask import Flask, render_template, request, redirect, session, jsonify
-import psycopg2
-from apscheduler.schedulers.background import BackgroundScheduler
+from flask import Flask, render_template, request, redirect, session, jsonify, Response, g
+import os
 import re 
 
+from cache import TTLCache
+import metrics
+from db import init_app, get_db, web_db, jobs_db, notify_db
+from auth import login_required, it_required, api_login_required, api_it_required, remember_role, current_role
+from notifications import notifier, fetch_unread, unread_count, mark_read, stream_notifications, ASSIGNED_MESSAGE
+from pagination import PAGE_SIZE, InvalidCursor, encode_cursor, decode_cursor, page_limit, split_page
+from assignment import (
+    reassign_expired, assign_ticket_auto, release_agent,
+    capacity_index, CAPACITY_RESYNC_SECONDS
+)
+from chat import chat_writer, write_messages, fetch_since, stream_chat, CHAT_MAX_LENGTH
+import anomaly
+import alerts
+from retention import run_retention, RETENTION_INTERVAL_HOURS
+from jobs import JobRunner
+
 def contains_arabic(text):
     return bool(re.search(r'[\u0600-\u06FF]', text or ""))
 
@@ -10,13 +25,11 @@ def contains_arabic(text):
 app = Flask(__name__)
 app.secret_key = "secret_key_for_session"
 
-conn = psycopg2.connect(
-    host="localhost",
-    database="aiops_tickets",
-    user="postgres",
-    password="postghaida"
-)
-cursor = conn.cursor()
+init_app(app)
+metrics.init_app(app)
+
+# كاش لوحة الـ IT لكل موظف؛ أي تعديل على تذاكره يمسحه
+dashboard_cache = TTLCache(ttl=float(os.environ.get("DASHBOARD_CACHE_TTL", "5")))
 
 # -----------------------------------
 @app.route('/')
@@ -54,11 +67,17 @@ def login():
                 employee_value=employee_value
             )
 
+        conn = get_db()
+        cursor = conn.cursor()
+
         try:
+            # الصلاحية والتخصص نجيبها مع المستخدم ونحفظها في الـ session
             cursor.execute("""
-                SELECT employee_id, name 
-                FROM employees 
-                WHERE employee_id=%s AND password=%s
+                SELECT e.employee_id, e.name, it.specialization, it.employee_id
+                FROM employees e
+                LEFT JOIN it_team it 
+                    ON it.employee_id = e.employee_id
+                WHERE e.employee_id=%s AND e.password=%s
             """, (employee_id, password))
 
             user = cursor.fetchone()
@@ -66,16 +85,15 @@ def login():
             if user:
                 session['employee_id'] = user[0]
                 session['employee_name'] = user[1]
+                remember_role(user[2] if user[3] is not None else None)
 
-                cursor.execute("SELECT 1 FROM it_team WHERE employee_id=%s", (employee_id,))
-                is_it = cursor.fetchone()
-
-                return redirect('/dashboard' if is_it else '/create_ticket')
+                return redirect('/dashboard' if session['is_it'] else '/create_ticket')
 
             error_msg = "عذراً! اسم المستخدم أو كلمة المرور غير صحيحة، فضلاً تأكد من صحة المعلومات المدخلة."
 
-        except Exception as e:
+        except Exception:
             conn.rollback()
+            app.logger.exception("LOGIN ERROR")
             error_msg = "حدث خطأ في الاتصال بقاعدة البيانات، الرجاء المحاولة مرة أخرى."
 
     return render_template(
@@ -92,14 +110,22 @@ def logout():
     session.clear()
     return redirect('/login')
 
+# -----------------------------------
+#  كل تذكرة تنوزّع على موظف (من الفورم أو من حوادث الـ CPU): تنبيه له، ولوحته تنعرض من جديد
+def ticket_assigned(ticket_id, assignee):
+    dashboard_cache.invalidate(assignee)
+    notifier.send(assignee, ticket_id, ASSIGNED_MESSAGE)
+
+
 # -----------------------------------
 #  رفع البلاغ
 @app.route('/create_ticket', methods=['GET', 'POST'])
+@login_required
 def create_ticket():
-    if 'employee_id' not in session:
-        return redirect('/login')
-
     if request.method == 'POST':
+        conn = get_db()
+        cursor = conn.cursor()
+
         cursor.execute("""
             INSERT INTO tickets 
             (employee_id, title, description, category, priority, status, created_at)
@@ -116,7 +142,9 @@ def create_ticket():
         ticket_id = cursor.fetchone()[0]
         conn.commit()
 
-        assign_ticket_auto(ticket_id, request.form['category'])
+        assignee = assign_ticket_auto(conn, ticket_id, request.form['category'])
+        if assignee:
+            ticket_assigned(ticket_id, assignee)
 
         return redirect('/my_tickets')
 
@@ -124,13 +152,12 @@ def create_ticket():
 
 
 # -----------------------------------
-#  بلاغاتي
-@app.route('/my_tickets')
-def my_tickets():
-    if 'employee_id' not in session:
-        return redirect('/login')
+#  بلاغاتي (صفحة صفحة بالـ keyset على created_at + ticket_id)
+def fetch_my_tickets(cursor, employee_id, after=None, limit=PAGE_SIZE):
+    position = decode_cursor(after)
+    keyset = "AND (t.created_at, t.ticket_id) < (%s, %s)" if position else ""
 
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT 
             t.ticket_id,      -- 0
             t.title,          -- 1
@@ -145,10 +172,12 @@ def my_tickets():
         LEFT JOIN employees e 
             ON t.assigned_to = e.employee_id
         WHERE t.employee_id = %s
-        ORDER BY t.created_at DESC
-    """, (session['employee_id'],))
+          {keyset}
+        ORDER BY t.created_at DESC, t.ticket_id DESC
+        LIMIT %s
+    """, (employee_id, *(position or ()), limit + 1))
 
-    rows = cursor.fetchall()
+    rows, next_cursor = split_page(cursor.fetchall(), limit, 3, 0)
 
     tickets = [{
         "ticket_id":       r[0],
@@ -161,157 +190,270 @@ def my_tickets():
         "priority":        r[8],
     } for r in rows]
 
+    return tickets, next_cursor
+
+
+@app.route('/my_tickets')
+@login_required
+def my_tickets():
+    conn = get_db()
+    cursor = conn.cursor()
+
+    tickets, next_cursor = fetch_my_tickets(cursor, session['employee_id'])
+
     return render_template(
         'my_tickets.html',
         tickets=tickets,
+        next_cursor=next_cursor,
         user_name=session['employee_name']
     )
 
+
+@app.route('/api/my_tickets')
+@api_login_required
+def my_tickets_page():
+    try:
+        tickets, next_cursor = fetch_my_tickets(
+            get_db().cursor(),
+            session['employee_id'],
+            request.args.get('cursor'),
+            page_limit(request.args.get('limit'))
+        )
+    except InvalidCursor:
+        return jsonify({"error": "cursor is not valid"}), 400
+
+    return jsonify({
+        "items": [dict(t, created_at=str(t["created_at"])) for t in tickets],
+        "next_cursor": next_cursor
+    })
+
+# -----------------------------------
+#  آخر رسائل المحادثة؛ الأقدم تنطلب بالـ cursor (sent_at + message_id)
+def fetch_messages(cursor, ticket_id, before=None, limit=PAGE_SIZE):
+    position = decode_cursor(before)
+    keyset = "AND (m.sent_at, m.message_id) < (%s, %s)" if position else ""
+
+    cursor.execute(f"""
+        SELECT m.message_id, e.name, m.message_text, m.sent_at
+        FROM messages m
+        LEFT JOIN employees e ON m.sender_id = e.employee_id
+        WHERE m.ticket_id=%s
+          {keyset}
+        ORDER BY m.sent_at DESC, m.message_id DESC
+        LIMIT %s
+    """, (ticket_id, *(position or ()), limit + 1))
+
+    rows, older_cursor = split_page(cursor.fetchall(), limit, 3, 0)
+
+    # نعرضها من الأقدم للأحدث مثل قبل
+    messages = [{
+        "id": r[0],
+        "sender_name": r[1],
+        "text": r[2],
+        "time": r[3]
+    } for r in reversed(rows)]
+
+    return messages, older_cursor
+
+
 # -----------------------------------
 #  الشات + التنبيهات
 @app.route('/chat/<int:ticket_id>', methods=['GET', 'POST'])
+@login_required
 def chat(ticket_id):
-    if 'employee_id' not in session:
-        return redirect('/login')
-
     employee_id = session['employee_id']
     employee_name = session['employee_name']
 
-    cursor.execute("SELECT 1 FROM it_team WHERE employee_id=%s", (employee_id,))
-    is_it = cursor.fetchone() is not None
+    conn = get_db()
+    cursor = conn.cursor()
 
     if request.method == 'POST':
+        # بدون JavaScript: الفورم يكتب الرسالة مباشرة (الصفحة تنعرض بعدها فلازم تكون موجودة)
         message_text = request.form['message_text']
 
         try:
-            cursor.execute("""
-                INSERT INTO messages (ticket_id, sender_id, message_text)
-                VALUES (%s, %s, %s)
-            """, (ticket_id, employee_id, message_text))
-
-            cursor.execute("""
-                SELECT employee_id, assigned_to
-                FROM tickets 
-                WHERE ticket_id = %s
-            """, (ticket_id,))
-
-            owner_id, assigned_to = cursor.fetchone()
-            receiver_id = owner_id if assigned_to == employee_id else assigned_to
-
-            if receiver_id:
-                cursor.execute("""
-                    INSERT INTO notifications 
-                    (receiver_id, ticket_id, message, is_read, created_at)
-                    VALUES (%s, %s, %s, FALSE, NOW())
-                """, (
-                    receiver_id,
-                    ticket_id,
-                    f"📩 رسالة جديدة من {employee_name}"
-                ))
-
+            write_messages(cursor, [(ticket_id, employee_id, message_text)])
             conn.commit()
-
-        except Exception as e:
+        except Exception:
             conn.rollback()
-            print("CHAT ERROR:", e)
+            app.logger.exception("CHAT ERROR")
 
         return redirect(f'/chat/{ticket_id}')
 
-    cursor.execute("""
-        SELECT m.sender_id, e.name, m.message_text, m.sent_at
-        FROM messages m
-        LEFT JOIN employees e ON m.sender_id = e.employee_id
-        WHERE m.ticket_id=%s
-        ORDER BY m.sent_at ASC
-    """, (ticket_id,))
-
-    rows = cursor.fetchall()
-    messages = [{
-        "sender_name": r[1],
-        "text": r[2],
-        "time": r[3]
-    } for r in rows]
+    messages, older_cursor = fetch_messages(cursor, ticket_id)
 
     return render_template(
         'chat.html',
         ticket_id=ticket_id,
         messages=messages,
+        older_cursor=older_cursor,
+        last_message_id=messages[-1]["id"] if messages else 0,
         user_name=employee_name,
-        is_it=is_it
+        employee_id=employee_id,
+        is_it=g.is_it
     )
 
-# -----------------------------------
-#  IT dashboard
-@app.route('/dashboard')
-def dashboard():
-    if 'employee_id' not in session:
-        return redirect('/login')
 
-    employee_id = session['employee_id']
+# -----------------------------------
+#  الشات اللحظي: الإرسال يرجع فوراً والرسالة تنكتب دفعة مع غيرها (chat.ChatWriter)
+#  وتوصل لكل الصفحات المفتوحة على التذكرة عبر /chat/<id>/stream
+@app.route('/api/chat/<int:ticket_id>/messages', methods=['POST'])
+@api_login_required
+def chat_send(ticket_id):
+    payload = request.get_json(silent=True) or {}
+    text = payload.get('text')
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({"error": "text is required"}), 400
+    if len(text) > CHAT_MAX_LENGTH:
+        return jsonify({"error": f"text is longer than {CHAT_MAX_LENGTH} characters"}), 400
+
+    chat_writer.send(ticket_id, session['employee_id'], text)
+    return jsonify({"queued": True}), 202
+
+
+@app.route('/chat/<int:ticket_id>/stream')
+@api_login_required
+def chat_stream(ticket_id):
+    # EventSource يرسل Last-Event-ID تلقائياً لما يعيد الاتصال
+    after = request.headers.get('Last-Event-ID') or request.args.get('after') or 0
+    try:
+        after = int(after)
+    except ValueError:
+        return jsonify({"error": "after must be a message id"}), 400
+
+    return Response(
+        stream_chat(ticket_id, after),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
 
-    cursor.execute("SELECT 1 FROM it_team WHERE employee_id=%s", (employee_id,))
-    if not cursor.fetchone():
-        return "لا تملك صلاحية الدخول"
 
-    cursor.execute("""
-        SELECT COUNT(*) 
-        FROM tickets 
-        WHERE status='In Progress' AND assigned_to=%s
-    """, (employee_id,))
-    active = cursor.fetchone()[0]
+@app.route('/api/chat/<int:ticket_id>/messages')
+@api_login_required
+def chat_messages_page(ticket_id):
+    # ?after=<message_id>: الجديد بعد آخر رسالة (للمتصفحات بدون EventSource)
+    after = request.args.get('after', type=int)
+    if after is not None:
+        messages, more = fetch_since(get_db().cursor(), ticket_id, after)
+        return jsonify({"items": messages, "more": more})
 
-    cursor.execute("""
-        SELECT COUNT(*) 
-        FROM tickets 
-        WHERE status='New' AND assigned_to=%s
-    """, (employee_id,))
-    new = cursor.fetchone()[0]
+    try:
+        messages, older_cursor = fetch_messages(
+            get_db().cursor(),
+            ticket_id,
+            request.args.get('cursor'),
+            page_limit(request.args.get('limit'))
+        )
+    except InvalidCursor:
+        return jsonify({"error": "cursor is not valid"}), 400
 
-    cursor.execute("""
-        SELECT COUNT(*) 
-        FROM tickets 
-        WHERE status='Resolved' AND assigned_to=%s
-    """, (employee_id,))
-    resolved = cursor.fetchone()[0]
+    return jsonify({
+        "items": [dict(m, time=str(m["time"])) for m in messages],
+        "next_cursor": older_cursor
+    })
 
+# -----------------------------------
+#  بيانات لوحة الـ IT: العدادات والقوائم كلها من query وحدة
+def load_dashboard_data(cursor, employee_id):
     cursor.execute("""
+        WITH counts AS (
+            SELECT 
+                COUNT(*) FILTER (WHERE status='In Progress') AS active,
+                COUNT(*) FILTER (WHERE status='New')         AS new,
+                COUNT(*) FILTER (WHERE status='Resolved')    AS resolved
+            FROM tickets
+            WHERE assigned_to=%(employee_id)s
+              AND status IN ('New', 'In Progress', 'Resolved')
+        ),
+        shown AS (
+            (
+                SELECT ticket_id, title, status, employee_id, assigned_to,
+                       description, category, priority, created_at
+                FROM tickets
+                WHERE assigned_to=%(employee_id)s
+                  AND status IN ('New', 'In Progress')
+            )
+            UNION ALL
+            (
+                -- المحلولة: أول صفحة بس، والباقي من /api/dashboard/resolved
+                SELECT ticket_id, title, status, employee_id, assigned_to,
+                       description, category, priority, created_at
+                FROM tickets
+                WHERE assigned_to=%(employee_id)s
+                  AND status='Resolved'
+                ORDER BY created_at DESC, ticket_id DESC
+                LIMIT %(resolved_limit)s
+            )
+        )
         SELECT 
-            t.ticket_id,       -- 0
-            t.title,           -- 1
-            t.status,          -- 2
-            owner.name,        -- 3  صاحب البلاغ
-            t.assigned_to,     -- 4
-            t.description,     -- 5
-            t.category,        -- 6
-            t.priority,        -- 7
-            t.created_at       -- 8
-        FROM tickets t
+            c.active,          -- 0
+            c.new,             -- 1
+            c.resolved,        -- 2
+            m.ticket_id,       -- 3
+            m.title,           -- 4
+            m.status,          -- 5
+            owner.name,        -- 6
+            m.assigned_to,     -- 7
+            m.description,     -- 8
+            m.category,        -- 9
+            m.priority,        -- 10
+            m.created_at       -- 11
+        FROM counts c
+        LEFT JOIN shown m ON TRUE
         LEFT JOIN employees owner 
-            ON t.employee_id = owner.employee_id
-        WHERE 
-            (t.status='New' AND t.assigned_to=%s)
-            OR
-            (t.status='In Progress' AND t.assigned_to=%s)
-        ORDER BY t.created_at DESC
-    """, (employee_id, employee_id))
+            ON m.employee_id = owner.employee_id
+        ORDER BY m.created_at DESC, m.ticket_id DESC
+    """, {"employee_id": employee_id, "resolved_limit": PAGE_SIZE + 1})
 
     rows = cursor.fetchall()
 
     tickets = []
+    resolved_list = []
     for r in rows:
-        tickets.append({
-            "ticket_id": r[0],
-            "title": r[1],
-            "status": r[2],
-            "owner_name": r[3],
-            "is_mine": (r[4] == employee_id),
-            "description": r[5],
-            "category": r[6],
-            "priority": r[7],
-            "created_at": r[8],
-        })
-
-    cursor.execute("""
+        if r[3] is None:
+            continue
+
+        ticket = {
+            "ticket_id": r[3],
+            "title": r[4],
+            "status": r[5],
+            "owner_name": r[6],
+            "description": r[8],
+            "category": r[9],
+            "priority": r[10],
+            "created_at": r[11],
+        }
+
+        if r[5] == 'Resolved':
+            resolved_list.append(ticket)
+        else:
+            ticket["is_mine"] = (r[7] == employee_id)
+            tickets.append(ticket)
+
+    resolved_next = None
+    if len(resolved_list) > PAGE_SIZE:
+        resolved_list = resolved_list[:PAGE_SIZE]
+        last = resolved_list[-1]
+        resolved_next = encode_cursor(last["created_at"], last["ticket_id"])
+
+    return {
+        "active": rows[0][0],
+        "new": rows[0][1],
+        "resolved": rows[0][2],
+        "tickets": tickets,
+        "resolved_list": resolved_list,
+        "resolved_next": resolved_next,
+    }
+
+
+def fetch_resolved(cursor, employee_id, after=None, limit=PAGE_SIZE):
+    position = decode_cursor(after)
+    keyset = "AND (t.created_at, t.ticket_id) < (%s, %s)" if position else ""
+
+    cursor.execute(f"""
         SELECT 
             t.ticket_id,       -- 0
             t.title,           -- 1
@@ -326,8 +468,12 @@ def dashboard():
             ON t.employee_id = owner.employee_id
         WHERE t.status='Resolved' 
           AND t.assigned_to=%s
-        ORDER BY t.created_at DESC
-    """, (employee_id,))
+          {keyset}
+        ORDER BY t.created_at DESC, t.ticket_id DESC
+        LIMIT %s
+    """, (employee_id, *(position or ()), limit + 1))
+
+    rows, next_cursor = split_page(cursor.fetchall(), limit, 7, 0)
 
     resolved_list = [{
         "ticket_id":   r[0],
@@ -338,47 +484,86 @@ def dashboard():
         "priority":    r[5],
         "status":      r[6],
         "created_at":  r[7],
-    } for r in cursor.fetchall()]
+    } for r in rows]
 
-    print("RESOLVED LIST >>>", resolved_list)   
+    return resolved_list, next_cursor
 
 
+# -----------------------------------
+#  IT dashboard
+@app.route('/dashboard')
+@it_required
+def dashboard():
+    employee_id = session['employee_id']
+
+    data = dashboard_cache.get(employee_id)
+    if data is None:
+        data = load_dashboard_data(get_db().cursor(), employee_id)
+        dashboard_cache.set(employee_id, data)
+
     return render_template(
         'dashboard.html',
-        active=active,
-        new=new,
-        resolved=resolved,
-        tickets=tickets,
-        resolved_list=resolved_list,
-        user_name=session['employee_name']
+        user_name=session['employee_name'],
+        **data
     )
 
 
+@app.route('/api/dashboard/resolved')
+@api_it_required
+def resolved_page():
+    try:
+        resolved_list, next_cursor = fetch_resolved(
+            get_db().cursor(),
+            session['employee_id'],
+            request.args.get('cursor'),
+            page_limit(request.args.get('limit'))
+        )
+    except InvalidCursor:
+        return jsonify({"error": "cursor is not valid"}), 400
+
+    return jsonify({
+        "items": [dict(t, created_at=str(t["created_at"])) for t in resolved_list],
+        "next_cursor": next_cursor
+    })
+
+
 # -----------------------------------
 # قبول التذكرة
 @app.route('/accept_ticket/<int:ticket_id>', methods=['POST'])
 def accept_ticket(ticket_id):
+    conn = get_db()
+    cursor = conn.cursor()
+
+    previous_id = None
     try:
+        # الموظف المعيّن قبل (لو غيرنا) يرجع من نفس الجملة عشان نمسح كاش لوحته
         cursor.execute("""
-            UPDATE tickets 
+            WITH previous AS (
+                SELECT assigned_to
+                FROM tickets
+                WHERE ticket_id = %s
+                FOR UPDATE
+            )
+            UPDATE tickets t
             SET assigned_to=%s, status='In Progress'
-            WHERE ticket_id=%s
-        """, (session['employee_id'], ticket_id))
+            FROM previous p
+            WHERE t.ticket_id=%s
+            RETURNING t.employee_id, p.assigned_to
+        """, (ticket_id, session['employee_id'], ticket_id))
 
-        cursor.execute("SELECT employee_id FROM tickets WHERE ticket_id=%s", (ticket_id,))
-        owner_id = cursor.fetchone()[0]
-
-        cursor.execute("""
-            INSERT INTO notifications 
-            (receiver_id, ticket_id, message, is_read, created_at)
-            VALUES (%s, %s, %s, FALSE, NOW())
-        """, (owner_id, ticket_id, "✅ تم استلام بلاغك"))
+        owner_id, previous_id = cursor.fetchone()
 
         conn.commit()
 
-    except Exception as e:
+        notifier.send(owner_id, ticket_id, "✅ تم استلام بلاغك")
+
+    except Exception:
         conn.rollback()
-        print("ACCEPT ERROR:", e)
+        app.logger.exception("ACCEPT ERROR")
+
+    dashboard_cache.invalidate(session['employee_id'])
+    if previous_id is not None and previous_id != session['employee_id']:
+        dashboard_cache.invalidate(previous_id)
 
     return redirect('/dashboard')
 
@@ -387,6 +572,9 @@ def accept_ticket(ticket_id):
 # إنهاء التذكرة
 @app.route('/resolve_ticket/<int:ticket_id>', methods=['POST'])
 def resolve_ticket(ticket_id):
+    conn = get_db()
+    cursor = conn.cursor()
+
     try:
        
         cursor.execute("UPDATE tickets SET status='Resolved' WHERE ticket_id=%s", (ticket_id,))
@@ -395,25 +583,21 @@ def resolve_ticket(ticket_id):
         cursor.execute("SELECT employee_id FROM tickets WHERE ticket_id=%s", (ticket_id,))
         owner_id = cursor.fetchone()[0]
 
-   
-        cursor.execute("""
-            INSERT INTO notifications 
-            (receiver_id, ticket_id, message, is_read, created_at)
-            VALUES (%s, %s, %s, FALSE, NOW())
-        """, (owner_id, ticket_id, "✅ تم إغلاق بلاغك بنجاح"))
-
     
-        cursor.execute("""
-            UPDATE it_team
-            SET workload = GREATEST(workload - 1, 0)
-            WHERE employee_id = %s
-        """, (session['employee_id'],))
+        workload = release_agent(cursor, session['employee_id'])
 
         conn.commit()
 
-    except Exception as e:
+        notifier.send(owner_id, ticket_id, "✅ تم إغلاق بلاغك بنجاح")
+
+        if workload is not None:
+            capacity_index.set_workload(session['employee_id'], workload)
+
+    except Exception:
         conn.rollback()
-        print("RESOLVE ERROR:", e)
+        app.logger.exception("RESOLVE ERROR")
+
+    dashboard_cache.invalidate(session['employee_id'])
 
     return redirect('/dashboard')
 
@@ -422,6 +606,9 @@ def resolve_ticket(ticket_id):
 
 @app.route('/reject_ticket/<int:ticket_id>', methods=['POST'])
 def reject_ticket(ticket_id):
+    conn = get_db()
+    cursor = conn.cursor()
+
     try:
         reason = request.form['reason']
         rejected_by = session['employee_id']  
@@ -439,135 +626,220 @@ def reject_ticket(ticket_id):
         cursor.execute("SELECT employee_id FROM tickets WHERE ticket_id=%s", (ticket_id,))
         owner_id = cursor.fetchone()[0]
 
-        cursor.execute("""
-            INSERT INTO notifications 
-            (receiver_id, ticket_id, message, is_read, created_at)
-            VALUES (%s, %s, %s, FALSE, NOW())
-        """, (
-            owner_id,
-            ticket_id,
-            " تم رفض بلاغك"
-        ))
-
     
-        cursor.execute("""
-            UPDATE it_team
-            SET workload = GREATEST(workload - 1, 0)
-            WHERE employee_id = %s
-        """, (rejected_by,))
+        workload = release_agent(cursor, rejected_by)
 
         conn.commit()
 
-    except Exception as e:
+        notifier.send(owner_id, ticket_id, " تم رفض بلاغك")
+
+        if workload is not None:
+            capacity_index.set_workload(rejected_by, workload)
+
+    except Exception:
         conn.rollback()
-        print("REJECT ERROR:", e)
+        app.logger.exception("REJECT ERROR")
+
+    dashboard_cache.invalidate(session['employee_id'])
 
     return redirect('/dashboard')
 
 
 # -----------------------------------
 @app.route('/get_notifications')
+@api_login_required
 def get_notifications():
-    cursor.execute("""
-        SELECT id, ticket_id, message
-        FROM notifications
-        WHERE receiver_id=%s AND is_read=FALSE
-        ORDER BY created_at DESC
-    """, (session['employee_id'],))
+    cursor = get_db().cursor()
 
-    data = cursor.fetchall()
+    data = fetch_unread(cursor, session['employee_id'])
 
     return jsonify({
-        "count": len(data),
+        "count": unread_count(cursor, session['employee_id']),
         "notifications": data
     })
 
 # -----------------------------------
-@app.route('/mark_notification/<int:notif_id>')
-def mark_notification(notif_id):
-    cursor.execute("UPDATE notifications SET is_read=TRUE WHERE id=%s", (notif_id,))
+#  قراءة عدة تنبيهات بطلب واحد: {"ids": [..]} أو {"up_to": id} (الكل لين هذا الـ id)
+@app.route('/notifications/mark_read', methods=['POST'])
+@api_login_required
+def notifications_mark_read():
+    payload = request.get_json(silent=True) or {}
+    ids = payload.get('ids') or []
+    up_to = payload.get('up_to')
+
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids) \
+            or (up_to is not None and not isinstance(up_to, int)):
+        return jsonify({"error": "ids must be a list of ints and up_to an int"}), 400
+    if not ids and up_to is None:
+        return jsonify({"error": "nothing to mark"}), 400
+
+    conn = get_db()
+    result = mark_read(conn.cursor(), session['employee_id'], ids, up_to)
     conn.commit()
-    return "", 204
+
+    return jsonify(result)
 
 # -----------------------------------
+#  تنبيهات لحظية (SSE) بدل الـ polling كل 5 ثواني
+@app.route('/notifications/stream')
+@api_login_required
+def notifications_stream():
+    return Response(
+        stream_notifications(session['employee_id']),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
 
 # -----------------------------------
-def assign_ticket_auto(ticket_id, category):
-    cursor.execute("""
-        SELECT employee_id 
-        FROM it_team
-        WHERE specialization = %s
-          AND availability_status = 'متاح'
-          AND workload < max_load
-        ORDER BY workload ASC
-        LIMIT 1
-    """, (category,))
-
-    employee = cursor.fetchone()
-
-    if not employee:
-        cursor.execute("""
-            SELECT employee_id 
-            FROM it_team
-            WHERE specialization = 'Other'
-              AND availability_status = 'متاح'
-              AND workload < max_load
-            ORDER BY workload ASC
-            LIMIT 1
-        """)
-        employee = cursor.fetchone()
-
-    if employee:
-        employee_id = employee[0]
+#  الـ metrics فيها أسماء الـ routes وأوقاتها وحالة الـ pools: للمراقبة (METRICS_TOKEN) أو فريق الـ IT بس
+@app.route('/metrics')
+def metrics_endpoint():
+    if not metrics.token_ok(request.headers.get('Authorization')):
+        if 'employee_id' not in session:
+            return "", 401
+        if not current_role():
+            return "", 403
 
-        cursor.execute("""
-            UPDATE tickets
-            SET assigned_to = %s
-            WHERE ticket_id = %s
-        """, (employee_id, ticket_id))
+    return metrics.metrics_response((web_db, jobs_db, notify_db))
 
-        cursor.execute("""
-            UPDATE it_team
-            SET workload = workload + 1
-            WHERE employee_id = %s
-        """, (employee_id,))
+# -----------------------------------
+#  API الشذوذ: مودل واحد للـ process يخدم الداشبورد وأنظمة المراقبة،
+#  وحالة كل جهاز بالقاعدة فأي worker يكمل سلسلته (anomaly.py)
+def anomaly_api_allowed():
+    return 'employee_id' in session or anomaly.token_ok(request.headers.get('Authorization'))
 
+
+@app.route('/api/anomaly/score', methods=['POST'])
+def anomaly_score():
+    if not anomaly_api_allowed():
+        return "", 401
+
+    payload = request.get_json(silent=True)
+    conn = get_db()
+    try:
+        readings = anomaly.parse_readings(payload)
+        result = anomaly.service.score(readings, stateless=bool(payload.get('stateless')), cursor=conn.cursor())
         conn.commit()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except anomaly.ModelUnavailable as e:
+        app.logger.error("ANOMALY MODEL: %s", e)
+        return jsonify({"error": "model unavailable"}), 503
+
+    return jsonify(result)
+
+
+@app.route('/api/anomaly/hosts/<host_id>')
+def anomaly_host(host_id):
+    if not anomaly_api_allowed():
+        return "", 401
 
+    limit = request.args.get('limit', type=int)
+    state = anomaly.service.host(get_db().cursor(), host_id, limit)
+    if state is None:
+        return jsonify({"error": "unknown host"}), 404
 
+    return jsonify(state)
 
 # -----------------------------------
+@app.route('/mark_notification/<int:notif_id>')
+@api_login_required
+def mark_notification(notif_id):
+    # قديم (تنبيه واحد)؛ الواجهة تستخدم POST /notifications/mark_read
+    conn = get_db()
+    mark_read(conn.cursor(), session['employee_id'], [notif_id])
+    conn.commit()
+    return "", 204
+
+# -----------------------------------
+
+# -----------------------------------
+@metrics.timed_job("reassign_expired_tickets")
 def reassign_expired_tickets():
-    cursor.execute("""
-        SELECT ticket_id, assigned_to, category
-        FROM tickets
-        WHERE status = 'New'
-          AND created_at <= NOW() - INTERVAL '15 minutes'
-    """)
-   
-    tickets = cursor.fetchall()
+    # المهام الخلفية تاخذ اتصالها من pool خاص فيها
+    with jobs_db.connection() as conn:
+        stats = reassign_expired(conn)
 
-    for ticket_id, old_employee, category in tickets:
+    if stats["expired"]:
+        dashboard_cache.clear()
+        app.logger.info("REASSIGN: %s", stats)
 
-        if old_employee:
-            cursor.execute("""
-                UPDATE it_team
-                SET workload = GREATEST(workload - 1, 0)
-                WHERE employee_id = %s
-            """, (old_employee,))
+    # ينحفظ مع التشغيل في job_runs ويظهر في /api/jobs (العدد ووقت القفل لكل تشغيل)
+    return stats
 
-        assign_ticket_auto(ticket_id, category)
 
-    conn.commit()
+@metrics.timed_job("resync_capacity_index")
+def resync_capacity_index():
+    with jobs_db.connection() as conn:
+        capacity_index.resync(conn)
+
+
+@metrics.timed_job("notifications_retention")
+def notifications_retention():
+    # partitions الأشهر الجاية + ضغط التكرار + حذف/أرشفة الأشهر القديمة (retention.py)
+    with jobs_db.connection() as conn:
+        stats = run_retention(conn)
+
+    if stats and (stats["dropped"] or stats["archived"] or stats["compacted"] or stats["purged_read"]):
+        app.logger.info("RETENTION: %s", stats)
+
+
+@metrics.timed_job("expire_anomaly_hosts")
+def expire_anomaly_hosts():
+    with jobs_db.connection() as conn:
+        expired = anomaly.expire_hosts(conn.cursor())
+        conn.commit()
+
+    if expired:
+        app.logger.info("ANOMALY HOSTS EXPIRED: %s", expired)
+
+
+@metrics.timed_job("raise_anomaly_incidents")
+def raise_anomaly_incidents():
+    # شذوذ الـ CPU اللي وصل /api/anomaly/score يتحول لحوادث وتذاكر (alerts.py)
+    with jobs_db.connection() as conn:
+        predictions = alerts.recent_predictions(conn.cursor())
+        if not predictions:
+            return None
+        stats = alerts.raise_incidents(conn, predictions)
+
+    for ticket_id, assignee in stats.pop("assignees").items():
+        ticket_assigned(ticket_id, assignee)
+
+    stats.pop("ticket_ids")
+    if stats["created"] or stats["extended"]:
+        app.logger.info("ANOMALY INCIDENTS: %s", stats)
+
+    return stats
 
 
 # -----------------------------------
+#  كل worker يشغّل الـ runner، لكن المهام على القاعدة تتنفذ عند القائد بس (jobs.LeaderElection)
+#  فعددها ثابت مهما زاد عدد الـ workers؛ capacity_index بذاكرة كل process فيتحدّث عند الكل.
+#  يبدأ مع أول طلب في الـ worker (بعد الـ fork، حتى مع gunicorn --preload)، مو وقت الاستيراد
+job_runner = JobRunner(jobs_db)
+job_runner.add(reassign_expired_tickets, 60, jitter=5)
+job_runner.add(resync_capacity_index, CAPACITY_RESYNC_SECONDS, jitter=5, leader_only=False)
+job_runner.add(notifications_retention, RETENTION_INTERVAL_HOURS * 3600, jitter=300)
+job_runner.add(expire_anomaly_hosts, 3600, jitter=60)
+job_runner.add(raise_anomaly_incidents, 60, jitter=5)
+
+
+@app.before_request
+def start_job_runner():
+    job_runner.start()
+
 
-scheduler = BackgroundScheduler()
-scheduler.add_job(reassign_expired_tickets, 'interval', minutes=1)
-scheduler.start()
+@app.route('/api/jobs')
+@api_it_required
+def jobs_status():
+    return jsonify(job_runner.status(get_db().cursor(), page_limit(request.args.get('limit'))))
 
 
+# تطوير: python app.py (thread لكل طلب/اتصال)؛ للإنتاج مع streams كثيرة: asgi.py
 if __name__ == '__main__':
     app.run(debug=True, use_reloader=False)
 
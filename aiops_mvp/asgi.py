@@ -0,0 +1,176 @@
+import asyncio
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+
+from app import app as flask_app
+from chat import ChatStream
+from db import POOL_MAX
+from notifications import KEEPALIVE_SECONDS, SUBSCRIBER_QUEUE_SIZE, NotificationStream
+
+
+# تشغيل async (ASGI):
+#     uvicorn asgi:application --workers 4 --timeout-graceful-shutdown 5
+# الـ streams (تنبيهات + شات) تنخدم على الـ event loop بدون thread لكل اتصال،
+# وباقي الـ routes نفس Flask بالضبط (نفس القوالب والجلسة) داخل thread pool محدود.
+# الـ streams ما تخلص لحالها، فبدون timeout الإيقاف ينتظرها للأبد (المتصفح يعيد الاتصال بنفسه)
+
+# threads طلبات Flask لكل worker؛ أكثر من DB_POOL_MAX بشوي (مو كل طلب يستخدم القاعدة)
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", str(POOL_MAX * 2)))
+
+# threads قراءة أول الـ stream (snapshot / الرسائل اللي فاتت)؛ الاتصال نفسه ما يمسك thread
+ASGI_STREAM_THREADS = int(os.environ.get("ASGI_STREAM_THREADS", str(max(1, POOL_MAX // 2))))
+
+
+wsgi = WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)
+_stream_executor = ThreadPoolExecutor(ASGI_STREAM_THREADS, thread_name_prefix="stream-start")
+
+_SSE_HEADERS = [
+    (b"content-type", b"text/event-stream; charset=utf-8"),
+    (b"cache-control", b"no-cache"),
+    (b"x-accel-buffering", b"no"),
+]
+
+
+# -----------------------------------
+#  الجلسة: نفس cookie Flask (موقّعة بـ secret_key) بدون request context
+_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+_session_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin1")
+    return None
+
+
+def session_employee(scope):
+    cookie = SimpleCookie(_header(scope, b"cookie") or "")
+    morsel = cookie.get(flask_app.config["SESSION_COOKIE_NAME"])
+    if morsel is None:
+        return None
+
+    try:
+        data = _serializer.loads(morsel.value, max_age=_session_max_age)
+    except BadSignature:
+        return None
+    return data.get("employee_id")
+
+
+# -----------------------------------
+#  نفس الـ routes اللي في app.py (notifications_stream و chat_stream)
+def _notifications_stream(scope, match, employee_id):
+    return NotificationStream(employee_id)
+
+
+def _chat_stream(scope, match, employee_id):
+    query = parse_qs(scope["query_string"].decode("latin1"))
+    after = _header(scope, b"last-event-id") or query.get("after", ["0"])[0]
+    return ChatStream(int(match.group(1)), int(after))
+
+
+STREAM_ROUTES = [
+    (re.compile(r"^/notifications/stream$"), _notifications_stream),
+    (re.compile(r"^/chat/(\d+)/stream$"), _chat_stream),
+]
+
+
+class _LoopQueue:
+    # الـ bus ينشر من thread الـ listener؛ هذا ينقل الحدث لـ asyncio.Queue داخل الـ loop
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def put_nowait(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # الـ loop تسكّر (الـ worker يطفي)
+            pass
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # متصفح بطيء: يكفيه اللي ياخذه لما يعيد الاتصال (مثل notifications.NotificationBus)
+            pass
+
+
+async def _body(send, chunk):
+    await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+
+
+async def _pump(stream, events, chunks, send):
+    for chunk in chunks:
+        await _body(send, chunk)
+
+    while not stream.done:
+        try:
+            event = await asyncio.wait_for(events.get(), KEEPALIVE_SECONDS)
+        except asyncio.TimeoutError:
+            chunk = ": keepalive\n\n"
+        else:
+            chunk = stream.render(event)
+        if chunk:
+            await _body(send, chunk)
+
+
+async def _disconnected(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def serve_stream(stream, receive, send):
+    # نفس notifications.run_stream لكن الانتظار await بدل thread نايم على queue.get
+    loop = asyncio.get_running_loop()
+    stream.listen()
+
+    q = _LoopQueue(loop)
+    stream.bus.subscribe(stream.key, q)
+    try:
+        chunks = await loop.run_in_executor(_stream_executor, stream.start)
+        await send({"type": "http.response.start", "status": 200, "headers": _SSE_HEADERS})
+
+        pump = asyncio.ensure_future(_pump(stream, q.queue, chunks, send))
+        watch = asyncio.ensure_future(_disconnected(receive))
+        done, pending = await asyncio.wait({pump, watch}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+
+        if pump in done:
+            pump.result()
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        stream.bus.unsubscribe(stream.key, q)
+
+
+async def _plain(send, status, body=b""):
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+# -----------------------------------
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["method"] == "GET":
+        for pattern, make_stream in STREAM_ROUTES:
+            match = pattern.match(scope["path"])
+            if match is None:
+                continue
+
+            employee_id = session_employee(scope)
+            if employee_id is None:
+                return await _plain(send, 401)
+            try:
+                stream = make_stream(scope, match, employee_id)
+            except ValueError:
+                return await _plain(send, 400, b"after must be a message id")
+            return await serve_stream(stream, receive, send)
+
+    await wsgi(scope, receive, send)
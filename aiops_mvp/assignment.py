@@ -0,0 +1,298 @@
+import heapq
+import os
+import threading
+import time
+
+
+# كم دقيقة تبقى التذكرة 'New' قبل ما نعيد توزيعها
+EXPIRY_MINUTES = int(os.environ.get("REASSIGN_EXPIRY_MINUTES", "15"))
+
+# أقصى عدد تذاكر في كل تشغيل (الباقي يتوزع في التشغيل اللي بعده)
+REASSIGN_BATCH_SIZE = int(os.environ.get("REASSIGN_BATCH_SIZE", "5000"))
+
+# كل كم ثانية نعيد مزامنة فهرس السعة مع it_team
+CAPACITY_RESYNC_SECONDS = int(os.environ.get("CAPACITY_RESYNC_SECONDS", "30"))
+
+
+# -----------------------------------
+#  فهرس في الذاكرة لسعة موظفي الـ IT المتاحين:
+#  heap لكل تخصص مرتب بالحمل، فاختيار الموظف ما يحتاج query.
+#  الـ heap فيه بس اللي عنده سعة (workload < max_load)؛ الممتلئ يرجع له لما ينقص حمله
+class CapacityIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._agents = {}
+        self._heaps = {}
+        self.loaded_at = None
+
+    def load(self, rows):
+        # rows: (employee_id, specialization, workload, max_load) للموظفين المتاحين فقط
+        agents = {}
+        heaps = {}
+        for employee_id, specialization, workload, max_load in rows:
+            agents[employee_id] = [specialization, workload, max_load]
+            heap = heaps.setdefault(specialization, [])
+            if workload < max_load:
+                heap.append((workload, employee_id))
+
+        for heap in heaps.values():
+            heapq.heapify(heap)
+
+        with self._lock:
+            self._agents = agents
+            self._heaps = heaps
+            self.loaded_at = time.monotonic()
+
+    def resync(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT employee_id, specialization, workload, max_load
+            FROM it_team
+            WHERE availability_status = 'متاح'
+        """)
+        self.load(cursor.fetchall())
+
+    def ensure_loaded(self, conn):
+        if self.loaded_at is None:
+            self.resync(conn)
+
+    def pick(self, specialization):
+        with self._lock:
+            heap = self._heaps.get(specialization)
+            while heap:
+                workload, employee_id = heap[0]
+                agent = self._agents.get(employee_id)
+
+                # مدخل قديم (تغير الحمل أو انحذف الموظف) أو موظف ممتلئ: نشيله ونكمل للي بعده،
+                # لأن max_load يختلف من موظف لثاني فالأقل حملاً ممكن يكون ممتلئ وغيره لا
+                if (agent is None or agent[0] != specialization or agent[1] != workload
+                        or workload >= agent[2]):
+                    heapq.heappop(heap)
+                    continue
+
+                return employee_id
+
+        return None
+
+    def set_workload(self, employee_id, workload, max_load=None):
+        with self._lock:
+            agent = self._agents.get(employee_id)
+            if agent is None:
+                return
+
+            if max_load is not None and max_load != agent[2]:
+                agent[2] = max_load
+            elif agent[1] == workload:
+                return
+
+            agent[1] = workload
+            if workload < agent[2]:
+                heapq.heappush(self._heaps[agent[0]], (workload, employee_id))
+
+    def remove(self, employee_id):
+        with self._lock:
+            self._agents.pop(employee_id, None)
+
+    def refresh_agent(self, cursor, employee_id):
+        cursor.execute("""
+            SELECT workload, max_load
+            FROM it_team
+            WHERE employee_id = %s
+              AND availability_status = 'متاح'
+        """, (employee_id,))
+        row = cursor.fetchone()
+
+        if row is None:
+            self.remove(employee_id)
+        else:
+            # max_load كمان: لو نقص بالقاعدة والحمل نفسه، بدونه pick يرجع نفس الموظف للأبد
+            self.set_workload(employee_id, row[0], row[1])
+
+
+capacity_index = CapacityIndex()
+
+
+# -----------------------------------
+#  توزيع تلقائي لتذكرة وحدة: الاختيار من الفهرس، والكتابة UPDATE واحد محمي بشرط السعة
+def assign_ticket_auto(conn, ticket_id, category):
+    capacity_index.ensure_loaded(conn)
+    cursor = conn.cursor()
+
+    for specialization in (category, 'Other'):
+        while True:
+            employee_id = capacity_index.pick(specialization)
+            if employee_id is None:
+                break
+
+            cursor.execute("""
+                WITH bumped AS (
+                    UPDATE it_team
+                    SET workload = workload + 1
+                    WHERE employee_id = %s
+                      AND availability_status = 'متاح'
+                      AND workload < max_load
+                    RETURNING employee_id, workload
+                )
+                UPDATE tickets t
+                SET assigned_to = b.employee_id
+                FROM bumped b
+                WHERE t.ticket_id = %s
+                RETURNING b.workload
+            """, (employee_id, ticket_id))
+            row = cursor.fetchone()
+
+            if row:
+                conn.commit()
+                capacity_index.set_workload(employee_id, row[0])
+                return employee_id
+
+            # الفهرس كان قديم لهذا الموظف (worker ثاني غيّر حمله): نحدثه ونجرب اللي بعده
+            capacity_index.refresh_agent(cursor, employee_id)
+
+    return None
+
+
+def release_agent(cursor, employee_id):
+    cursor.execute("""
+        UPDATE it_team
+        SET workload = GREATEST(workload - 1, 0)
+        WHERE employee_id = %s
+        RETURNING workload
+    """, (employee_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+# -----------------------------------
+#  توزيع مجموعة تذاكر دفعة وحدة:
+#  كل موظف متاح يتحول لـ "خانات" بعدد السعة الفاضية عنده، ونرتبها حسب الحمل،
+#  والتذكرة رقم n في التخصص تاخذ الخانة رقم n — نفس نتيجة اختيار الأقل حملاً لكل تذكرة
+_ASSIGN_BATCH_SQL = """
+    WITH agents AS (
+        SELECT employee_id, specialization, workload, max_load
+        FROM it_team
+        WHERE availability_status = 'متاح'
+          AND workload < max_load
+        FOR UPDATE
+    ),
+    slots AS (
+        SELECT
+            a.employee_id,
+            a.specialization,
+            ROW_NUMBER() OVER (
+                PARTITION BY a.specialization
+                ORDER BY s.load, a.employee_id
+            ) AS slot_rank
+        FROM agents a
+        CROSS JOIN LATERAL generate_series(a.workload, a.max_load - 1) AS s(load)
+    ),
+    batch AS (
+        SELECT
+            ticket_id,
+            COALESCE(%(specialization)s, category) AS wanted,
+            ROW_NUMBER() OVER (
+                PARTITION BY COALESCE(%(specialization)s, category)
+                ORDER BY created_at, ticket_id
+            ) AS ticket_rank
+        FROM tickets
+        WHERE ticket_id = ANY(%(ticket_ids)s)
+    ),
+    matched AS (
+        SELECT b.ticket_id, s.employee_id
+        FROM batch b
+        JOIN slots s
+          ON s.specialization = b.wanted
+         AND s.slot_rank = b.ticket_rank
+    ),
+    bumped AS (
+        UPDATE it_team t
+        SET workload = t.workload + m.n
+        FROM (
+            SELECT employee_id, COUNT(*) AS n
+            FROM matched
+            GROUP BY employee_id
+        ) m
+        WHERE t.employee_id = m.employee_id
+    )
+    UPDATE tickets t
+    SET assigned_to = m.employee_id
+    FROM matched m
+    WHERE t.ticket_id = m.ticket_id
+    RETURNING t.ticket_id, m.employee_id
+"""
+
+
+def assign_batch(cursor, ticket_ids, specialization=None):
+    # specialization=None يعني كل تذكرة تروح لتخصص الـ category حقها
+    # يرجع {ticket_id: employee_id} للي توزعت
+    if not ticket_ids:
+        return {}
+
+    cursor.execute(_ASSIGN_BATCH_SQL, {
+        "ticket_ids": list(ticket_ids),
+        "specialization": specialization,
+    })
+    return dict(cursor.fetchall())
+
+
+# -----------------------------------
+#  إعادة توزيع التذاكر المنتهية في transaction واحدة
+def reassign_expired(conn, batch_size=REASSIGN_BATCH_SIZE):
+    started = time.perf_counter()
+    cursor = conn.cursor()
+
+    # SKIP LOCKED: التذاكر اللي طلب ثاني ماسكها (قبول/رفض) نتركها للتشغيل الجاي
+    cursor.execute("""
+        SELECT ticket_id
+        FROM tickets
+        WHERE status = 'New'
+          AND created_at <= NOW() - make_interval(mins => %s)
+        ORDER BY created_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (EXPIRY_MINUTES, batch_size))
+
+    ticket_ids = [r[0] for r in cursor.fetchall()]
+    locked_at = time.perf_counter()
+
+    stats = {
+        "expired": len(ticket_ids),
+        "released": 0,
+        "assigned": 0,
+        "assigned_fallback": 0,
+        "unassigned": 0,
+    }
+
+    if ticket_ids:
+        # نرجّع حمل الموظفين القدامى بجملة وحدة
+        cursor.execute("""
+            UPDATE it_team t
+            SET workload = GREATEST(t.workload - r.n, 0)
+            FROM (
+                SELECT assigned_to, COUNT(*) AS n
+                FROM tickets
+                WHERE ticket_id = ANY(%s)
+                  AND assigned_to IS NOT NULL
+                GROUP BY assigned_to
+            ) r
+            WHERE t.employee_id = r.assigned_to
+        """, (ticket_ids,))
+        stats["released"] = cursor.rowcount
+
+        assigned = assign_batch(cursor, ticket_ids)
+
+        # اللي ما لقى أحد بتخصصه يروح لفريق 'Other'
+        remaining = [t for t in ticket_ids if t not in assigned]
+        fallback = assign_batch(cursor, remaining, specialization='Other')
+
+        stats["assigned"] = len(assigned)
+        stats["assigned_fallback"] = len(fallback)
+        stats["unassigned"] = len(remaining) - len(fallback)
+
+    conn.commit()
+    finished = time.perf_counter()
+
+    stats["lock_ms"] = round((locked_at - started) * 1000, 2)
+    stats["total_ms"] = round((finished - started) * 1000, 2)
+    return stats
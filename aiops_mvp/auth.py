@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import session, redirect, g
+
+from db import get_db
+from notifications import NotificationListener
+
+
+# كم ثانية نثق بالصلاحية المحفوظة في الـ session قبل ما نعيد قراءتها من it_team.
+# التغيير يوصل كل الـ workers فوراً بـ NOTIFY (migrations/0008)؛ الـ TTL حد أعلى لو الـ listener
+# كان مفصول وقت التغيير وفاته الحدث
+ROLE_TTL_SECONDS = int(os.environ.get("ROLE_TTL_SECONDS", "300"))
+
+# قناة NOTIFY اللي ينشر عليها trigger الـ it_team
+ROLE_CHANNEL = "roles"
+
+# وقت آخر تغيير على صلاحية كل موظف، كما وصل هذا الـ process؛ None = الكل (TRUNCATE)
+_invalidated_at = {}
+_invalidated_lock = threading.Lock()
+
+
+# -----------------------------------
+def remember_role(specialization):
+    # specialization = None يعني موظف عادي (مو من فريق الـ IT)
+    session['is_it'] = specialization is not None
+    session['specialization'] = specialization
+    session['role_loaded_at'] = time.time()
+
+
+def invalidate_role(employee_id):
+    # employee_id = None يلغي صلاحيات الكل
+    with _invalidated_lock:
+        _invalidated_at[employee_id] = time.time()
+
+
+class _RoleInvalidations:
+    # نفس واجهة NotificationBus.publish عشان NotificationListener يوصّل له الأحداث
+
+    def publish(self, employee_id, event):
+        invalidate_role(employee_id)
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def ensure_role_listener():
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = NotificationListener(_RoleInvalidations(), ROLE_CHANNEL, key="employee_id")
+                _listener.start()
+
+
+def _role_is_fresh():
+    loaded_at = session.get('role_loaded_at')
+    if loaded_at is None:
+        return False
+
+    if time.time() - loaded_at > ROLE_TTL_SECONDS:
+        return False
+
+    with _invalidated_lock:
+        invalidated_at = max(
+            _invalidated_at.get(session['employee_id'], 0),
+            _invalidated_at.get(None, 0)
+        )
+
+    return invalidated_at < loaded_at
+
+
+def current_role():
+    ensure_role_listener()
+
+    if not _role_is_fresh():
+        cursor = get_db().cursor()
+        cursor.execute(
+            "SELECT specialization FROM it_team WHERE employee_id=%s",
+            (session['employee_id'],)
+        )
+        row = cursor.fetchone()
+        remember_role(row[0] if row else None)
+
+    g.is_it = session['is_it']
+    g.specialization = session['specialization']
+    return g.is_it
+
+
+# -----------------------------------
+#  decorators للـ routes
+def login_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'employee_id' not in session:
+            return redirect('/login')
+
+        current_role()
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def it_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'employee_id' not in session:
+            return redirect('/login')
+
+        if not current_role():
+            return "لا تملك صلاحية الدخول", 403
+
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+# نسخ الـ JSON / SSE: ترجع 401 / 403 بدل التحويل لصفحة الدخول (fetch و EventSource ما يستفيدون من redirect)
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'employee_id' not in session:
+            return "", 401
+
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def api_it_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'employee_id' not in session:
+            return "", 401
+
+        if not current_role():
+            return "", 403
+
+        return view(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,272 @@
+import argparse
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+import db  # noqa: E402
+from seed import SEED_PASSWORD, add_arguments, seed_from_args  # noqa: E402
+
+
+# وزن كل route في سيناريو الموظف العادي وموظف الـ IT
+EMPLOYEE_MIX = [
+    ("GET /get_notifications", 5),
+    ("GET /my_tickets", 3),
+    ("GET /chat/<id>", 2),
+    ("POST /create_ticket", 1),
+]
+IT_MIX = [
+    ("GET /get_notifications", 5),
+    ("GET /dashboard", 4),
+    ("GET /chat/<id>", 2),
+]
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+
+
+# -----------------------------------
+#  الـ app نفسه يرجّع عدد استعلامات كل طلب في X-Query-Count (metrics.py)
+def start_local_server(port):
+    from werkzeug.serving import make_server
+
+    import app as app_module
+    app_module.job_runner.shutdown()
+
+    server = make_server("127.0.0.1", port, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+# -----------------------------------
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class VirtualUser(threading.Thread):
+
+    def __init__(self, base_url, employee_id, is_it, max_ticket_id, deadline, warmup_until, seed):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.employee_id = employee_id
+        self.mix = IT_MIX if is_it else EMPLOYEE_MIX
+        self.max_ticket_id = max_ticket_id
+        self.deadline = deadline
+        self.warmup_until = warmup_until
+        self.rng = random.Random(seed)
+        self.samples = []
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(CookieJar()),
+            _NoRedirect()
+        )
+
+    def request(self, label, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        started = time.perf_counter()
+
+        try:
+            response = self.opener.open(self.base_url + path, data=body, timeout=30)
+            response.read()
+            status, headers = response.status, response.headers
+        except urllib.error.HTTPError as e:
+            e.read()
+            status, headers = e.code, e.headers
+        except (urllib.error.URLError, OSError):
+            status, headers = 0, {}
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        queries = headers.get(QUERY_COUNT_HEADER) if headers else None
+
+        if started >= self.warmup_until:
+            self.samples.append((
+                label,
+                elapsed_ms,
+                status,
+                int(queries) if queries is not None else None
+            ))
+
+    def run(self):
+        self.request("POST /login", "/login", {
+            "employee_id": str(self.employee_id),
+            "password": SEED_PASSWORD,
+        })
+
+        labels = [label for label, _ in self.mix]
+        weights = [weight for _, weight in self.mix]
+
+        while time.perf_counter() < self.deadline:
+            label = self.rng.choices(labels, weights)[0]
+
+            if label == "GET /chat/<id>":
+                self.request(label, f"/chat/{self.rng.randint(1, self.max_ticket_id)}")
+            elif label == "POST /create_ticket":
+                self.request(label, "/create_ticket", {
+                    "title": "load test",
+                    "description": "load test",
+                    "category": self.rng.choice(["Software", "Network", "Hardware"]),
+                    "priority": "Medium",
+                })
+            else:
+                self.request(label, label.split(" ", 1)[1])
+
+
+# -----------------------------------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 2)
+
+
+def summarize(samples, duration):
+    by_route = {}
+    for label, elapsed_ms, status, queries in samples:
+        by_route.setdefault(label, []).append((elapsed_ms, status, queries))
+
+    routes = {}
+    for label, rows in sorted(by_route.items()):
+        latencies = sorted(r[0] for r in rows)
+        query_counts = [r[2] for r in rows if r[2] is not None]
+
+        routes[label] = {
+            "requests": len(rows),
+            "errors": sum(1 for r in rows if r[1] == 0 or r[1] >= 500),
+            "throughput_rps": round(len(rows) / duration, 2),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": round(latencies[-1], 2),
+            "queries_per_request": (
+                round(sum(query_counts) / len(query_counts), 2) if query_counts else None
+            ),
+        }
+
+    all_latencies = sorted(s[1] for s in samples)
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / duration, 2),
+        "p50_ms": percentile(all_latencies, 50),
+        "p95_ms": percentile(all_latencies, 95),
+        "p99_ms": percentile(all_latencies, 99),
+        "routes": routes,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    # نسبة التغير لكل route مقارنة بنتيجة سابقة (موجب = أبطأ)
+    print(f"{'route':32} {'p95 old':>9} {'p95 new':>9} {'change':>8}")
+    for label, stats in current["summary"]["routes"].items():
+        old = baseline["summary"]["routes"].get(label)
+        if not old or not old["p95_ms"]:
+            continue
+        change = (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+        print(f"{label:32} {old['p95_ms']:9.2f} {stats['p95_ms']:9.2f} {change:+7.1f}%")
+
+
+# -----------------------------------
+def run(args):
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        server, base_url = start_local_server(args.port)
+
+    rng = random.Random(args.random_seed)
+    it_users = int(args.users * args.it_ratio)
+
+    started = time.perf_counter()
+    warmup_until = started + args.warmup
+    deadline = warmup_until + args.duration
+
+    users = []
+    for i in range(args.users):
+        is_it = i < it_users
+        employee_id = (
+            rng.randint(1, args.it_staff) if is_it
+            else rng.randint(args.it_staff + 1, args.employees)
+        )
+        users.append(VirtualUser(
+            base_url, employee_id, is_it, args.tickets,
+            deadline, warmup_until, args.random_seed + i
+        ))
+
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+
+    if server is not None:
+        server.shutdown()
+
+    samples = [s for user in users for s in user.samples]
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {
+            "users": args.users,
+            "it_ratio": args.it_ratio,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "employees": args.employees,
+            "it_staff": args.it_staff,
+            "tickets": args.tickets,
+            "messages": args.messages,
+            "notifications": args.notifications,
+            "pool_max": db.POOL_MAX,
+            "target": args.url or "in-process",
+        },
+        "summary": summarize(samples, args.duration),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the ticketing routes against PostgreSQL")
+    parser.add_argument("--url", help="hit an already running server instead of starting one in-process")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--it-ratio", type=float, default=0.2, help="share of users that are IT staff")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds excluded from the results")
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--seed", action="store_true", help="reseed the database before the run")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="previous JSON report to compare p95 against")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.seed:
+        conn = db.psycopg2.connect(**db.DB_CONFIG)
+        try:
+            seed_from_args(conn, args)
+        finally:
+            conn.close()
+
+    report = run(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    print(text)
+
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
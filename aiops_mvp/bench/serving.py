@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.parse
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(APP_DIR))
+
+from seed import SEED_PASSWORD  # noqa: E402
+
+
+# مقارنة وضع الـ threads الحالي (app.run) بوضع ASGI (asgi.py):
+# كم اتصال SSE مفتوح يتحمل الـ worker، الذاكرة لكل اتصال، وزمن الطلب العادي وهي مفتوحة
+#     python bench/serving.py --connections 100 500 1000
+
+MODES = {
+    "threaded": [sys.executable, "-c",
+                 "import sys, app; app.app.run(port=int(sys.argv[1]), threaded=True, use_reloader=False)"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi:application", "--log-level", "warning",
+             "--timeout-graceful-shutdown", "2", "--port"],
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _proc_status(pid):
+    # VmRSS (KB) و عدد الـ threads من /proc
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "Threads"):
+                values[key] = int(value.split()[0])
+    return values["VmRSS"], values["Threads"]
+
+
+async def _request(port, method, path, cookie=None, body=None, read_first_event=False):
+    # HTTP/1.1 خام (بدون مكتبة) عشان نفس العميل للوضعين
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    headers = [f"{method} {path} HTTP/1.1", "Host: localhost", "Connection: close"]
+    if cookie:
+        headers.append(f"Cookie: {cookie}")
+    if body is not None:
+        headers += ["Content-Type: application/x-www-form-urlencoded", f"Content-Length: {len(body)}"]
+    writer.write(("\r\n".join(headers) + "\r\n\r\n" + (body or "")).encode())
+    await writer.drain()
+
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+
+    if read_first_event:
+        # الـ stream يبقى مفتوح؛ يكفي أول حدث (snapshot)
+        await reader.readuntil(b"\n\n")
+        return status, head, (reader, writer)
+
+    await reader.read()
+    writer.close()
+    return status, head, None
+
+
+async def _login(port, employee):
+    body = urllib.parse.urlencode({"employee_id": employee, "password": SEED_PASSWORD})
+    _, head, _ = await _request(port, "POST", "/login", body=body)
+    for line in head.decode("latin1").split("\r\n"):
+        if line.lower().startswith("set-cookie:"):
+            return line.split(":", 1)[1].strip().split(";")[0]
+    raise RuntimeError("login failed: no session cookie")
+
+
+async def _open_streams(port, cookie, count, timeout):
+    async def one():
+        started = time.perf_counter()
+        try:
+            status, _, conn = await asyncio.wait_for(
+                _request(port, "GET", "/notifications/stream", cookie, read_first_event=True), timeout
+            )
+        except (asyncio.TimeoutError, OSError, asyncio.IncompleteReadError):
+            return None, None
+        return (time.perf_counter() - started if status == 200 else None), conn
+
+    results = await asyncio.gather(*(one() for _ in range(count)))
+    return [r[0] for r in results if r[0] is not None], [r[1] for r in results if r[1] is not None]
+
+
+async def _timed_requests(port, cookie, count, timeout):
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        try:
+            status, _, _ = await asyncio.wait_for(_request(port, "GET", "/get_notifications", cookie), timeout)
+        except (asyncio.TimeoutError, OSError):
+            continue
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def _ms(values, q):
+    if not values:
+        return "-"
+    return f"{statistics.quantiles(values, n=100)[q - 1] * 1000:.0f}" if len(values) > 1 else f"{values[0] * 1000:.0f}"
+
+
+async def bench_mode(mode, connections, employee, timeout, requests):
+    port = _free_port()
+    command = MODES[mode] + [str(port)]
+    # السيرفر يستورد app / asgi من مجلد التطبيق
+    server = subprocess.Popen(command, cwd=APP_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    rows = []
+    try:
+        for _ in range(100):
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                    break
+            except OSError:
+                await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError(f"{mode} server did not start")
+
+        cookie = await _login(port, employee)
+        # أول طلب يسخّن (الـ pool، listener التنبيهات)
+        await _timed_requests(port, cookie, 3, timeout)
+        _, warm = await _open_streams(port, cookie, 1, timeout)
+
+        for count in connections:
+            rss_before, _ = _proc_status(server.pid)
+            first_event, conns = await _open_streams(port, cookie, count, timeout)
+            await asyncio.sleep(1)
+            rss_after, threads = _proc_status(server.pid)
+            latencies = await _timed_requests(port, cookie, requests, timeout)
+
+            per_conn = (rss_after - rss_before) / len(conns) if conns else float("nan")
+            rows.append((mode, count, len(conns), _ms(first_event, 50), _ms(first_event, 95),
+                         f"{per_conn:.1f}", rss_after // 1024, threads,
+                         _ms(latencies, 50), _ms(latencies, 95), f"{len(latencies)}/{requests}"))
+
+            for _, writer in conns:
+                writer.close()
+            await asyncio.sleep(2)
+
+        for _, writer in warm:
+            writer.close()
+    finally:
+        server.terminate()
+        server.wait(10)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SSE connection capacity of threaded and ASGI serving")
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=["threaded", "asgi"])
+    parser.add_argument("--connections", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--employee", default="1000", help="seeded employee to log in as (seed.py)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for a stream or request")
+    parser.add_argument("--requests", type=int, default=50, help="GET /get_notifications while streams are open")
+    args = parser.parse_args()
+
+    # كل اتصال = fd عند العميل وعند السيرفر
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    rows = []
+    for mode in args.modes:
+        rows += asyncio.run(bench_mode(mode, args.connections, args.employee, args.timeout, args.requests))
+
+    header = ("mode", "streams", "open", "first p50", "first p95", "KB/conn", "RSS MB", "threads",
+              "req p50", "req p95", "req ok")
+    widths = [max(len(str(v)) for v in column) for column in zip(header, *rows)]
+    for row in (header, *rows):
+        print("  ".join(str(v).rjust(w) for v, w in zip(row, widths)))
+    print("\nfirst = ms until the stream's first event; req = ms per GET /get_notifications with the streams open")
+
+
+if __name__ == '__main__':
+    main()
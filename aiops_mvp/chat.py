@@ -0,0 +1,175 @@
+import atexit
+import os
+import threading
+
+from db import notify_db, web_db
+from notifications import (
+    NOTIFY_BATCH_SIZE, NotificationBus, NotificationListener, BatchWriter, RecentIds,
+    _sse, run_stream, write_notifications
+)
+
+
+# قناة PostgreSQL لرسائل الشات (كل الـ workers يستقبلونها)
+CHAT_CHANNEL = "chat"
+
+# الرسائل اللي تجي خلال كذا ms تنكتب بجملة INSERT وحدة
+CHAT_FLUSH_MS = float(os.environ.get("CHAT_FLUSH_MS", "50"))
+
+# أطول رسالة نقبلها (حروف)
+CHAT_MAX_LENGTH = int(os.environ.get("CHAT_MAX_LENGTH", "4000"))
+
+# أقصى رسائل فاتت نرسلها عند الاتصال؛ أكثر من كذا = المتصفح يعيد تحميل الصفحة
+CHAT_DELTA_LIMIT = int(os.environ.get("CHAT_DELTA_LIMIT", "200"))
+
+# payload الـ NOTIFY حده 8000 byte؛ الرسالة الأطول تنرسل بدون النص والصفحة تجيبها من /api/chat
+NOTIFY_TEXT_BYTES = 6000
+
+
+# bus بالتذكرة: كل صفحة شات مفتوحة مشتركة على تذكرتها
+chat_bus = NotificationBus()
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def ensure_chat_listener():
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = NotificationListener(chat_bus, CHAT_CHANNEL, key="ticket_id")
+                _listener.start()
+
+
+# -----------------------------------
+#  كتابة دفعة رسائل: INSERT متعدد + NOTIFY لكل رسالة + مستلم التنبيه من التذكرة
+_INSERT_MESSAGES = """
+    WITH created AS (
+        INSERT INTO messages (ticket_id, sender_id, message_text, sent_at)
+        SELECT ticket_id, sender_id, message_text, NOW()
+        FROM unnest(%(tickets)s::int[], %(senders)s::int[], %(texts)s::text[])
+             AS m(ticket_id, sender_id, message_text)
+        RETURNING message_id, ticket_id, sender_id, message_text, sent_at
+    )
+    SELECT message_id, ticket_id, sender_name, receiver_id, pg_notify(%(channel)s, json_build_object(
+        'id', message_id, 'ticket_id', ticket_id, 'sender_id', sender_id, 'sender_name', sender_name,
+        'text', CASE WHEN octet_length(message_text) <= %(text_bytes)s THEN message_text END,
+        'time', sent_at::text
+    )::text)
+    FROM (
+        SELECT
+            c.*,
+            e.name AS sender_name,
+            CASE WHEN t.assigned_to = c.sender_id THEN t.employee_id ELSE t.assigned_to END AS receiver_id
+        FROM created c
+        JOIN tickets t ON t.ticket_id = c.ticket_id
+        LEFT JOIN employees e ON e.employee_id = c.sender_id
+        ORDER BY c.message_id
+    ) m
+"""
+
+
+def write_messages(cursor, rows):
+    # rows: [(ticket_id, sender_id, text), ...] — يرجع الـ message_ids
+    # التنبيهات بنفس الـ transaction: تنبيه واحد لكل (مستلم، تذكرة، مرسل) بالدفعة
+    tickets, senders, texts = zip(*rows)
+    cursor.execute(_INSERT_MESSAGES, {
+        "tickets": list(tickets),
+        "senders": list(senders),
+        "texts": list(texts),
+        "channel": CHAT_CHANNEL,
+        "text_bytes": NOTIFY_TEXT_BYTES,
+    })
+    created = cursor.fetchall()
+
+    notify = {}
+    for _, ticket_id, sender_name, receiver_id, _ in created:
+        if receiver_id:
+            notify[(receiver_id, ticket_id, f"📩 رسالة جديدة من {sender_name}")] = None
+    if notify:
+        write_notifications(cursor, list(notify))
+
+    return [row[0] for row in created]
+
+
+class ChatWriter(BatchWriter):
+
+    def __init__(self, pool, flush_ms=CHAT_FLUSH_MS, batch_size=NOTIFY_BATCH_SIZE):
+        super().__init__(pool, write_messages, "chat-writer", flush_ms, batch_size)
+
+    def send(self, ticket_id, sender_id, text):
+        self.put((ticket_id, sender_id, text))
+
+
+chat_writer = ChatWriter(notify_db)
+
+atexit.register(chat_writer.close)
+
+
+# -----------------------------------
+#  الرسائل بعد آخر message_id شافه المتصفح (index: ticket_id, message_id)
+def fetch_since(cursor, ticket_id, after, limit=CHAT_DELTA_LIMIT):
+    cursor.execute("""
+        SELECT m.message_id, m.sender_id, e.name, m.message_text, m.sent_at
+        FROM messages m
+        LEFT JOIN employees e ON m.sender_id = e.employee_id
+        WHERE m.ticket_id=%s
+          AND m.message_id > %s
+        ORDER BY m.message_id
+        LIMIT %s
+    """, (ticket_id, after, limit + 1))
+
+    rows = cursor.fetchall()
+    messages = [{
+        "id": r[0],
+        "sender_id": r[1],
+        "sender_name": r[2],
+        "text": r[3],
+        "time": str(r[4])
+    } for r in rows[:limit]]
+
+    return messages, len(rows) > limit
+
+
+# -----------------------------------
+#  SSE لكل تذكرة: الرسائل اللي فاتت (بعد after) مرة وحدة ثم push (notifications.run_stream)
+class ChatStream:
+
+    def __init__(self, ticket_id, after):
+        self.bus = chat_bus
+        self.key = ticket_id
+        self.after = after
+        self.done = False
+        self.seen = RecentIds()
+
+    def listen(self):
+        ensure_chat_listener()
+
+    def start(self):
+        with web_db.connection() as conn:
+            missed, more = fetch_since(conn.cursor(), self.key, self.after)
+            conn.rollback()
+
+        if more:
+            # فاته كثير: الصفحة كاملة أرخص من مئات الأحداث
+            self.done = True
+            return [_sse("reset", {})]
+
+        self.seen = RecentIds(message["id"] for message in missed)
+
+        # أول chunk يطلع فوراً (الـ headers معه) + بعد كم ms يعيد المتصفح الاتصال لو انقطع
+        return ["retry: 3000\n\n"] + [_sse("message", message, message["id"]) for message in missed]
+
+    def render(self, event):
+        if event["id"] in self.seen:
+            return None
+        self.seen.add(event["id"])
+
+        # نفس الحدث يروح لكل المشتركين، فما نعدّله؛ text = null يعني الرسالة أطول من الـ NOTIFY
+        # والصفحة تجيبها بـ ?after=
+        message = {k: v for k, v in event.items() if k != "ticket_id"}
+        return _sse("message", message, message["id"])
+
+
+def stream_chat(ticket_id, after):
+    return run_stream(ChatStream(ticket_id, after))
@@ -0,0 +1,167 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from forest import MODEL_FILE, FlatForest
+
+
+THIS_DIR = Path(__file__).resolve().parent
+ARTIFACT_DIR = THIS_DIR / "cpu_anomaly_iso_forest.artifact"
+
+FORMAT_VERSION = 1
+METADATA_FILE = "metadata.json"
+
+# ARTIFACT_DIR نفسه symlink لمجلد النسخة الحالية (<اسمه>.v<وقت>)؛ نخلي كذا نسخة قديمة
+# عشان اللي بدأ يحمّل نسخة قبل التبديل يلقى ملفاتها
+KEEP_VERSIONS = 2
+
+# مصفوفات الغابة، كل وحدة في ملف .npy ينفتح mmap (الصفحات مشتركة بين الـ workers)
+ARRAYS = ("feature", "threshold", "left", "leaf_value", "roots")
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# -----------------------------------
+#  التصدير: pickle → مجلد فيه metadata.json + ملف .npy لكل مصفوفة
+def export_artifact(model_file=MODEL_FILE, output=ARTIFACT_DIR):
+    import joblib
+    import sklearn
+
+    artifacts = joblib.load(model_file)
+    forest = FlatForest.from_sklearn(artifacts["model"], artifacts["scaler"], artifacts["feature_cols"])
+
+    output = Path(output)
+    version = output.with_name(f"{output.name}.v{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}")
+    tmp = version.with_name(version.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    arrays = {}
+    for name in ARRAYS:
+        path = tmp / f"{name}.npy"
+        array = np.ascontiguousarray(getattr(forest, name))
+        np.save(path, array)
+        arrays[name] = {"dtype": str(array.dtype), "shape": list(array.shape), "sha256": _sha256(path)}
+
+    metadata = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": Path(model_file).name,
+        "source_sha256": _sha256(model_file),
+        "sklearn_version": sklearn.__version__,
+        "feature_cols": forest.feature_cols,
+        "scaler": {"mean": forest.mean.tolist(), "scale": forest.scale.tolist()},
+        "depth": forest.depth,
+        "denominator": forest.denominator,
+        "offset": forest.offset,
+        "arrays": arrays,
+        # train.py يحفظ معطيات وتقييم التدريب داخل الـ pickle
+        "training": {k: artifacts[k] for k in ("params", "metrics", "trained_at") if k in artifacts},
+    }
+    (tmp / METADATA_FILE).write_text(json.dumps(metadata, indent=2), encoding="utf-8")
+
+    os.replace(tmp, version)
+    _publish(output, version)
+    return metadata
+
+
+def _publish(output, version):
+    # rename فوق الـ symlink ذرّي: اللي يفتح output يلقى القديم أو الجديد، ما فيه لحظة بدونه
+    link = output.with_name(output.name + ".link.tmp")
+    if link.is_symlink():
+        link.unlink()
+    link.symlink_to(version.name)
+
+    if output.is_dir() and not output.is_symlink():
+        # مجلد حقيقي من قبل الـ symlinks: ينشال مرة وحدة (هنا بس فيه لحظة بدون output)
+        shutil.rmtree(output)
+    os.replace(link, output)
+
+    versions = sorted(p for p in output.parent.glob(output.name + ".v*") if not p.name.endswith(".tmp"))
+    for old in versions[:-(KEEP_VERSIONS + 1)]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+# -----------------------------------
+#  التحميل: بدون sklearn/joblib، والمصفوفات mmap للقراءة فقط
+def load_artifact(path=ARTIFACT_DIR, verify=True):
+    path = Path(path)
+
+    # نحل الـ symlink مرة وحدة: الـ metadata والمصفوفات من نفس النسخة حتى لو انتشرت نسخة جديدة بالنص
+    version = path.resolve()
+    try:
+        raw = (version / METADATA_FILE).read_bytes()
+    except FileNotFoundError:
+        raise ArtifactError(f"no model artifact at {path} (run: python model/artifact.py)")
+
+    # الـ metadata فيه checksum كل مصفوفة، فـ checksum الـ metadata يمثل النسخة كلها
+    key = (str(path), hashlib.sha256(raw).hexdigest())
+    with _cache_lock:
+        forest = _cache.get(key)
+    if forest is not None:
+        return forest
+
+    metadata = json.loads(raw)
+    if metadata.get("format_version") != FORMAT_VERSION:
+        raise ArtifactError(f"unsupported artifact format {metadata.get('format_version')} in {path}")
+
+    arrays = {}
+    for name in ARRAYS:
+        spec = metadata["arrays"][name]
+        file = version / f"{name}.npy"
+        if verify and _sha256(file) != spec["sha256"]:
+            raise ArtifactError(f"checksum mismatch for {file}")
+
+        array = np.load(file, mmap_mode="r")
+        if str(array.dtype) != spec["dtype"] or list(array.shape) != spec["shape"]:
+            raise ArtifactError(f"{file} does not match metadata")
+        arrays[name] = array
+
+    forest = FlatForest(
+        mean=np.asarray(metadata["scaler"]["mean"], dtype=np.float64),
+        scale=np.asarray(metadata["scaler"]["scale"], dtype=np.float64),
+        depth=metadata["depth"],
+        denominator=metadata["denominator"],
+        offset=metadata["offset"],
+        feature_cols=metadata["feature_cols"],
+        **arrays,
+    )
+    forest.metadata = metadata
+
+    with _cache_lock:
+        # نسخة أقدم من نفس المسار ما عاد لها داعي
+        for old in [k for k in _cache if k[0] == key[0]]:
+            del _cache[old]
+        _cache[key] = forest
+    return forest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the pickled model as a memory-mappable artifact")
+    parser.add_argument("--model", default=str(MODEL_FILE))
+    parser.add_argument("--output", default=str(ARTIFACT_DIR))
+    args = parser.parse_args()
+
+    metadata = export_artifact(args.model, args.output)
+    nodes = metadata["arrays"]["feature"]["shape"][0]
+    print(f"{metadata['arrays']['roots']['shape'][0]} trees, {nodes} nodes -> {args.output}")
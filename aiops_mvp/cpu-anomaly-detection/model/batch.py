@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+
+from artifact import ARTIFACT_DIR, load_artifact
+from features import compute_features
+from forest import MODEL_FILE
+
+
+# كم جهاز نقيّمه في الدفعة الوحدة (الذاكرة تقريباً نقاط الدفعة × النافذة × 8 bytes)
+BATCH_SIZE = int(os.environ.get("ANOMALY_BATCH_SIZE", "1024"))
+
+
+def load_artifacts(path=MODEL_FILE):
+    import joblib
+
+    artifacts = joblib.load(path)
+    return artifacts["model"], artifacts["scaler"], artifacts["feature_cols"]
+
+
+# =========================================================
+# تقييم آلاف الأجهزة: الـ features لكل الدفعة بـ NumPy مرة وحدة
+# واستدعاء واحد للـ scaler والمودل لكل دفعة
+# =========================================================
+class BatchScorer:
+
+    def __init__(self, model, scaler, feature_cols, batch_size=BATCH_SIZE):
+        self.model = model
+        self.scaler = scaler
+        self.feature_cols = list(feature_cols)
+        self.batch_size = max(1, int(batch_size))
+
+    @classmethod
+    def from_file(cls, path=MODEL_FILE, **kwargs):
+        return cls(*load_artifacts(path), **kwargs)
+
+    @classmethod
+    def from_artifact(cls, path=ARTIFACT_DIR, **kwargs):
+        # الغابة المسطحة (artifact.py) فيها الـ scaler، فما نحتاج sklearn وقت التقييم
+        forest = load_artifact(path)
+        return cls(forest, None, forest.feature_cols, **kwargs)
+
+    def score(self, series, tail=1):
+        # series: {host_id: قراءات الجهاز الأخيرة بالترتيب}
+        # tail: كم نقطة من آخر كل جهاز نقيّم (None = كل النقاط)؛ الباقي تاريخ للـ rolling
+        hosts = list(series)
+        results = {}
+
+        for i in range(0, len(hosts), self.batch_size):
+            chunk = hosts[i:i + self.batch_size]
+            results.update(self._score_chunk(chunk, [series[h] for h in chunk], tail))
+
+        return results
+
+    def _score_chunk(self, hosts, arrays, tail):
+        arrays = [np.asarray(a, dtype=float).ravel() for a in arrays]
+        lengths = np.array([len(a) for a in arrays], dtype=np.int64)
+        if not lengths.any():
+            return {h: _empty() for h in hosts}
+
+        X = compute_features(np.concatenate(arrays), lengths, self.feature_cols)
+
+        # نقيّم آخر tail نقطة من كل جهاز فقط
+        ends = np.cumsum(lengths)
+        scored = lengths if tail is None else np.minimum(lengths, tail)
+        rows = np.repeat(ends - scored, scored) + _ranges(scored)
+
+        # predict = -1 لما decision_function < 0، فنحسبها من نفس الـ scores بدل مرور ثاني على الأشجار
+        X = X[rows]
+        if self.scaler is not None:
+            X = self.scaler.transform(X)
+        scores = self.model.decision_function(X)
+        flags = scores < 0
+
+        results = {}
+        bounds = np.concatenate([[0], np.cumsum(scored)])
+        for host, start, stop in zip(hosts, bounds[:-1], bounds[1:]):
+            if start == stop:
+                results[host] = _empty()
+                continue
+            results[host] = {
+                "anomaly": bool(flags[stop - 1]),
+                "score": float(scores[stop - 1]),
+                "anomalies": int(flags[start:stop].sum()),
+                "scored": int(stop - start),
+            }
+        return results
+
+
+def _ranges(counts):
+    # [0..c0-1, 0..c1-1, ...] بدون loop
+    total = counts.sum()
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.arange(total) - starts
+
+
+def _empty():
+    return {"anomaly": False, "score": None, "anomalies": 0, "scored": 0}
@@ -0,0 +1,125 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from batch import BatchScorer, MODEL_FILE
+from features import parse_feature
+from forest import FlatForest
+from ingest import DATA_FILE, load_series
+
+
+# -----------------------------------
+#  أجهزة وهمية: مقاطع عشوائية من القراءات الحقيقية + ضوضاء + ارتفاعات مفاجئة
+def make_hosts(n_hosts, points, rng, anomaly_ratio=0.02):
+    base = np.asarray(load_series(DATA_FILE).values)
+    starts = rng.integers(0, len(base) - points, size=n_hosts)
+    values = base[starts[:, None] + np.arange(points)]
+    values = values + rng.normal(0, 0.005, size=values.shape)
+
+    spikes = rng.random(values.shape) < anomaly_ratio
+    values[spikes] = rng.uniform(0.35, 0.9, size=spikes.sum())
+
+    return {f"i-{k:05d}": row for k, row in enumerate(values)}
+
+
+def pandas_features(values, cols):
+    # المرجع: pandas rolling/ewm لكل عمود لحاله (الطريقة القديمة قبل المحرك الموحّد)
+    s = pd.Series(values, dtype=float)
+    out = {}
+    for col in cols:
+        kind, param = parse_feature(col)
+        if kind == "value":
+            out[col] = s
+        elif kind == "diff":
+            out[col] = s.diff(param).fillna(0)
+        elif kind == "ewma":
+            out[col] = s.ewm(span=param, adjust=True).mean()
+        elif kind == "rolling_mad":
+            out[col] = s.rolling(param, min_periods=1).apply(lambda w: np.median(np.abs(w - np.median(w))), raw=True)
+        else:
+            rolling = s.rolling(param, min_periods=1)
+            out[col] = getattr(rolling, kind[len("rolling_"):])().fillna(0)
+    return pd.DataFrame(out)[cols].to_numpy()
+
+
+def check_against_pandas(scorer, series, sample=25):
+    # نتأكد إن الحساب المجمّع يطلع نفس predict الأصلي لكل النقاط
+    model, scaler, cols = scorer.model, scorer.scaler, scorer.feature_cols
+    hosts = list(series)[:sample]
+    batch = scorer.score({h: series[h] for h in hosts}, tail=None)
+
+    mismatches = 0
+    for h in hosts:
+        X = pandas_features(series[h], cols)
+        expected = model.predict(scaler.transform(X))
+        mismatches += int(((expected == -1).sum()) != batch[h]["anomalies"])
+    return mismatches
+
+
+def run(scorer, series, tail, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        scorer.score(series, tail=tail)
+        timings.append(time.perf_counter() - started)
+
+    best = min(timings)
+    points = sum(len(v) for v in series.values())
+    return {
+        "hosts": len(series),
+        "batch_size": scorer.batch_size,
+        "tail": tail,
+        "best_s": round(best, 4),
+        "median_s": round(float(np.median(timings)), 4),
+        "hosts_per_s": round(len(series) / best),
+        "points_per_s": round(points / best),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Throughput of the batched multi-host anomaly scorer")
+    parser.add_argument("--hosts", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[256, 1024, 4096])
+    parser.add_argument("--points", type=int, default=48, help="readings per host (history + scored tail)")
+    parser.add_argument("--tail", type=int, default=1, help="trailing points scored per host (0 = all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--model", default=str(MODEL_FILE))
+    parser.add_argument("--engine", choices=["sklearn", "flat"], default="sklearn",
+                        help="flat = NumPy evaluator from forest.py (no sklearn on the hot path)")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.random_seed)
+    tail = args.tail or None
+    base_scorer = BatchScorer.from_file(args.model)
+
+    if args.engine == "flat":
+        engine_model = FlatForest.from_sklearn(base_scorer.model, base_scorer.scaler, base_scorer.feature_cols)
+        engine_scaler = None
+    else:
+        engine_model, engine_scaler = base_scorer.model, base_scorer.scaler
+
+    report = {"points_per_host": args.points, "runs": []}
+    for n_hosts in args.hosts:
+        series = make_hosts(n_hosts, args.points, rng)
+
+        mismatches = check_against_pandas(base_scorer, series)
+        if mismatches:
+            raise SystemExit(f"{mismatches} hosts differ from the per-host pandas path")
+
+        for batch_size in args.batch_size:
+            scorer = BatchScorer(engine_model, engine_scaler, base_scorer.feature_cols, batch_size=batch_size)
+            result = run(scorer, series, tail, args.repeat)
+            result["engine"] = args.engine
+            report["runs"].append(result)
+            print(f"{result['hosts']:>6} hosts  batch {result['batch_size']:>5}  "
+                  f"{result['best_s'] * 1000:8.1f} ms  {result['hosts_per_s']:>8} hosts/s  "
+                  f"{result['points_per_s']:>9} points/s")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
@@ -1,11 +1,17 @@
+import time
+from collections import deque
+
 import numpy as np
 import pandas as pd
-import joblib
 import streamlit as st
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from artifact import ArtifactError, load_artifact
+from features import add_features
+from ingest import discover, load_series
+from live import LiveSeries, ReplayFeed, downsample
+
 # =========================================================
 # 0) إعداد المسارات (Paths)
 # =========================================================
@@ -13,6 +19,7 @@ THIS_DIR = Path(__file__).resolve().parent          # model/
 PROJECT_ROOT = THIS_DIR.parent                      # cpu-anomaly-detection/
 MODEL_FILE = THIS_DIR / "cpu_anomaly_iso_forest.pkl"
 DATA_FILE = PROJECT_ROOT / "data" / "ec2_cpu_utilization_24ae8d.csv"
+LOGO_FILE = THIS_DIR / "logo.png"
 
 # =========================================================
 # 0.1) إعداد صفحة Streamlit
@@ -65,7 +72,15 @@ st.markdown(custom_css, unsafe_allow_html=True)
 # =========================================================
 @st.cache_resource
 def load_model():
-    
+    # الـ artifact (artifact.py) يفتح بـ mmap وبدون sklearn؛ الـ scaler داخله
+    try:
+        forest = load_artifact()
+        return forest, None, forest.feature_cols
+    except ArtifactError:
+        pass
+
+    import joblib
+
     artifacts = joblib.load(MODEL_FILE)
     model = artifacts["model"]
     scaler = artifacts["scaler"]
@@ -77,18 +92,22 @@ iso_forest, scaler, feature_cols = load_model()
 # =========================================================
 # 2) تحميل بيانات CPU الحقيقية + توليد بيانات تجريبية
 # =========================================================
+# القراءات من cache ثنائي (ingest.py) بدل ما نقرأ الـ CSV كل تفاعل
+BASE_POINTS = 500
+
 def load_base_cpu_series():
-    df = pd.read_csv("data/ec2_cpu_utilization_24ae8d.csv")
-    cpu = df["value"].values
-    return cpu[:500]
+    cpu = load_series(DATA_FILE).values
+    return cpu[:BASE_POINTS]
 
-def generate_fake_cpu_data(n_points=100, with_anomalies=True, anomaly_ratio=0.05):
+def generate_fake_cpu_data(n_points=100, with_anomalies=True, anomaly_ratio=0.05, seed=0):
+    # نفس الإعدادات + نفس الـ seed = نفس البيانات (عشان الكاش)
+    rng = np.random.default_rng(seed)
     df_base = load_base_cpu_series()
 
     if n_points >= len(df_base):
         window = df_base.copy()
     else:
-        start_idx = np.random.randint(0, len(df_base) - n_points)
+        start_idx = rng.integers(0, len(df_base) - n_points)
         window = df_base[start_idx:start_idx + n_points]
 
     values = window.copy()
@@ -98,15 +117,15 @@ def generate_fake_cpu_data(n_points=100, with_anomalies=True, anomaly_ratio=0.05
         normal_low, normal_high = 0.13, 0.18
         for i, v in enumerate(values):
             if v > anomaly_threshold:
-                values[i] = np.random.uniform(normal_low, normal_high)
+                values[i] = rng.uniform(normal_low, normal_high)
     else:
         current_anom_idx = np.where(values > anomaly_threshold)[0]
         target_anom = max(1, int(n_points * anomaly_ratio))
         missing = max(0, target_anom - len(current_anom_idx))
         if missing > 0:
-            extra_idx = np.random.choice(range(n_points), size=missing, replace=False)
+            extra_idx = rng.choice(n_points, size=missing, replace=False)
             for idx in extra_idx:
-                values[idx] = np.random.uniform(0.35, 0.9)
+                values[idx] = rng.uniform(0.35, 0.9)
 
     start_time = datetime.now() - timedelta(minutes=5 * n_points)
     timestamps = [start_time + timedelta(minutes=5 * i) for i in range(n_points)]
@@ -119,46 +138,126 @@ def generate_fake_cpu_data(n_points=100, with_anomalies=True, anomaly_ratio=0.05
 
 
 # =========================================================
-# 3) Feature Engineering نفس اللي بالمودل
+# 3) Feature Engineering: add_features موجودة في features.py
+#    (نفس الحساب يستخدمه الـ streaming detector)
 # =========================================================
-def add_features(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-
-
-    df["rolling_mean_12"] = df["value"].rolling(window=12, min_periods=1).mean()
-
-  
-    df["rolling_std_12"] = df["value"].rolling(window=12, min_periods=2).std()
-
-  
-    df["diff_1"] = df["value"].diff()
-
-
-    df["rolling_std_12"] = df["rolling_std_12"].fillna(0)
-    df["diff_1"] = df["diff_1"].fillna(0)
-
-    return df
 
 # =========================================================
 # 4) دالة التنبؤ باستخدام المودل
 # =========================================================
 def predict_anomalies(df_raw: pd.DataFrame) -> pd.DataFrame:
-    df_feat = add_features(df_raw)
+    df_feat = add_features(df_raw, feature_cols)
 
-   
-    X = df_feat[feature_cols].copy()
+    X = df_feat[feature_cols].fillna(0).values
+    X_scaled = X if scaler is None else scaler.transform(X)
 
+    df_feat["prediction"] = iso_forest.predict(X_scaled)
+    return df_feat
 
-    X = X.fillna(0)
 
- 
-    X_scaled = scaler.transform(X.values)
+# السلسلة المقيّمة تنحفظ لكل مجموعة إعدادات؛ تغيير الـ widgets ما يعيد الحساب
+@st.cache_data(max_entries=64, show_spinner=False)
+def scored_demo_series(n_points, with_anomalies, anomaly_ratio, seed):
+    df_raw = generate_fake_cpu_data(
+        n_points=n_points,
+        with_anomalies=with_anomalies,
+        anomaly_ratio=anomaly_ratio,
+        seed=seed
+    )
+    return predict_anomalies(df_raw)
 
+# =========================================================
+# 4.1) العرض: KPIs + جدول + رسم (Vega-Lite يرسم في المتصفح بدل صورة matplotlib)
+# =========================================================
+COLUMN_LABELS = {
+    "timestamp": "الوقت",
+    "value": "قيمة CPU",
+    "rolling_mean_12": "المتوسط المتحرك",
+    "rolling_std_12": "الانحراف المعياري",
+    "diff_1": "التغير عن القراءة السابقة",
+    "score": "درجة الشذوذ (سالب = شاذ)",
+    "prediction": "حالة القراءة (1 طبيعي / -1 شاذ)",
+}
+
+
+def render_kpis(df_pred, total_points=None, n_anomalies=None):
+    col1, col2, col3 = st.columns(3)
+
+    if total_points is None:
+        total_points = len(df_pred)
+    if n_anomalies is None:
+        n_anomalies = int((df_pred["prediction"] == -1).sum())
+    last_anom_time = df_pred.loc[df_pred["prediction"] == -1, "timestamp"].max()
+
+    with col1:
+        st.metric("عدد القراءات", total_points)
+
+    with col2:
+        st.metric("عدد حالات الشذوذ المكتشفة", n_anomalies)
+
+    with col3:
+        if pd.isna(last_anom_time):
+            st.metric("آخر وقت تم فيه اكتشاف شذوذ", "لا يوجد")
+        else:
+            st.metric(
+                "آخر وقت تم فيه اكتشاف شذوذ",
+                last_anom_time.strftime("%Y-%m-%d %H:%M")
+            )
+
+
+def render_table(df_pred, rows=30):
+    columns = ["timestamp", "value"]
+    columns += [c for c in feature_cols if c != "value" and c in df_pred]
+    columns += [c for c in ("score", "prediction") if c in df_pred]
+
+    st.dataframe(
+        df_pred[columns]
+          .tail(rows)
+          .rename(columns=COLUMN_LABELS)
+    )
 
-    preds = iso_forest.predict(X_scaled)
 
-    df_feat["prediction"] = preds
-    return df_feat
+def render_chart(df_pred):
+    # نرسل للمتصفح نسخة ملخّصة (min/max لكل جزء + كل نقاط الشذوذ) مهما طالت السلسلة
+    anomalies = (df_pred["prediction"] == -1).to_numpy()
+    idx = downsample(df_pred["value"].to_numpy(), keep=anomalies)
+
+    data = pd.DataFrame({
+        "timestamp": df_pred["timestamp"].to_numpy()[idx],
+        "value": df_pred["value"].to_numpy()[idx],
+        "status": np.where(anomalies[idx], "Anomaly", "Normal"),
+    })
+
+    x = {"field": "timestamp", "type": "temporal", "title": "Time"}
+    y = {"field": "value", "type": "quantitative", "title": "CPU Utilization"}
+    st.vega_lite_chart(data, {
+        "height": 320,
+        "background": "#03130E",
+        "layer": [
+            {
+                "mark": {"type": "line", "color": ABSHEER_PRIMARY, "strokeWidth": 1},
+                "encoding": {"x": x, "y": y},
+            },
+            {
+                "mark": {"type": "circle", "opacity": 1},
+                "encoding": {
+                    "x": x,
+                    "y": y,
+                    "color": {
+                        "field": "status", "type": "nominal", "title": None,
+                        "scale": {"domain": ["Normal", "Anomaly"], "range": ["#4CAF50", "#FF5252"]},
+                    },
+                    "size": {"condition": {"test": "datum.status === 'Anomaly'", "value": 60}, "value": 25},
+                    "tooltip": [x, y, {"field": "status", "type": "nominal"}],
+                },
+            },
+        ],
+        "config": {
+            "view": {"stroke": None},
+            "axis": {"labelColor": TEXT_COLOR, "titleColor": TEXT_COLOR, "gridOpacity": 0.3, "gridDash": [4, 4]},
+            "legend": {"labelColor": TEXT_COLOR},
+        },
+    }, use_container_width=True)
 
 # =========================================================
 # 5) الهيدر + اللوقو
@@ -166,7 +265,7 @@ def predict_anomalies(df_raw: pd.DataFrame) -> pd.DataFrame:
 header_col_logo, header_col_title = st.columns([1, 5])
 
 with header_col_logo:
-    st.image("model/logo.png", width=130)   
+    st.image(str(LOGO_FILE), width=130)
 
 with header_col_title:
     st.markdown(
@@ -184,134 +283,133 @@ st.markdown("---")
 # =========================================================
 st.sidebar.header("⚙️ إعدادات البيانات")
 
-n_points = st.sidebar.slider(
-    "عدد النقاط الزمنية",
-    min_value=50,
-    max_value=500,
-    value=150,
-    step=50
-)
-
-mode = st.sidebar.selectbox(
-    "نوع السيناريو",
-    ["بدون شذوذ (تشغيل طبيعي)", "مع شذوذ (ارتفاعات مفاجئة)"]
-)
-
-if mode == "بدون شذوذ (تشغيل طبيعي)":
-    with_anomalies = False
-    anomaly_ratio = 0.0
-else:
-    with_anomalies = True
-    anomaly_ratio = st.sidebar.slider("نسبة الشذوذ من البيانات", 0.01, 0.3, 0.05)
+view = st.sidebar.radio("طريقة العرض", ["سيناريو تجريبي", "مراقبة لحظية"])
 
-# =========================================================
-# 7) توليد البيانات + التنبؤ
-# =========================================================
-df_raw = generate_fake_cpu_data(
-    n_points=n_points,
-    with_anomalies=with_anomalies,
-    anomaly_ratio=anomaly_ratio
-)
-
-df_pred = predict_anomalies(df_raw)
 
 # =========================================================
-# 8) KPIs أعلى الداشبورد
+# 7) السيناريو التجريبي: بيانات مولّدة + التنبؤ (من الكاش إذا نفس الإعدادات)
 # =========================================================
-col1, col2, col3 = st.columns(3)
-
-total_points = len(df_pred)
-n_anomalies = int((df_pred["prediction"] == -1).sum())
-last_anom_time = df_pred.loc[df_pred["prediction"] == -1, "timestamp"].max()
-
-with col1:
-    st.metric("عدد القراءات", total_points)
+def demo_view():
+    n_points = st.sidebar.slider(
+        "عدد النقاط الزمنية",
+        min_value=50,
+        max_value=500,
+        value=150,
+        step=50
+    )
 
-with col2:
-    st.metric("عدد حالات الشذوذ المكتشفة", n_anomalies)
+    mode = st.sidebar.selectbox(
+        "نوع السيناريو",
+        ["بدون شذوذ (تشغيل طبيعي)", "مع شذوذ (ارتفاعات مفاجئة)"]
+    )
 
-with col3:
-    if pd.isna(last_anom_time):
-        st.metric("آخر وقت تم فيه اكتشاف شذوذ", "لا يوجد")
+    if mode == "بدون شذوذ (تشغيل طبيعي)":
+        with_anomalies = False
+        anomaly_ratio = 0.0
     else:
-        st.metric(
-            "آخر وقت تم فيه اكتشاف شذوذ",
-            last_anom_time.strftime("%Y-%m-%d %H:%M")
-        )
-
-# =========================================================
-# 9) جدول آخر 30 قراءة
-# =========================================================
-st.subheader("📄 جدول القراءات مع التنبؤ (آخر 30 نقطة):")
-
-st.dataframe(
-    df_pred[["timestamp", "value", "rolling_mean_12", "rolling_std_12", "diff_1", "prediction"]]
-      .tail(30)
-      .rename(columns={
-          "timestamp": "الوقت",
-          "value": "قيمة CPU",
-          "rolling_mean_12": "المتوسط المتحرك",
-          "rolling_std_12": "الانحراف المعياري",
-          "diff_1": "التغير عن القراءة السابقة",
-          "prediction": "حالة القراءة (1 طبيعي / -1 شاذ)"
-      })
-)
+        with_anomalies = True
+        anomaly_ratio = st.sidebar.slider("نسبة الشذوذ من البيانات", 0.01, 0.3, 0.05)
 
-# =========================================================
-# 10) الرسم البياني للشذوذ
-# =========================================================
-st.subheader("📈 مخطط قراءات CPU مع تمييز الشذوذ")
+    if st.sidebar.button("🔄 بيانات جديدة"):
+        st.session_state["demo_seed"] = st.session_state.get("demo_seed", 0) + 1
 
-fig, ax = plt.subplots(figsize=(11, 4))
+    df_pred = scored_demo_series(n_points, with_anomalies, anomaly_ratio, st.session_state.get("demo_seed", 0))
 
+    render_kpis(df_pred)
 
-ax.plot(
-    df_pred["timestamp"],
-    df_pred["value"],
-    marker="o",
-    linewidth=1,
-    color=ABSHEER_PRIMARY,
-    label="CPU value"
-)
-
+    st.subheader("📄 جدول القراءات مع التنبؤ (آخر 30 نقطة):")
+    render_table(df_pred)
 
-normal_points = df_pred[df_pred["prediction"] == 1]
-anom_points   = df_pred[df_pred["prediction"] == -1]
-
-
-ax.scatter(
-    normal_points["timestamp"],
-    normal_points["value"],
-    s=25,
-    color="#4CAF50",
-    label="Normal"
-)
+    st.subheader("📈 مخطط قراءات CPU مع تمييز الشذوذ")
+    render_chart(df_pred)
 
 
-if len(anom_points) > 0:
-    ax.scatter(
-        anom_points["timestamp"],
-        anom_points["value"],
-        s=60,
-        color="#FF5252",
-        label="Anomaly"
-    )
-
-ax.set_xlabel("Time", color=TEXT_COLOR)
-ax.set_ylabel("CPU Utilization", color=TEXT_COLOR)
-ax.tick_params(axis='x', colors=TEXT_COLOR, rotation=20)
-ax.tick_params(axis='y', colors=TEXT_COLOR)
+# =========================================================
+# 8) المراقبة اللحظية: كل تحديث يقيّم القراءات الجديدة فقط ويعيد رسم هذا الجزء بس
+#    (القراءات من ملفات data/ تنعاد كأنها توصل الحين)
+# =========================================================
+def live_state(path, rate):
+    # الحالة لكل جلسة؛ تتصفّر إذا تغيّر الجهاز أو السرعة
+    key = (str(path), rate)
+    state = st.session_state.get("live")
+    if state is None or state["key"] != key:
+        feed = ReplayFeed(path, rate)
+        series = LiveSeries(iso_forest, scaler, feature_cols)
+        series.append(*feed.history())
+        state = st.session_state["live"] = {
+            "key": key,
+            "feed": feed,
+            "series": series,
+            "latency": deque(maxlen=100),
+        }
+    return state
+
+
+def live_panel(path, rate):
+    state = live_state(path, rate)
+    feed, series = state["feed"], state["series"]
+
+    latency_box = st.empty()
+    started = time.perf_counter()
+
+    timestamps, values, arrived = feed.poll(max_points=series.timestamps.maxlen)
+    series.append(timestamps, values)
+    df_live = series.frame()
+
+    render_kpis(df_live, total_points=series.total, n_anomalies=series.anomalies)
+    st.subheader("📈 القراءات اللحظية")
+    render_chart(df_live)
+
+    # من وصول القراءة لين ما انرسل رسمها (يشمل الانتظار لين التحديث الجاي)
+    shown_at = time.time()
+    state["latency"].extend(shown_at - arrived)
+    processing_ms = (time.perf_counter() - started) * 1000
+
+    with latency_box.container():
+        col1, col2, col3 = st.columns(3)
+        col1.metric("قراءات جديدة بهذا التحديث", len(values))
+        if state["latency"]:
+            latency = np.asarray(state["latency"])
+            col2.metric(
+                "التأخير من الاستلام للعرض (p50 / max)",
+                f"{np.median(latency) * 1000:.0f} / {latency.max() * 1000:.0f} ms"
+            )
+        col3.metric("زمن التقييم + الرسم", f"{processing_ms:.1f} ms")
+
+    st.subheader("📄 آخر القراءات")
+    render_table(df_live, rows=15)
+
+    if feed.finished:
+        st.success("✅ انتهت قراءات هذا الجهاز")
+
+
+def live_view():
+    hosts = {p.stem: p for p in discover()}
+    host = st.sidebar.selectbox("الجهاز", list(hosts))
+    rate = st.sidebar.select_slider("قراءات بالثانية", options=[1, 2, 5, 10, 25, 50, 100], value=5)
+    refresh = st.sidebar.slider("التحديث كل (ثانية)", 1, 10, 2)
+    paused = st.sidebar.toggle("إيقاف مؤقت", value=False)
+
+    if st.sidebar.button("⏮️ من البداية"):
+        st.session_state.pop("live", None)
+
+    state = live_state(hosts[host], rate)
+    if paused:
+        state["feed"].pause()
+    else:
+        state["feed"].resume()
 
-ax.grid(True, linestyle="--", linewidth=0.5, alpha=0.3)
-ax.set_facecolor("#03130E")
+    # st.fragment: بس هذا الجزء يعيد التشغيل كل refresh ثانية، باقي الصفحة ثابت
+    st.fragment(live_panel, run_every=None if paused else refresh)(hosts[host], rate)
 
-ax.legend(facecolor="#03130E", edgecolor="none", labelcolor=TEXT_COLOR)
-fig.tight_layout()
 
-st.pyplot(fig)
+if view == "مراقبة لحظية":
+    live_view()
+else:
+    demo_view()
 
 # =========================================================
-# 11) ملاحظة توضيحية
+# 9) ملاحظة توضيحية
 # =========================================================
 st.info(
     "🧪 ملاحظة: البيانات في هذه اللوحة تجريبية (خيالية) فقط لشرح الفكرة؛ "
@@ -0,0 +1,176 @@
+import math
+import re
+from typing import TYPE_CHECKING
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# pandas بس للـ type hint؛ الـ workers اللي تستخدم compute_features ما تحتاج تحمّله
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# نافذة 12 قراءة = ساعة واحدة إذا القراءات كل 5 دقائق (نفس النوتبوك)
+WINDOW = 12
+
+# =========================================================
+# الـ spec: أسماء الأعمدة نفسها (تنحفظ في الـ artifact كـ feature_cols)
+#   value                 القراءة نفسها
+#   rolling_mean_<w>      متوسط آخر w قراءة (من أول قراءة)
+#   rolling_std_<w>       الانحراف المعياري (ddof=1، صفر لأقل من قراءتين)
+#   rolling_median_<w>    الوسيط
+#   rolling_mad_<w>       median(|x - الوسيط|) داخل النافذة
+#   ewma_<span>           متوسط أُسّي مثل pandas ewm(span, adjust=True)
+#   diff_<k>              x[t] - x[t-k] (صفر لأول k قراءات)
+# =========================================================
+_SPEC = re.compile(r"^(?:(value)|(rolling_mean|rolling_std|rolling_median|rolling_mad|ewma|diff)_(\d+))$")
+
+
+def parse_feature(name):
+    match = _SPEC.match(name)
+    if match is None or (match.group(3) is not None and int(match.group(3)) < 1):
+        raise ValueError(f"unknown feature '{name}'")
+    if match.group(1):
+        return "value", 0
+    return match.group(2), int(match.group(3))
+
+
+def feature_names(window=WINDOW):
+    return ("value", f"rolling_mean_{window}", f"rolling_std_{window}", "diff_1")
+
+
+# الأعمدة الأصلية للمودل (value, rolling_mean_12, rolling_std_12, diff_1)
+FEATURE_NAMES = feature_names()
+
+
+# =========================================================
+# Feature Engineering نفس اللي بالمودل (تدريب وتقييم)
+# =========================================================
+def add_features(df: "pd.DataFrame", cols=FEATURE_NAMES) -> "pd.DataFrame":
+    df = df.copy()
+    values = df["value"].to_numpy(dtype=float)
+
+    matrix = compute_features(values, [len(values)], cols)
+    for i, col in enumerate(cols):
+        if col != "value":
+            df[col] = matrix[:, i]
+
+    return df
+
+
+# =========================================================
+# المحرك: كل الأعمدة لعدة سلاسل (ورا بعض في مصفوفة وحدة) بمرور واحد
+# =========================================================
+class _Windows:
+    # نافذة كل نقطة = آخر w قراءة (sliding_window_view بدون نسخ)،
+    # والقراءات اللي قبل بداية الجهاز تنشال بالـ mask
+    def __init__(self, values, pos, group_start, window):
+        padded = np.concatenate([np.zeros(window - 1), values])
+        self.view = sliding_window_view(padded, window)
+        offsets = pos[:, None] - (window - 1) + np.arange(window)
+        self.valid = offsets >= group_start[:, None]
+        self.count = np.minimum(pos - group_start + 1, window)
+        self._mean = None
+        self._median = None
+
+    def mean(self):
+        if self._mean is None:
+            self._mean = np.where(self.valid, self.view, 0.0).sum(axis=1) / self.count
+        return self._mean
+
+    def std(self):
+        sq = np.where(self.valid, (self.view - self.mean()[:, None]) ** 2, 0.0).sum(axis=1)
+        std = np.sqrt(sq / np.maximum(self.count - 1, 1))
+        std[self.count < 2] = 0.0
+
+        # نافذة كل قيمها متساوية تباينها صفر بالضبط (مثل pandas)
+        high = np.where(self.valid, self.view, -np.inf).max(axis=1)
+        low = np.where(self.valid, self.view, np.inf).min(axis=1)
+        std[high == low] = 0.0
+        return std
+
+    def _sorted_median(self, windows):
+        # القيم الخارج النافذة = +inf فتنرتب آخر شي، والوسيط من أول count قيمة
+        ordered = np.sort(np.where(self.valid, windows, np.inf), axis=1)
+        lo = ((self.count - 1) // 2)[:, None]
+        hi = (self.count // 2)[:, None]
+        return (np.take_along_axis(ordered, lo, 1) + np.take_along_axis(ordered, hi, 1))[:, 0] / 2
+
+    def median(self):
+        if self._median is None:
+            self._median = self._sorted_median(self.view)
+        return self._median
+
+    def mad(self):
+        return self._sorted_median(np.abs(self.view - self.median()[:, None]))
+
+
+def _linear_scan(x, r):
+    # y[t] = r * y[t-1] + x[t] بدون loop: cumsum داخل بلوكات (r^-q ما يطفح)،
+    # ونهايات البلوكات نفس المعادلة بـ r^B (recursion)
+    n = len(x)
+    if n == 0 or r == 0.0:
+        return x.copy()
+
+    block = int(min(n, 4096, max(2, 250 / -math.log10(r))))
+    blocks = -(-n // block)
+    padded = np.zeros(blocks * block)
+    padded[:n] = x
+    padded = padded.reshape(blocks, block)
+
+    q = np.arange(block)
+    local = np.cumsum(padded * r ** -q, axis=1) * r ** q
+    if blocks > 1:
+        carry = _linear_scan(local[:, -1], r ** block)
+        local[1:] += r ** (q + 1) * carry[:-1, None]
+    return local.ravel()[:n]
+
+
+def _ewma(values, pos, group_start, span):
+    # pandas ewm(span, adjust=True): sum(r^k x[t-k]) / sum(r^k) من بداية الجهاز
+    r = 1.0 - 2.0 / (span + 1.0)
+    total = _linear_scan(values, r)
+
+    # نشيل اللي وصل من الجهاز اللي قبله: r^(p+1) * قيمة الـ scan قبل بداية الجهاز
+    before = np.where(group_start > 0, total[np.maximum(group_start - 1, 0)], 0.0)
+    own = total - r ** (pos - group_start + 1) * before
+
+    weights = (1.0 - r ** (pos - group_start + 1)) / (1.0 - r) if r > 0 else np.ones(len(values))
+    return own / weights
+
+
+def compute_features(values, lengths, cols=FEATURE_NAMES):
+    # values: قراءات كل الأجهزة ورا بعض، lengths: عدد قراءات كل جهاز بالترتيب
+    # يرجع مصفوفة (N, len(cols)) بنفس ترتيب cols
+    values = np.asarray(values, dtype=float)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    n = len(values)
+    spec = [parse_feature(c) for c in cols]
+
+    starts = np.cumsum(lengths) - lengths
+    group_start = np.repeat(starts, lengths)
+    pos = np.arange(n)
+
+    # كل نافذة تنبني مرة وحدة ولو استخدمتها أكثر من feature
+    windows = {}
+
+    def window(w):
+        if w not in windows:
+            windows[w] = _Windows(values, pos, group_start, w)
+        return windows[w]
+
+    out = np.empty((n, len(spec)))
+    for i, (kind, param) in enumerate(spec):
+        if kind == "value":
+            out[:, i] = values
+        elif kind == "diff":
+            column = np.zeros(n)
+            column[param:] = values[param:] - values[:-param]
+            column[pos - group_start < param] = 0.0
+            out[:, i] = column
+        elif kind == "ewma":
+            out[:, i] = _ewma(values, pos, group_start, param)
+        else:
+            out[:, i] = getattr(window(param), kind[len("rolling_"):])()
+
+    return out
@@ -0,0 +1,153 @@
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+
+THIS_DIR = Path(__file__).resolve().parent
+MODEL_FILE = THIS_DIR / "cpu_anomaly_iso_forest.pkl"
+
+# كم صف نمشيه في الأشجار مرة وحدة (أصغر = المصفوفات تبقى في الـ cache)
+CHUNK_ROWS = 64
+
+
+def average_path_length(n_samples):
+    # نفس _average_path_length في sklearn.ensemble._iforest
+    n_samples = np.asarray(n_samples, dtype=float)
+    result = np.zeros(n_samples.shape)
+    many = n_samples > 2
+    result[n_samples == 2] = 1.0
+    result[many] = (
+        2.0 * (np.log(n_samples[many] - 1.0) + np.euler_gamma)
+        - 2.0 * (n_samples[many] - 1.0) / n_samples[many]
+    )
+    return result
+
+
+# =========================================================
+# الغابة كلها في مصفوفات NumPy متصلة: كل العُقد ورا بعض، والأشجار كلها تنمشي مع بعض
+# (الـ StandardScaler داخلها، فالمدخل هو الـ features الخام)
+# =========================================================
+class FlatForest:
+
+    def __init__(self, feature, threshold, left, leaf_value, roots, depth,
+                 mean, scale, denominator, offset, feature_cols):
+        self.feature = feature              # (nodes,) رقم الـ feature لكل عقدة
+        self.threshold = threshold          # (nodes,) الورقة +inf
+        self.left = left                    # (nodes,) الابن اليسار، واليمين بعده مباشرة؛ الورقة تشاور على نفسها
+        self.leaf_value = leaf_value        # (nodes,) عمق الورقة + average_path_length - 1
+        self.roots = roots                  # (trees,) أول عقدة في كل شجرة
+        self.depth = int(depth)             # أعمق شجرة = عدد خطوات المشي
+        self.mean = mean
+        self.scale = scale
+        self.denominator = float(denominator)
+        self.offset = float(offset)
+        self.feature_cols = list(feature_cols)
+
+    @classmethod
+    def from_sklearn(cls, iso_forest, scaler, feature_cols):
+        n_features = len(feature_cols)
+        subsample = iso_forest._max_features != n_features
+
+        features, thresholds, lefts, values, roots = [], [], [], [], []
+        base = 0
+        max_depth = 0
+
+        for tree, tree_features in zip(iso_forest.estimators_, iso_forest.estimators_features_):
+            t = tree.tree_
+            n = t.node_count
+            leaf_samples = average_path_length(t.n_node_samples)
+            tree_features = np.asarray(tree_features)
+
+            feat = np.zeros(n, dtype=np.int64)
+            thr = np.full(n, np.inf)
+            left = np.zeros(n, dtype=np.int64)
+            value = np.zeros(n)
+
+            # ترتيب BFS عشان الابن اليمين يكون دايماً left + 1
+            queue = deque([(0, 0, 0)])          # (عقدة sklearn، مكانها الجديد، عمقها)
+            next_free = 1
+            while queue:
+                old, new, depth = queue.popleft()
+                max_depth = max(max_depth, depth)
+
+                if t.children_left[old] == -1:
+                    left[new] = new + base
+                    # نفس ترتيب الجمع في sklearn: (مسار القرار + average_path_length) - 1
+                    value[new] = (depth + 1.0) + leaf_samples[old] - 1.0
+                    continue
+
+                f = t.feature[old]
+                feat[new] = tree_features[f] if subsample else f
+                thr[new] = t.threshold[old]
+                left[new] = next_free + base
+                queue.append((t.children_left[old], next_free, depth + 1))
+                queue.append((t.children_right[old], next_free + 1, depth + 1))
+                next_free += 2
+
+            features.append(feat)
+            thresholds.append(thr)
+            lefts.append(left)
+            values.append(value)
+            roots.append(base)
+            base += n
+
+        if scaler is None:
+            mean, scale = np.zeros(n_features), np.ones(n_features)
+        else:
+            mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+            scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+
+        denominator = len(iso_forest.estimators_) * average_path_length([iso_forest._max_samples])[0]
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            leaf_value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.int64),
+            depth=max_depth,
+            mean=np.asarray(mean, dtype=np.float64),
+            scale=np.asarray(scale, dtype=np.float64),
+            denominator=denominator,
+            offset=iso_forest.offset_,
+            feature_cols=feature_cols,
+        )
+
+    @classmethod
+    def from_pickle(cls, path=MODEL_FILE):
+        import joblib
+
+        artifacts = joblib.load(path)
+        return cls.from_sklearn(artifacts["model"], artifacts["scaler"], artifacts["feature_cols"])
+
+    # -----------------------------------
+    def score_samples(self, X):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(self.mean))
+
+        # sklearn يطبق الـ scaler بـ float64 ثم يحوّل لـ float32 قبل الأشجار
+        Xs = ((X - self.mean) / self.scale).astype(np.float32).astype(np.float64)
+
+        depths = np.empty(len(Xs))
+        n_features = Xs.shape[1]
+        for start in range(0, len(Xs), CHUNK_ROWS):
+            chunk = Xs[start:start + CHUNK_ROWS]
+            flat = chunk.ravel()
+            row_base = (np.arange(len(chunk)) * n_features)[:, None]
+
+            # كل الأشجار لكل الصفوف مع بعض؛ الورقة تبقى مكانها لأن threshold = +inf
+            node = np.tile(self.roots, (len(chunk), 1))
+            for _ in range(self.depth):
+                node = self.left[node] + (flat[row_base + self.feature[node]] > self.threshold[node])
+
+            # cumsum يجمع الأشجار بالترتيب مثل sklearn فالنتيجة نفسها بالضبط
+            depths[start:start + CHUNK_ROWS] = np.cumsum(self.leaf_value[node], axis=1)[:, -1]
+
+        return -(2 ** -(depths / self.denominator))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
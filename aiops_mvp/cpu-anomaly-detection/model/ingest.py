@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+
+THIS_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = THIS_DIR.parent
+DATA_DIR = PROJECT_ROOT / "data"
+DATA_FILE = DATA_DIR / "ec2_cpu_utilization_24ae8d.csv"
+
+# نسخة ثنائية من كل CSV: timestamps (int64 ns) + values (float64) كملفات .npy تنفتح mmap
+CACHE_DIR = Path(os.environ.get("CPU_METRICS_CACHE", DATA_DIR / ".cache"))
+
+Series = namedtuple("Series", ["timestamps", "values"])
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _cache_paths(path):
+    folder = CACHE_DIR / Path(path).stem
+    return folder, folder / "timestamps.npy", folder / "values.npy", folder / "source.json"
+
+
+# -----------------------------------
+#  CSV → .npy مرة وحدة؛ نعيد التحويل بس إذا تغيّر الـ mtime أو الحجم
+def _build_cache(path, signature):
+    import pandas as pd
+
+    df = pd.read_csv(path, usecols=["timestamp", "value"], parse_dates=["timestamp"])
+    df = df.sort_values("timestamp", kind="stable")
+
+    folder, ts_file, values_file, meta_file = _cache_paths(path)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    # الكتابة لملفات مؤقتة ثم rename، والـ source.json آخر شي عشان ما ينقرأ cache ناقص
+    suffix = f".{os.getpid()}.tmp"
+    for target, array in (
+        (ts_file, df["timestamp"].to_numpy(dtype="datetime64[ns]").view(np.int64)),
+        (values_file, df["value"].to_numpy(dtype=np.float64)),
+    ):
+        tmp = target.with_name(target.name + suffix)
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, target)
+
+    tmp = meta_file.with_name(meta_file.name + suffix)
+    tmp.write_text(json.dumps({"source": str(path), **signature, "points": len(df)}), encoding="utf-8")
+    os.replace(tmp, meta_file)
+
+
+def _open(path):
+    path = Path(path).resolve()
+    signature = _signature(path)
+
+    with _lock:
+        cached = _loaded.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        folder, ts_file, values_file, meta_file = _cache_paths(path)
+        try:
+            meta = json.loads(meta_file.read_text(encoding="utf-8"))
+            fresh = meta["mtime_ns"] == signature["mtime_ns"] and meta["size"] == signature["size"]
+        except (FileNotFoundError, ValueError, KeyError):
+            fresh = False
+
+        if not fresh:
+            _build_cache(path, signature)
+
+        series = Series(
+            np.load(ts_file, mmap_mode="r").view("datetime64[ns]"),
+            np.load(values_file, mmap_mode="r"),
+        )
+        _loaded[path] = (signature, series)
+        return series
+
+
+def _to_ns(value):
+    return np.datetime64(value, "ns")
+
+
+# -----------------------------------
+def load_series(path=DATA_FILE, start=None, end=None, tail=None):
+    # start/end: فترة زمنية [start, end)؛ tail: آخر كذا قراءة من الفترة
+    # النتيجة views على الـ mmap (بدون نسخ) — اللي يبي يعدّل يسوي copy
+    series = _open(path)
+    ts = series.timestamps
+
+    lo = 0 if start is None else int(np.searchsorted(ts, _to_ns(start), side="left"))
+    hi = len(ts) if end is None else int(np.searchsorted(ts, _to_ns(end), side="left"))
+    if tail is not None:
+        lo = max(lo, hi - tail)
+
+    return Series(ts[lo:hi], series.values[lo:hi])
+
+
+def discover(data_dir=DATA_DIR):
+    return sorted(Path(data_dir).glob("*.csv"))
+
+
+def load_many(paths=None, start=None, end=None, tail=None):
+    # {اسم السلسلة (اسم الملف): Series}
+    if paths is None:
+        paths = discover()
+    return {Path(p).stem: load_series(p, start=start, end=end, tail=tail) for p in paths}
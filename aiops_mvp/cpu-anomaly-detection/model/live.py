@@ -0,0 +1,130 @@
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from ingest import load_series
+from streaming import StreamingDetector
+
+
+# آخر كذا قراءة تبقى بذاكرة الجلسة (الأقدم تنشال)
+LIVE_MAX_POINTS = 5000
+
+# أقصى نقاط نرسلها للرسم؛ الباقي يتلخّص (min/max لكل bucket + كل نقاط الشذوذ)
+CHART_MAX_POINTS = 1500
+
+# قراءات قبل بداية البث نقيّمها مرة وحدة عشان الـ rolling يبدأ دافي (288 = يوم)
+WARMUP_POINTS = 288
+
+
+# =========================================================
+# 1) مصدر القراءات: إعادة تشغيل CSV كأنها قراءات تجي الحين (rate قراءة/ثانية)
+# =========================================================
+class ReplayFeed:
+
+    def __init__(self, path, rate, start=WARMUP_POINTS, clock=time.time):
+        self.series = load_series(path)
+        self.rate = float(rate)
+        self.position = min(start, len(self.series.values))
+        self.clock = clock
+        self.started_at = clock()
+        self.paused_at = None
+        self.first = self.position
+
+    def history(self):
+        # القراءات اللي قبل البداية (للتسخين)
+        return self.series.timestamps[:self.first], self.series.values[:self.first]
+
+    def pause(self):
+        if self.paused_at is None:
+            self.paused_at = self.clock()
+
+    def resume(self):
+        # الوقت الموقوف ما ينحسب، فما تجي دفعة قراءات مكدسة بعد الرجوع
+        if self.paused_at is not None:
+            self.started_at += self.clock() - self.paused_at
+            self.paused_at = None
+
+    def poll(self, max_points=None):
+        # القراءات اللي وصل وقتها من آخر poll + وقت وصول كل وحدة
+        now = self.clock() if self.paused_at is None else self.paused_at
+        due = self.first + int((now - self.started_at) * self.rate)
+        stop = min(due, len(self.series.values))
+        if max_points is not None:
+            stop = min(stop, self.position + max_points)
+
+        start, self.position = self.position, max(self.position, stop)
+        arrived = self.started_at + (np.arange(start, self.position) - self.first + 1) / self.rate
+        return self.series.timestamps[start:self.position], self.series.values[start:self.position], arrived
+
+    @property
+    def finished(self):
+        return self.position >= len(self.series.values)
+
+
+# =========================================================
+# 2) السلسلة المقيّمة: كل poll يقيّم القراءات الجديدة فقط (StreamingDetector)
+# =========================================================
+class LiveSeries:
+
+    def __init__(self, model, scaler, feature_cols, max_points=LIVE_MAX_POINTS):
+        self.detector = StreamingDetector(model, scaler, feature_cols)
+        self.timestamps = deque(maxlen=max_points)
+        self.values = deque(maxlen=max_points)
+        self.scores = deque(maxlen=max_points)
+        self.predictions = deque(maxlen=max_points)
+        self.total = 0
+        self.anomalies = 0
+
+    def append(self, timestamps, values):
+        if len(values) == 0:
+            return 0
+        result = self.detector.update("live", values)
+
+        self.timestamps.extend(np.asarray(timestamps, dtype="datetime64[ns]"))
+        self.values.extend(np.asarray(values, dtype=float).tolist())
+        self.scores.extend(result["score"].tolist())
+        self.predictions.extend(result["prediction"].tolist())
+
+        self.total += len(values)
+        self.anomalies += int((result["prediction"] == -1).sum())
+        return len(values)
+
+    def frame(self):
+        return pd.DataFrame({
+            "timestamp": np.asarray(self.timestamps, dtype="datetime64[ns]"),
+            "value": np.fromiter(self.values, dtype=float, count=len(self.values)),
+            "score": np.fromiter(self.scores, dtype=float, count=len(self.scores)),
+            "prediction": np.fromiter(self.predictions, dtype=np.int64, count=len(self.predictions)),
+        })
+
+
+# =========================================================
+# 3) تلخيص للرسم: شكل السلسلة (min/max) يبقى والشذوذ ما يضيع
+# =========================================================
+def downsample(values, max_points=CHART_MAX_POINTS, keep=None):
+    # يرجع indices مرتبة؛ keep: mask لنقاط لازم تظهر (الشذوذ)
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+
+    buckets = max(1, max_points // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+    lows = np.minimum.reduceat(values, starts)
+    highs = np.maximum.reduceat(values, starts)
+
+    # أول index داخل كل bucket يساوي الـ min/الـ max
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    first_low = np.full(buckets, n)
+    first_high = np.full(buckets, n)
+    positions = np.arange(n)
+    np.minimum.at(first_low, bucket[values == lows[bucket]], positions[values == lows[bucket]])
+    np.minimum.at(first_high, bucket[values == highs[bucket]], positions[values == highs[bucket]])
+
+    picked = [first_low, first_high, [n - 1]]
+    if keep is not None:
+        picked.append(np.flatnonzero(keep))
+    return np.unique(np.concatenate(picked))
@@ -0,0 +1,215 @@
+from collections import deque
+
+import numpy as np
+
+from features import FEATURE_NAMES, parse_feature
+
+
+# كل كم تحديث نعيد حساب المتوسط والتباين من الـ buffer لمنع تراكم أخطاء الـ float
+RECOMPUTE_EVERY = 1000
+
+
+# =========================================================
+# 1) حالة سلسلة وحدة: Welford لكل نافذة mean/std + buffer للوسيط/الـ diff + EWMA
+#    (نفس الـ spec ونفس النتائج اللي يطلعها features.compute_features)
+# =========================================================
+class _RollingStats:
+
+    __slots__ = ("window", "buffer", "mean", "m2", "updates")
+
+    def __init__(self, window):
+        self.window = window
+        self.buffer = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+
+    def update(self, value):
+        if len(self.buffer) == self.window:
+            self._remove(self.buffer[0])
+        self.buffer.append(value)
+        self._add(value)
+
+        self.updates += 1
+        if self.updates % RECOMPUTE_EVERY == 0:
+            self._recompute()
+
+    def std(self, same_run):
+        # same_run: عدد القراءات المتتالية المتساوية (التباين صفر بالضبط)
+        n = len(self.buffer)
+        if n < 2 or same_run >= n:
+            return 0.0
+        return (max(self.m2, 0.0) / (n - 1)) ** 0.5
+
+    def _add(self, x):
+        n = len(self.buffer)
+        delta = x - self.mean
+        self.mean += delta / n
+        self.m2 += delta * (x - self.mean)
+
+    def _remove(self, x):
+        n = len(self.buffer) - 1
+        if n == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        delta = x - self.mean
+        self.mean -= delta / n
+        self.m2 -= delta * (x - self.mean)
+
+    def _recompute(self):
+        values = np.fromiter(self.buffer, dtype=float)
+        self.mean = float(values.mean())
+        self.m2 = float(((values - self.mean) ** 2).sum())
+
+    def to_dict(self):
+        return {"buffer": list(self.buffer), "mean": self.mean, "m2": self.m2, "updates": self.updates}
+
+    @classmethod
+    def from_dict(cls, window, data):
+        stats = cls(window)
+        stats.buffer.extend(data["buffer"])
+        stats.mean, stats.m2, stats.updates = data["mean"], data["m2"], data["updates"]
+        return stats
+
+
+class SeriesState:
+
+    __slots__ = ("spec", "stats", "history", "ewma", "last", "same_run")
+
+    def __init__(self, cols=FEATURE_NAMES):
+        self.spec = [parse_feature(c) for c in cols]
+        self.stats = {p: _RollingStats(p) for k, p in self.spec if k in ("rolling_mean", "rolling_std")}
+
+        # آخر قراءات تكفي أكبر نافذة وسيط/MAD وأكبر lag
+        keep = [p for k, p in self.spec if k in ("rolling_median", "rolling_mad")]
+        keep += [p + 1 for k, p in self.spec if k == "diff"]
+        self.history = deque(maxlen=max(keep, default=1))
+
+        # EWMA بوقت ثابت: البسط sum(r^k x) والمقام sum(r^k) مثل pandas adjust=True
+        self.ewma = {p: [1.0 - 2.0 / (p + 1.0), 0.0, 0.0] for k, p in self.spec if k == "ewma"}
+
+        self.last = None
+        self.same_run = 0
+
+    def update(self, value):
+        # يرجع قيم الأعمدة بنفس ترتيب الـ spec
+        value = float(value)
+        self.history.append(value)
+        for stats in self.stats.values():
+            stats.update(value)
+        for state in self.ewma.values():
+            state[1] = state[0] * state[1] + value
+            state[2] = state[0] * state[2] + 1.0
+
+        self.same_run = self.same_run + 1 if value == self.last else 1
+        self.last = value
+
+        return [self._feature(kind, param, value) for kind, param in self.spec]
+
+    # -----------------------------------
+    #  حفظ الحالة كـ JSON (anomaly.py يخزنها بالقاعدة عشان كل الـ workers يكملون نفس السلسلة)
+    def to_dict(self):
+        return {
+            "stats": {str(p): stats.to_dict() for p, stats in self.stats.items()},
+            "history": list(self.history),
+            "ewma": {str(p): state for p, state in self.ewma.items()},
+            "last": self.last,
+            "same_run": self.same_run,
+        }
+
+    @classmethod
+    def from_dict(cls, cols, data):
+        state = cls(cols)
+        state.stats = {p: _RollingStats.from_dict(p, data["stats"][str(p)]) for p in state.stats}
+        state.history.extend(data["history"])
+        state.ewma = {p: list(data["ewma"][str(p)]) for p in state.ewma}
+        state.last = data["last"]
+        state.same_run = data["same_run"]
+        return state
+
+    def _feature(self, kind, param, value):
+        if kind == "value":
+            return value
+        if kind == "rolling_mean":
+            return self.stats[param].mean
+        if kind == "rolling_std":
+            return self.stats[param].std(self.same_run)
+        if kind == "diff":
+            return value - self.history[-1 - param] if len(self.history) > param else 0.0
+        if kind == "ewma":
+            _, num, den = self.ewma[param]
+            return num / den
+
+        recent = np.fromiter(self.history, dtype=float)[-param:]
+        median = float(np.median(recent))
+        if kind == "rolling_median":
+            return median
+        return float(np.median(np.abs(recent - median)))
+
+
+# =========================================================
+# 2) كاشف لحظي لعدة سلاسل: يحدّث الـ features بوقت ثابت ويقيّم النقاط الجديدة فقط
+# =========================================================
+class StreamingDetector:
+
+    # scaler=None لما المودل ياخذ الـ features الخام (FlatForest في forest.py)
+    def __init__(self, model, scaler, feature_cols):
+        self.model = model
+        self.scaler = scaler
+        self.feature_cols = list(feature_cols)
+        self.series = {}
+
+    def _state(self, series_id):
+        state = self.series.get(series_id)
+        if state is None:
+            state = self.series[series_id] = SeriesState(self.feature_cols)
+        return state
+
+    def features(self, series_id, values):
+        # تحديث الحالة فقط (بدون تقييم) — يرجع مصفوفة بنفس ترتيب feature_cols
+        state = self._state(series_id)
+        rows = [state.update(v) for v in values]
+        return np.asarray(rows, dtype=float).reshape(-1, len(self.feature_cols))
+
+    def update(self, series_id, values):
+        # قراءة وحدة أو micro-batch؛ التقييم استدعاء واحد للـ scaler والمودل
+        values = np.atleast_1d(np.asarray(values, dtype=float))
+        X = self.features(series_id, values)
+        X_scaled = X if self.scaler is None else self.scaler.transform(X)
+
+        # predict = -1 لما decision_function < 0، فمرور واحد على الأشجار يكفي
+        scores = self.model.decision_function(X_scaled)
+        return {
+            "features": X,
+            "prediction": np.where(scores < 0, -1, 1),
+            "score": scores,
+        }
+
+    def update_many(self, batch):
+        # batch: {series_id: قراءات جديدة} — الـ features لكل سلسلة ثم استدعاء واحد للمودل للكل
+        ids = list(batch)
+        blocks = [self.features(s, np.atleast_1d(np.asarray(batch[s], dtype=float))) for s in ids]
+        if not blocks:
+            return {}
+
+        X = np.concatenate(blocks)
+        scores = self.model.decision_function(X if self.scaler is None else self.scaler.transform(X)) if len(X) else X[:, 0]
+
+        results = {}
+        start = 0
+        for series_id, block in zip(ids, blocks):
+            stop = start + len(block)
+            results[series_id] = {
+                "features": block,
+                "prediction": np.where(scores[start:stop] < 0, -1, 1),
+                "score": scores[start:stop],
+            }
+            start = stop
+        return results
+
+    def reset(self, series_id=None):
+        if series_id is None:
+            self.series.clear()
+        else:
+            self.series.pop(series_id, None)
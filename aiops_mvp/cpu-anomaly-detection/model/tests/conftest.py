@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# الـ modules تستورد بعض بأسمائها (مثل تشغيلها من model/)
+MODEL_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(MODEL_DIR))
+
+DATA_FILE = MODEL_DIR.parent / "data" / "ec2_cpu_utilization_24ae8d.csv"
+
+
+@pytest.fixture(scope="session")
+def cpu_values():
+    # القراءات الحقيقية + مقطع ثابت (تباين صفر) + قفزات، عشان الحالات الصعبة
+    pd = pytest.importorskip("pandas")
+    real = pd.read_csv(DATA_FILE)["value"].to_numpy(dtype=float)
+    rng = np.random.default_rng(7)
+    synthetic = np.concatenate([
+        np.full(30, 0.134),
+        rng.normal(40, 8, 300),
+        [99.5, 0.0, 99.5],
+        np.full(15, 55.0),
+    ])
+    return np.concatenate([real, synthetic])
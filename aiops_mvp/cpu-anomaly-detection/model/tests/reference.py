@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from features import parse_feature
+
+
+# كل أنواع الـ spec بأكثر من نافذة (features.py)
+ALL_COLS = (
+    "value",
+    "rolling_mean_12", "rolling_std_12", "rolling_median_12", "rolling_mad_12",
+    "rolling_mean_5", "rolling_std_5", "rolling_median_4", "rolling_mad_7",
+    "ewma_6", "ewma_24", "diff_1", "diff_3",
+)
+
+# pandas يحسب الـ std بطريقة online فيطلع ~1e-8 بدل صفر للنافذة الثابتة؛ الباقي يتطابق لحد ~1e-13
+RTOL, ATOL = 1e-9, 1e-7
+
+
+def pandas_reference(values, cols):
+    # المرجع: pandas rolling/ewm لكل عمود لحاله (نفس تعريف النوتبوك)
+    pd = pytest.importorskip("pandas")
+
+    s = pd.Series(np.asarray(values, dtype=float))
+    out = np.empty((len(s), len(cols)))
+    for i, col in enumerate(cols):
+        kind, param = parse_feature(col)
+        if kind == "value":
+            column = s
+        elif kind == "diff":
+            column = s.diff(param).fillna(0)
+        elif kind == "ewma":
+            column = s.ewm(span=param, adjust=True).mean()
+        elif kind == "rolling_mad":
+            column = s.rolling(param, min_periods=1).apply(
+                lambda w: np.median(np.abs(w - np.median(w))), raw=True
+            )
+        else:
+            column = getattr(s.rolling(param, min_periods=1), kind[len("rolling_"):])().fillna(0)
+        out[:, i] = column.to_numpy()
+    return out
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from features import FEATURE_NAMES, add_features, compute_features
+from reference import ALL_COLS, ATOL, RTOL, pandas_reference
+
+
+def test_single_series_matches_pandas(cpu_values):
+    got = compute_features(cpu_values, [len(cpu_values)], ALL_COLS)
+    np.testing.assert_allclose(got, pandas_reference(cpu_values, ALL_COLS), rtol=RTOL, atol=ATOL)
+
+
+def test_many_series_match_pandas_per_series(cpu_values):
+    # سلاسل ورا بعض بأطوال مختلفة (فيها أقصر من النافذة): ولا نافذة تعدّي لجهاز ثاني
+    lengths = [1, 5, 11, 12, 13, 700, len(cpu_values) - 742]
+    got = compute_features(cpu_values, lengths, ALL_COLS)
+
+    start = 0
+    for length in lengths:
+        part = cpu_values[start:start + length]
+        np.testing.assert_allclose(
+            got[start:start + length], pandas_reference(part, ALL_COLS), rtol=RTOL, atol=ATOL
+        )
+        start += length
+
+
+def test_constant_window_std_is_exactly_zero():
+    values = np.concatenate([np.linspace(1, 2, 20), np.full(20, 0.134)])
+    got = compute_features(values, [len(values)], ("rolling_std_12",))[:, 0]
+    assert (got[-(20 - 11):] == 0.0).all()
+
+
+def test_add_features_keeps_model_columns(cpu_values):
+    pd = pytest.importorskip("pandas")
+    df = add_features(pd.DataFrame({"value": cpu_values}))
+    np.testing.assert_allclose(
+        df[list(FEATURE_NAMES)].to_numpy(), pandas_reference(cpu_values, FEATURE_NAMES), rtol=RTOL, atol=ATOL
+    )
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from forest import FlatForest
+
+sklearn_ensemble = pytest.importorskip("sklearn.ensemble")
+sklearn_preprocessing = pytest.importorskip("sklearn.preprocessing")
+
+COLS = ("value", "rolling_mean_12", "rolling_std_12", "diff_1")
+
+
+def _fit(max_features, scaled=True):
+    rng = np.random.default_rng(3)
+    X = np.column_stack([
+        rng.gamma(2.0, 10.0, 2000),
+        rng.normal(30, 5, 2000),
+        rng.exponential(2.0, 2000),
+        rng.normal(0, 3, 2000),
+    ])
+    scaler = sklearn_preprocessing.StandardScaler().fit(X) if scaled else None
+    forest = sklearn_ensemble.IsolationForest(
+        n_estimators=60, contamination=0.01, max_features=max_features, random_state=42
+    ).fit(X if scaler is None else scaler.transform(X))
+
+    # بيانات التدريب + قيم برا المدى + قيم على الـ thresholds نفسها تقريباً
+    probe = np.concatenate([X, X[:300] * rng.uniform(0.5, 3.0, (300, 4)), X[:200] + 1e-7])
+    return forest, scaler, probe
+
+
+@pytest.mark.parametrize("max_features", [1.0, 0.5])
+@pytest.mark.parametrize("scaled", [True, False])
+def test_flat_forest_matches_sklearn_exactly(max_features, scaled):
+    forest, scaler, probe = _fit(max_features, scaled)
+    flat = FlatForest.from_sklearn(forest, scaler, COLS)
+    X = probe if scaler is None else scaler.transform(probe)
+
+    np.testing.assert_array_equal(flat.score_samples(probe), forest.score_samples(X))
+    np.testing.assert_array_equal(flat.decision_function(probe), forest.decision_function(X))
+    np.testing.assert_array_equal(flat.predict(probe), forest.predict(X))
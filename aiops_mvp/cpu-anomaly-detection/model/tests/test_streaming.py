@@ -0,0 +1,47 @@
+import json
+
+import numpy as np
+
+from features import compute_features
+from reference import ALL_COLS, ATOL, RTOL, pandas_reference
+from streaming import RECOMPUTE_EVERY, SeriesState, StreamingDetector
+
+
+def test_series_state_matches_pandas(cpu_values):
+    # أطول من RECOMPUTE_EVERY عشان نمر على إعادة الحساب من الـ buffer
+    assert len(cpu_values) > 2 * RECOMPUTE_EVERY
+
+    state = SeriesState(ALL_COLS)
+    got = np.array([state.update(v) for v in cpu_values])
+    np.testing.assert_allclose(got, pandas_reference(cpu_values, ALL_COLS), rtol=RTOL, atol=ATOL)
+
+
+def test_interleaved_series_match_batch_engine(cpu_values):
+    # micro-batches متداخلة لعدة أجهزة = نفس الحساب دفعة وحدة لكل جهاز
+    detector = StreamingDetector(model=None, scaler=None, feature_cols=ALL_COLS)
+    hosts = {"a": cpu_values[:1500], "b": cpu_values[1500:2600], "c": cpu_values[2600:]}
+
+    got = {h: [] for h in hosts}
+    for step in range(0, max(len(v) for v in hosts.values()), 37):
+        for host, values in hosts.items():
+            chunk = values[step:step + 37]
+            if len(chunk):
+                got[host].append(detector.features(host, chunk))
+
+    for host, values in hosts.items():
+        expected = compute_features(values, [len(values)], ALL_COLS)
+        np.testing.assert_allclose(np.concatenate(got[host]), expected, rtol=RTOL, atol=ATOL)
+
+
+def test_state_survives_json_round_trip(cpu_values):
+    # anomaly.py يحفظ الحالة JSON بالقاعدة بين الطلبات؛ لازم تكمل بنفس النتائج بالضبط
+    straight = SeriesState(ALL_COLS)
+    expected = [straight.update(v) for v in cpu_values]
+
+    state = SeriesState(ALL_COLS)
+    got = []
+    for start in range(0, len(cpu_values), 700):
+        got += [state.update(v) for v in cpu_values[start:start + 700]]
+        state = SeriesState.from_dict(ALL_COLS, json.loads(json.dumps(state.to_dict())))
+
+    assert got == expected
@@ -0,0 +1,307 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from features import add_features, feature_names, parse_feature
+from forest import MODEL_FILE, FlatForest
+from ingest import DATA_FILE, load_series
+
+
+THIS_DIR = Path(__file__).resolve().parent
+RUNS_DIR = THIS_DIR / "runs"
+
+# الشذوذ الحقيقي في ec2_cpu_utilization_24ae8d (نفس النوتبوك)
+ANOMALY_TIMESTAMPS = ["2014-02-26 22:05:00", "2014-02-27 17:15:00"]
+
+# أول 80% من الزمن للتدريب والباقي للاختبار
+TRAIN_RATIO = 0.8
+
+# آخر 20% من فترة التدريب = validation لترتيب الـ grid؛ الاختبار ما يشوفه إلا الخيار الأخير
+# (وإلا نختار على نفس النقاط اللي نقيّم عليها والـ F1 يطلع متفائل)
+VALIDATION_RATIO = 0.2
+
+SEARCH_SPACE = {
+    "contamination": [0.005, 0.01, 0.02],
+    "n_estimators": [100, 200, 400],
+    "window": [6, 12, 24],
+}
+
+RANDOM_STATE = 42
+
+_dataset = None
+_extra_features = ()
+
+
+# =========================================================
+# 1) البيانات + الـ features (نفس add_features اللي يستخدمها التقييم)
+# =========================================================
+def load_dataset(path=DATA_FILE, anomalies=ANOMALY_TIMESTAMPS):
+    series = load_series(path)
+    df = pd.DataFrame({"timestamp": np.asarray(series.timestamps), "value": np.asarray(series.values)})
+    df["is_anomaly"] = np.where(df["timestamp"].isin(pd.to_datetime(anomalies)), -1, 1)
+    return df
+
+
+def split_xy(df, window, extra_features=()):
+    # الأعمدة الأساسية بنافذة التجربة + أي أعمدة إضافية من الـ spec (ewma_24, rolling_mad_12, ...)
+    cols = list(feature_names(window)) + [c for c in extra_features if c not in feature_names(window)]
+    feats = add_features(df, cols)
+    split = int(len(feats) * TRAIN_RATIO)
+
+    X = feats[cols].to_numpy()
+    y = feats["is_anomaly"].to_numpy()
+    return cols, X[:split], y[:split], X[split:], y[split:]
+
+
+def validation_split(X_train, y_train, ratio=VALIDATION_RATIO):
+    # بالترتيب الزمني: المودل يتدرب على الأقدم ويتقيّم على اللي بعده مباشرة
+    split = int(len(X_train) * (1 - ratio))
+    return X_train[:split], X_train[split:], y_train[split:]
+
+
+def evaluate(y_true, y_pred):
+    tp = int(((y_true == -1) & (y_pred == -1)).sum())
+    fp = int(((y_true == 1) & (y_pred == -1)).sum())
+    fn = int(((y_true == -1) & (y_pred == 1)).sum())
+    tn = int(((y_true == 1) & (y_pred == 1)).sum())
+
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+        "precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4),
+    }
+
+
+def throughput(decision, X, repeat=5, single_calls=50):
+    # صفوف/ثانية لدفعة الاختبار كاملة + زمن قراءة وحدة (الحالة الغالبة في المراقبة)
+    decision(X)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        decision(X)
+    rows_per_s = len(X) * repeat / (time.perf_counter() - started)
+
+    latencies = []
+    for i in range(single_calls):
+        row = X[i % len(X):i % len(X) + 1]
+        started = time.perf_counter()
+        decision(row)
+        latencies.append(time.perf_counter() - started)
+
+    return {"rows_per_s": round(rows_per_s), "single_ms": round(float(np.median(latencies)) * 1000, 3)}
+
+
+def fit(X_train, contamination, n_estimators, random_state=RANDOM_STATE):
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X_train)
+
+    # n_jobs=1: التوازي بين التجارب نفسها (process pool)، ومع n_jobs=-1 تقييم قراءة وحدة يصير أبطأ بكثير
+    model = IsolationForest(
+        n_estimators=n_estimators,
+        max_samples="auto",
+        contamination=contamination,
+        max_features=1.0,
+        random_state=random_state,
+        n_jobs=1,
+    )
+    model.fit(X_scaled)
+    return model, scaler
+
+
+# =========================================================
+# 2) تجربة وحدة من الـ grid (تشتغل في process منفصل)
+# =========================================================
+def _init_worker(data_path, extra_features=()):
+    global _dataset, _extra_features
+    _dataset = load_dataset(data_path)
+    _extra_features = tuple(extra_features)
+
+
+def run_candidate(params):
+    # التقييم على الـ validation فقط؛ بيانات الاختبار ما تدخل الاختيار
+    _, X_train, y_train, _, _ = split_xy(_dataset, params["window"], _extra_features)
+    X_fit, X_val, y_val = validation_split(X_train, y_train)
+
+    started = time.perf_counter()
+    model, scaler = fit(X_fit, params["contamination"], params["n_estimators"], params["random_state"])
+    fit_seconds = time.perf_counter() - started
+
+    preds = model.predict(scaler.transform(X_val))
+    return {
+        "params": {k: v for k, v in params.items() if k != "random_state"},
+        "validation": evaluate(y_val, preds),
+        "flagged": int((preds == -1).sum()),
+        "fit_seconds": round(fit_seconds, 3),
+        "sklearn": throughput(lambda X: model.decision_function(scaler.transform(X)), X_val, repeat=2, single_calls=10),
+    }
+
+
+def rank_key(result):
+    # الأفضل على الـ validation: أعلى F1، ثم أقل إنذارات كاذبة، ثم الأسرع في التقييم.
+    # لو الـ validation ما فيه شذوذ معلّم، الـ F1 صفر للكل والترتيب بالإنذارات الكاذبة
+    return (result["validation"]["f1"], -result["validation"]["fp"], result["sklearn"]["rows_per_s"])
+
+
+def robust_z_baseline(df):
+    # نفس الـ baseline في النوتبوك: median/MAD من التدريب والعتبة quantile 0.995
+    from scipy.stats import median_abs_deviation
+
+    split = int(len(df) * TRAIN_RATIO)
+    train = df["value"].to_numpy()[:split]
+    median, mad = np.median(train), median_abs_deviation(train)
+
+    z = np.abs(0.6745 * (df["value"].to_numpy() - median) / mad)
+    threshold = np.quantile(z[:split], 0.995)
+    preds = np.where(z[split:] >= threshold, -1, 1)
+    return {"threshold": round(float(threshold), 4), "metrics": evaluate(df["is_anomaly"].to_numpy()[split:], preds)}
+
+
+def _sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+# =========================================================
+# 3) البحث + تدريب الأفضل + التقرير
+# =========================================================
+def train(data_path=DATA_FILE, space=SEARCH_SPACE, jobs=None, random_state=RANDOM_STATE, output_dir=None,
+          extra_features=()):
+    import joblib
+    import sklearn
+
+    # أسماء غلط تطيح هنا قبل ما تبدأ الـ workers
+    extra_features = list(extra_features)
+    for name in extra_features:
+        parse_feature(name)
+
+    grid = [
+        dict(zip(space, values), random_state=random_state)
+        for values in itertools.product(*space.values())
+    ]
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(str(data_path), extra_features)) as pool:
+        results = list(pool.map(run_candidate, grid))
+    search_seconds = time.perf_counter() - started
+
+    results.sort(key=rank_key, reverse=True)
+    best = results[0]["params"]
+
+    # نعيد تدريب الأفضل على فترة التدريب كاملة (مع الـ validation)، والاختبار مرة وحدة لهذا الخيار بس
+    df = load_dataset(data_path)
+    cols, X_train, y_train, X_test, y_test = split_xy(df, best["window"], extra_features)
+    X_fit, X_val, y_val = validation_split(X_train, y_train)
+
+    started = time.perf_counter()
+    model, scaler = fit(X_train, best["contamination"], best["n_estimators"], random_state)
+    fit_seconds = time.perf_counter() - started
+
+    preds = model.predict(scaler.transform(X_test))
+    flat = FlatForest.from_sklearn(model, scaler, cols)
+
+    report = {
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+        "data": {"file": Path(data_path).name, "sha256": _sha256(data_path), "rows": len(df),
+                 "train_rows": len(X_train), "validation_rows": len(X_val), "test_rows": len(X_test),
+                 "validation_anomalies": int((y_val == -1).sum()), "test_anomalies": int((y_test == -1).sum())},
+        "versions": {"sklearn": sklearn.__version__, "numpy": np.__version__, "pandas": pd.__version__},
+        "random_state": random_state,
+        "search": {"space": space, "extra_features": extra_features, "candidates": len(grid), "jobs": jobs or os.cpu_count(),
+                   "seconds": round(search_seconds, 2)},
+        "best": {
+            "params": best,
+            "feature_cols": cols,
+            "validation": results[0]["validation"],
+            "metrics": evaluate(y_test, preds),
+            "flagged": int((preds == -1).sum()),
+            "fit_seconds": round(fit_seconds, 3),
+            "sklearn": throughput(lambda X: model.decision_function(scaler.transform(X)), X_test),
+            "flat": throughput(flat.decision_function, X_test),
+        },
+        "baseline_robust_z": robust_z_baseline(df),
+        "candidates": results,
+    }
+
+    output_dir = Path(output_dir or RUNS_DIR / datetime.now().strftime("%Y%m%d-%H%M%S"))
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # نفس مفاتيح الـ pickle القديم (model/scaler/feature_cols) + بيانات التدريب
+    joblib.dump({
+        "model": model,
+        "scaler": scaler,
+        "feature_cols": cols,
+        "params": best,
+        "metrics": report["best"]["metrics"],
+        "trained_at": report["trained_at"],
+    }, output_dir / "model.pkl")
+    (output_dir / "report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    return output_dir, report
+
+
+def _floats(text):
+    return [float(x) for x in text.split(",")]
+
+
+def _ints(text):
+    return [int(x) for x in text.split(",")]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Retrain the CPU anomaly model with a parallel grid search")
+    parser.add_argument("--data", default=str(DATA_FILE))
+    parser.add_argument("--contamination", type=_floats, default=SEARCH_SPACE["contamination"])
+    parser.add_argument("--n-estimators", type=_ints, default=SEARCH_SPACE["n_estimators"])
+    parser.add_argument("--window", type=_ints, default=SEARCH_SPACE["window"])
+    parser.add_argument("--extra-features", type=lambda text: [c for c in text.split(",") if c], default=[],
+                        help="extra spec columns, e.g. ewma_24,rolling_mad_12,diff_12")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--random-state", type=int, default=RANDOM_STATE)
+    parser.add_argument("--output-dir", help="default: model/runs/<timestamp>")
+    parser.add_argument("--install", action="store_true",
+                        help="replace the served pickle and re-export the mmap artifact")
+    args = parser.parse_args()
+
+    space = {"contamination": args.contamination, "n_estimators": args.n_estimators, "window": args.window}
+    output_dir, report = train(args.data, space, args.jobs, args.random_state, args.output_dir,
+                                args.extra_features)
+
+    data = report["data"]
+    if not data["validation_anomalies"]:
+        print(f"note: no labelled anomalies in the {data['validation_rows']} validation rows, "
+              f"so candidates are ranked by false positives (f1 is 0 for all)\n")
+
+    print("validation:")
+    print(f"{'contamination':>13} {'trees':>5} {'window':>6} {'f1':>6} {'fp':>4} {'fit s':>6} {'rows/s':>8}")
+    for r in report["candidates"]:
+        p, m = r["params"], r["validation"]
+        print(f"{p['contamination']:>13} {p['n_estimators']:>5} {p['window']:>6} "
+              f"{m['f1']:>6} {m['fp']:>4} {r['fit_seconds']:>6} {r['sklearn']['rows_per_s']:>8}")
+
+    best = report["best"]
+    print(f"\nbest {best['params']} test f1={best['metrics']['f1']} fp={best['metrics']['fp']} "
+          f"fit={best['fit_seconds']}s sklearn={best['sklearn']} flat={best['flat']}")
+    print(f"baseline robust z: {report['baseline_robust_z']['metrics']}")
+    print(f"search: {report['search']['candidates']} candidates in {report['search']['seconds']}s "
+          f"-> {output_dir}")
+
+    if args.install:
+        from artifact import export_artifact
+
+        shutil.copyfile(output_dir / "model.pkl", MODEL_FILE)
+        export_artifact(MODEL_FILE)
+        print(f"installed -> {MODEL_FILE}")
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2 import extensions
+from flask import g
+
+from metrics import InstrumentedCursor
+
+
+DB_CONFIG = {
+    "host": os.environ.get("DB_HOST", "localhost"),
+    "database": os.environ.get("DB_NAME", "aiops_tickets"),
+    "user": os.environ.get("DB_USER", "postgres"),
+    "password": os.environ.get("DB_PASSWORD", "postghaida"),
+}
+
+# حجم الـ pool لطلبات الويب (لكل worker)
+POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
+POOL_MAX = int(os.environ.get("DB_POOL_MAX", "10"))
+
+# pool منفصل للمهام الخلفية حتى لا تنافس الطلبات
+JOBS_POOL_MAX = int(os.environ.get("DB_JOBS_POOL_MAX", "2"))
+
+# كم ثانية ننتظر اتصال فاضي قبل ما نرجع خطأ
+CHECKOUT_TIMEOUT = float(os.environ.get("DB_CHECKOUT_TIMEOUT", "10"))
+
+# الاتصال اللي صار له أكثر من كذا ثانية خامل نفحصه بـ SELECT 1 قبل نسلمه
+HEALTHCHECK_IDLE = float(os.environ.get("DB_HEALTHCHECK_IDLE", "30"))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# -----------------------------------
+class Database:
+
+    def __init__(self, minconn, maxconn, name="web", **config):
+        self.name = name
+        self.maxconn = maxconn
+        self._config = config or DB_CONFIG
+        self._pool = None
+        self._lock = threading.Lock()
+        # العدادات تتعدل من threads الطلبات؛ += مو ذرّية فلها قفل خاص (مو _lock اللي ينمسك وقت فتح الـ pool)
+        self._stats_lock = threading.Lock()
+        # ThreadedConnectionPool يرمي PoolError إذا امتلأ، فنستخدم semaphore عشان ننتظر بدل ما نفشل
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._minconn = minconn
+        self._last_used = {}
+        self.checked_out = 0
+        self.reconnects = 0
+
+    def _get_pool(self):
+        # ننشئ الـ pool عند أول استخدام حتى لا يفتح كل worker اتصالات وقت الاستيراد
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = pg_pool.ThreadedConnectionPool(
+                        self._minconn, self.maxconn, **self._config
+                    )
+        return self._pool
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+
+        idle = time.monotonic() - self._last_used.get(id(conn), 0)
+        if idle < HEALTHCHECK_IDLE:
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=CHECKOUT_TIMEOUT):
+            raise PoolTimeout(f"no free connection in '{self.name}' pool after {CHECKOUT_TIMEOUT}s")
+
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+
+            if not self._is_healthy(conn):
+                # اتصال ميت: نرميه ونفتح بداله
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+                with self._stats_lock:
+                    self.reconnects += 1
+
+            with self._stats_lock:
+                self.checked_out += 1
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            close = bool(conn.closed)
+
+            if not close and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                # أي شيء ما انعمل له commit يتلغى قبل ما يرجع الاتصال للـ pool
+                try:
+                    conn.rollback()
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    close = True
+
+            if close:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+
+            self._get_pool().putconn(conn, close=close)
+        finally:
+            with self._stats_lock:
+                self.checked_out -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "name": self.name,
+                "max": self.maxconn,
+                "checked_out": self.checked_out,
+                "reconnects": self.reconnects,
+            }
+
+    def closeall(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+            self._last_used.clear()
+
+
+# كل cursor من الـ pools يسجّل عدد ووقت الاستعلامات (metrics.py)
+web_db = Database(POOL_MIN, POOL_MAX, name="web", cursor_factory=InstrumentedCursor, **DB_CONFIG)
+jobs_db = Database(1, JOBS_POOL_MAX, name="jobs", cursor_factory=InstrumentedCursor, **DB_CONFIG)
+
+# اتصال لكل كاتب بالخلفية (notifications.NotificationWriter و chat.ChatWriter)؛ يكتبون دفعات فما يحتاجون أكثر
+notify_db = Database(1, 2, name="notify", cursor_factory=InstrumentedCursor, **DB_CONFIG)
+
+
+# -----------------------------------
+#  اتصال واحد لكل طلب (request) يرجع للـ pool بنهاية الطلب
+def get_db():
+    if "db_conn" not in g:
+        g.db_conn = web_db.getconn()
+    return g.db_conn
+
+
+def _release_db(exc):
+    conn = g.pop("db_conn", None)
+    if conn is not None:
+        web_db.putconn(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(_release_db)
@@ -0,0 +1,201 @@
+import argparse
+import re
+import sys
+
+import numpy as np
+import psycopg2
+from psycopg2 import extensions
+
+import db
+from alerts import raise_incidents
+from seed import SEED_PASSWORD, add_arguments, seed_from_args
+
+
+# الجداول الكبيرة اللي ممنوع يكون عليها Seq Scan (it_team صغير والـ Seq Scan عليه طبيعي)
+LARGE_TABLES = {"tickets", "messages", "notifications", "employees"}
+
+_current_route = [None]
+_plans = []
+
+# partitions فاضية (أشهر جاية، الـ default): الـ Seq Scan عليها صفر صفحات فما نحسبه
+_empty_partitions = set()
+
+
+# -----------------------------------
+#  cursor يشغّل EXPLAIN قبل كل استعلام ويحفظ الخطة مع اسم الـ route
+class ExplainCursor(extensions.cursor):
+
+    def execute(self, query, vars=None):
+        text = query.decode() if isinstance(query, bytes) else query
+        first_word = text.lstrip().split(None, 1)[0].upper()
+
+        if first_word in ("SELECT", "WITH", "UPDATE", "INSERT", "DELETE"):
+            super().execute("EXPLAIN (FORMAT JSON) " + text, vars)
+            plan = self.fetchone()[0][0]["Plan"]
+            _plans.append((_current_route[0], " ".join(text.split())[:90], plan))
+
+        return super().execute(query, vars)
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from walk(child)
+
+
+def scans(plan):
+    result = []
+    for node in walk(plan):
+        # partitions الشهرية (notifications_p2026_01 ...) تنحسب على الجدول الأب
+        name = node.get("Relation Name") or ""
+        if node["Node Type"] == "Seq Scan" and name in _empty_partitions:
+            continue
+        relation = re.sub(r"_(p\d{4}_\d{2}|default)$", "", name) or None
+        index = node.get("Index Name")
+        if relation or index:
+            result.append((node["Node Type"], relation or "", index))
+    return result
+
+
+# -----------------------------------
+#  نشغّل الـ routes الحقيقية بالـ test client ونراجع خطة كل استعلام
+def drive_routes(app_module, it_employee, employee):
+    client = app_module.app.test_client()
+
+    def hit(label, method, url, **kwargs):
+        _current_route[0] = label
+        response = getattr(client, method)(url, **kwargs)
+        if response.status_code >= 500:
+            raise RuntimeError(f"{label} returned {response.status_code}")
+        return response
+
+    hit("POST /login (employee)", "post", "/login",
+        data={"employee_id": str(employee), "password": SEED_PASSWORD})
+    hit("POST /create_ticket", "post", "/create_ticket",
+        data={"title": "explain", "description": "explain", "category": "Network", "priority": "High"})
+    page = hit("GET /my_tickets", "get", "/my_tickets")
+    hit("GET /api/my_tickets", "get", "/api/my_tickets?limit=5")
+    hit("GET /get_notifications", "get", "/get_notifications")
+
+    # استعلامات مساعدة لتجهيز المعرّفات، ما تدخل في التقرير
+    _current_route[0] = None
+    with db.web_db.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT ticket_id FROM tickets WHERE employee_id=%s ORDER BY created_at DESC LIMIT 1", (employee,))
+        ticket_id = cur.fetchone()[0]
+        cur.execute("SELECT id FROM notifications WHERE receiver_id=%s LIMIT 1", (employee,))
+        row = cur.fetchone()
+        notif_id = row[0] if row else 1
+
+    hit("GET /chat/<id>", "get", f"/chat/{ticket_id}")
+    hit("POST /chat/<id>", "post", f"/chat/{ticket_id}", data={"message_text": "explain"})
+    hit("GET /api/chat/<id>/messages", "get", f"/api/chat/{ticket_id}/messages?limit=5")
+    hit("POST /api/chat/<id>/messages", "post", f"/api/chat/{ticket_id}/messages", json={"text": "explain"})
+    hit("GET /api/chat/<id>/messages (after)", "get", f"/api/chat/{ticket_id}/messages?after=1")
+    hit("GET /mark_notification/<id>", "get", f"/mark_notification/{notif_id}")
+    hit("POST /notifications/mark_read (ids)", "post", "/notifications/mark_read", json={"ids": [notif_id]})
+    hit("POST /notifications/mark_read (up_to)", "post", "/notifications/mark_read", json={"up_to": notif_id})
+    hit("GET /logout", "get", "/logout")
+
+    hit("POST /login (it)", "post", "/login",
+        data={"employee_id": str(it_employee), "password": SEED_PASSWORD})
+    hit("GET /dashboard", "get", "/dashboard")
+    hit("GET /api/dashboard/resolved", "get", "/api/dashboard/resolved?limit=5")
+    hit("POST /accept_ticket/<id>", "post", f"/accept_ticket/{ticket_id}")
+    hit("POST /resolve_ticket/<id>", "post", f"/resolve_ticket/{ticket_id}")
+    hit("POST /reject_ticket/<id>", "post", f"/reject_ticket/{ticket_id}", data={"reason": "explain"})
+
+    # التنبيهات اللي حطتها الـ routes تنكتب بالخلفية؛ ننتظرها عشان تدخل بالتقرير
+    _current_route[0] = "chat writer"
+    app_module.chat_writer.flush()
+
+    _current_route[0] = "notifications writer"
+    app_module.notifier.flush()
+
+    _current_route[0] = "job reassign_expired_tickets"
+    app_module.reassign_expired_tickets()
+
+    # حادثة شذوذ وهمية: فتح تذكرة ثم تمديدها
+    _current_route[0] = "alerts raise_incidents"
+    ts = np.datetime64("now", "m") - np.arange(6)[::-1] * np.timedelta64(5, "m")
+    with db.jobs_db.connection() as conn:
+        for _ in range(2):
+            raise_incidents(conn, {"explain-host": {
+                "timestamp": ts, "value": np.full(6, 0.9), "prediction": np.full(6, -1)
+            }})
+            ts = ts + np.timedelta64(30, "m")
+    _current_route[0] = None
+
+    return page
+
+
+def report():
+    failures = 0
+
+    for route, query, plan in _plans:
+        if route is None:
+            continue
+
+        found = scans(plan)
+        bad = [s for s in found if s[0] == "Seq Scan" and s[1] in LARGE_TABLES]
+        status = "FAIL" if bad else "ok"
+        failures += bool(bad)
+
+        detail = ", ".join(
+            f"{node_type} {relation}".rstrip() + (f" ({index})" if index else "")
+            for node_type, relation, index in found
+        ) or "no table access"
+
+        print(f"[{status}] {route}")
+        print(f"       {query}")
+        print(f"       {detail}")
+
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Run every route against seeded data and check that each query uses an index"
+    )
+    parser.add_argument("--seed", action="store_true", help="reseed the database before checking")
+    parser.add_argument("--it-employee", type=int, default=1)
+    parser.add_argument("--employee", type=int, default=1000)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.seed:
+        conn = psycopg2.connect(**db.DB_CONFIG)
+        try:
+            seed_from_args(conn, args)
+        finally:
+            conn.close()
+
+    conn = psycopg2.connect(**db.DB_CONFIG)
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE pg_relation_size(c.oid) = 0
+        """)
+        _empty_partitions.update(name for (name,) in cur.fetchall())
+    finally:
+        conn.close()
+
+    # كل اتصالات الـ app والمهام الخلفية تستخدم ExplainCursor
+    db.web_db = db.Database(1, 2, name="web", cursor_factory=ExplainCursor, **db.DB_CONFIG)
+    db.jobs_db = db.Database(1, 1, name="jobs", cursor_factory=ExplainCursor, **db.DB_CONFIG)
+    db.notify_db = db.Database(1, 1, name="notify", cursor_factory=ExplainCursor, **db.DB_CONFIG)
+
+    import app as app_module
+    app_module.job_runner.shutdown()
+    app_module.jobs_db = db.jobs_db
+    app_module.notifier.pool = db.notify_db
+    app_module.chat_writer.pool = db.notify_db
+
+    drive_routes(app_module, args.it_employee, args.employee)
+
+    failures = report()
+    print(f"\n{failures} queries without an index on large tables")
+    sys.exit(1 if failures else 0)
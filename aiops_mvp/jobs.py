@@ -0,0 +1,274 @@
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from db import DB_CONFIG, PoolTimeout
+
+
+# كل كم ثانية يحاول كل process ياخذ القيادة، أو يتأكد إنها لسا معه
+LEADER_POLL_SECONDS = float(os.environ.get("SCHEDULER_LEADER_POLL_SECONDS", "5"))
+
+# اسم الـ advisory lock (نفسه عند كل الـ workers والـ pods)
+LEADER_LOCK = os.environ.get("SCHEDULER_LEADER_LOCK", "aiops_scheduler_leader")
+
+# SCHEDULER_ENABLED=0: process ويب بس، ما يشغّل مهام ولا يدخل الانتخاب
+SCHEDULER_ENABLED = os.environ.get("SCHEDULER_ENABLED", "1") != "0"
+
+# سجل تشغيلات مهام القائد (job_runs) يبقى كذا يوم
+JOB_HISTORY_DAYS = int(os.environ.get("JOB_HISTORY_DAYS", "14"))
+
+# كم تشغيل أخير نحفظه بالذاكرة لكل مهمة (للمهام المحلية اللي ما تنكتب بالجدول)
+RECENT_RUNS = 20
+
+log = logging.getLogger("aiops.jobs")
+
+
+def _setting(name, job, default):
+    # JOB_<NAME>_SECONDS / JOB_<NAME>_JITTER تغيّر مهمة وحدة بدون تعديل الكود
+    return float(os.environ.get(f"JOB_{job.upper()}_{name}", default))
+
+
+# -----------------------------------
+#  انتخاب القائد: pg_try_advisory_lock على اتصال خاص يبقى مفتوح.
+#  القفل تابع للـ session، فإذا مات الـ process أو انقطع اتصاله ينفك من القاعدة
+#  ويأخذه غيره بأول محاولة
+class LeaderElection(threading.Thread):
+
+    def __init__(self, lock_name=LEADER_LOCK, poll_seconds=LEADER_POLL_SECONDS):
+        super().__init__(name="scheduler-leader", daemon=True)
+        self.lock_name = lock_name
+        self.poll_seconds = poll_seconds
+        self.runner_id = None
+        self.is_leader = False
+        self.elected_at = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _connect(self):
+        # keepalives: اتصال ميت ينكشف بثواني بدل دقائق (وإلا نظن إننا قادة وإحنا لا)
+        conn = psycopg2.connect(
+            application_name=f"aiops-scheduler {self.runner_id}",
+            keepalives=1, keepalives_idle=5, keepalives_interval=2, keepalives_count=2,
+            **DB_CONFIG
+        )
+        conn.autocommit = True
+        return conn
+
+    def _check(self):
+        # داخل self._lock؛ يرجع True إذا القفل معنا الحين
+        if self._conn is None or self._conn.closed:
+            self._step_down()
+            self._conn = self._connect()
+
+        with self._conn.cursor() as cur:
+            if self.is_leader:
+                # الاتصال حي = القفل لسا معنا
+                cur.execute("SELECT 1")
+            else:
+                cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (self.lock_name,))
+                if cur.fetchone()[0]:
+                    self.is_leader = True
+                    self.elected_at = time.time()
+                    log.info("scheduler leader: %s", self.runner_id)
+        return self.is_leader
+
+    def confirm(self):
+        # قبل كل مهمة للقائد: round trip على نفس الاتصال بدل ما نعتمد على آخر poll
+        with self._lock:
+            try:
+                return self._check()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                log.warning("scheduler leader connection lost: %s", e)
+                self._step_down()
+                return False
+
+    def _step_down(self):
+        if self.is_leader:
+            log.info("scheduler leader stepped down: %s", self.runner_id)
+        self.is_leader = False
+        self.elected_at = None
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except psycopg2.Error:
+                pass
+            self._conn = None
+
+    def run(self):
+        while not self._stop.is_set():
+            self.confirm()
+            self._stop.wait(self.poll_seconds)
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            # نفك القفل بنفسنا عشان القائد الجديد ما ينتظر انقطاع الاتصال
+            if self.is_leader and self._conn is not None and not self._conn.closed:
+                try:
+                    with self._conn.cursor() as cur:
+                        cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (self.lock_name,))
+                except psycopg2.Error:
+                    pass
+            self._step_down()
+
+
+# -----------------------------------
+#  المهام الخلفية: كل process يشغّل APScheduler، لكن مهام القائد (leader_only)
+#  تتنفذ عند واحد بس مهما زاد عدد الـ workers؛ المحلية (مثل capacity_index) عند الكل
+class JobRunner:
+
+    def __init__(self, pool, enabled=SCHEDULER_ENABLED):
+        self.pool = pool
+        self.enabled = enabled
+        self.scheduler = BackgroundScheduler()
+        self.elector = LeaderElection()
+        self.jobs = {}
+        self.recent = {}
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def add(self, func, seconds, jitter=0, leader_only=True, name=None):
+        name = name or func.__name__
+        seconds = _setting("SECONDS", name, seconds)
+        jitter = _setting("JITTER", name, jitter)
+
+        self.jobs[name] = {"seconds": seconds, "jitter": jitter, "leader_only": leader_only}
+        self.recent[name] = deque(maxlen=RECENT_RUNS)
+
+        # max_instances=1 + coalesce: تشغيل طويل ما يتراكم خلفه تشغيلات
+        self.scheduler.add_job(
+            self._run, 'interval', seconds=seconds, jitter=jitter or None,
+            args=(name, func, leader_only), id=name, max_instances=1, coalesce=True
+        )
+
+    def start(self):
+        # لازم ينادى داخل الـ worker نفسه (app.py: أول طلب)، مو وقت الاستيراد:
+        # مع gunicorn --preload الاستيراد يصير بالـ master، والـ threads واتصال القفل ما تنتقل للـ workers بعد الـ fork
+        if not self.enabled or self._started:
+            return
+
+        with self._start_lock:
+            if self._started:
+                return
+
+            self.elector.runner_id = f"{socket.gethostname()}:{os.getpid()}"
+            self.add(self.prune_history, 24 * 3600, jitter=600, name="prune_job_runs")
+            self.elector.start()
+            self.scheduler.start()
+            atexit.register(self.shutdown)
+            self._started = True
+
+    def shutdown(self):
+        if not self._started:
+            return
+        self._started = False
+        self.scheduler.shutdown(wait=False)
+        self.elector.stop()
+
+    def _run(self, name, func, leader_only):
+        if leader_only and not self.elector.confirm():
+            return
+
+        started = time.perf_counter()
+        status, error, stats = "ok", None, None
+        try:
+            # المهمة ممكن ترجع dict بنتيجة التشغيل، ينحفظ مع المدة
+            result = func()
+            if isinstance(result, dict):
+                stats = result
+        except Exception as e:
+            status, error = "error", repr(e)
+            log.exception("job %s failed", name)
+        duration = time.perf_counter() - started
+
+        self.recent[name].append({
+            "finished_at": time.time(),
+            "duration_ms": round(duration * 1000, 2),
+            "status": status,
+            "error": error,
+            "stats": stats,
+        })
+        if leader_only:
+            self._record(name, duration, status, error, stats)
+
+    def _record(self, name, duration, status, error, stats=None):
+        try:
+            with self.pool.connection() as conn:
+                conn.cursor().execute("""
+                    INSERT INTO job_runs (job, runner, started_at, duration_ms, status, error, stats)
+                    VALUES (%s, %s, NOW() - %s * INTERVAL '1 second', %s, %s, %s, %s)
+                """, (name, self.elector.runner_id, duration, duration * 1000, status, error,
+                      json.dumps(stats) if stats is not None else None))
+                conn.commit()
+        except (psycopg2.Error, PoolTimeout) as e:
+            log.warning("job history not recorded for %s: %s", name, e)
+
+    def prune_history(self):
+        with self.pool.connection() as conn:
+            conn.cursor().execute(
+                "DELETE FROM job_runs WHERE started_at < NOW() - %s * INTERVAL '1 day'",
+                (JOB_HISTORY_DAYS,)
+            )
+            conn.commit()
+
+    # -----------------------------------
+    #  حالة المهام: القائد الحالي (من pg_locks) + آخر التشغيلات
+    def status(self, cursor, limit=RECENT_RUNS):
+        cursor.execute("""
+            SELECT a.application_name, a.backend_start
+            FROM pg_locks l
+            JOIN pg_stat_activity a ON a.pid = l.pid
+            WHERE l.locktype = 'advisory'
+              AND l.granted
+              AND l.objsubid = 1
+              AND l.objid = (hashtext(%s)::bigint & 4294967295)::oid
+              AND a.application_name LIKE 'aiops-scheduler %%'
+        """, (self.elector.lock_name,))
+        row = cursor.fetchone()
+
+        jobs = {}
+        for name, job in self.jobs.items():
+            if job["leader_only"]:
+                # التاريخ المشترك من الجدول (كل القادة، مو بس هذا الـ process)
+                cursor.execute("""
+                    SELECT runner, started_at, duration_ms, status, error, stats
+                    FROM job_runs
+                    WHERE job = %s
+                    ORDER BY started_at DESC
+                    LIMIT %s
+                """, (name, limit))
+                runs = [{
+                    "runner": r[0],
+                    "started_at": str(r[1]),
+                    "duration_ms": round(r[2], 2),
+                    "status": r[3],
+                    "error": r[4],
+                    "stats": r[5],
+                } for r in cursor.fetchall()]
+            else:
+                runs = list(self.recent[name])[::-1][:limit]
+
+            durations = [r["duration_ms"] for r in runs if r["status"] == "ok"]
+            jobs[name] = dict(
+                job,
+                runs=runs,
+                avg_duration_ms=round(sum(durations) / len(durations), 2) if durations else None,
+            )
+
+        return {
+            "leader": row[0][len("aiops-scheduler "):] if row else None,
+            "leader_since": str(row[1]) if row else None,
+            "runner": self.elector.runner_id,
+            "is_leader": self.elector.is_leader,
+            "enabled": self.enabled,
+            "jobs": jobs,
+        }
@@ -0,0 +1,275 @@
+import hmac
+import logging
+import os
+import re
+import threading
+import time
+from functools import wraps
+
+from flask import g, request, has_app_context, Response
+from psycopg2 import extensions
+
+
+# الطلب اللي ياخذ أكثر من كذا ms ينكتب في الـ log مع استعلاماته (0 = مقفل)
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))
+
+# token لنظام المراقبة (Prometheus) اللي يقرأ /metrics بدون session؛ فاضي = بس فريق الـ IT المسجل
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+slow_log = logging.getLogger("aiops.slow_requests")
+
+
+# -----------------------------------
+#  metrics بسيطة بصيغة Prometheus (لكل process)
+class Counter:
+
+    def __init__(self, name, help_text, labelnames):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (bucket_counts, count, total) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    le = _labels(self.labelnames + ("le",), labels + (str(bound),))
+                    lines.append(f"{self.name}_bucket{le} {bucket_count}")
+                inf = _labels(self.labelnames + ("le",), labels + ("+Inf",))
+                lines.append(f"{self.name}_bucket{inf} {count}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("route", "method")
+)
+REQUESTS = Counter(
+    "http_requests_total", "Requests by route and status", ("route", "method", "status")
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Time spent in SQL per request", ("route",)
+)
+DB_QUERIES = Counter(
+    "db_queries_total", "SQL statements issued by route", ("route",)
+)
+JOB_DURATION = Histogram(
+    "job_duration_seconds", "Background job duration", ("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+)
+JOB_RUNS = Counter(
+    "job_runs_total", "Background job runs by outcome", ("job", "status")
+)
+
+REGISTRY = [REQUEST_DURATION, REQUESTS, REQUEST_DB_TIME, DB_QUERIES, JOB_DURATION, JOB_RUNS]
+
+
+def render_metrics(pools):
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+
+    # حالة الـ pools وقت الطلب
+    for name, metric_type, help_text in (
+        ("db_pool_max", "gauge", "Pool size"),
+        ("db_pool_checked_out", "gauge", "Connections currently checked out"),
+        ("db_pool_reconnects_total", "counter", "Dead connections replaced"),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for pool in pools:
+            stats = pool.stats()
+            key = name.replace("db_pool_", "").replace("_total", "")
+            lines.append(f'{name}{{pool="{stats["name"]}"}} {stats[key]}')
+
+    return "\n".join(lines) + "\n"
+
+
+def metrics_response(pools):
+    return Response(render_metrics(pools), mimetype="text/plain; version=0.0.4")
+
+
+def token_ok(header):
+    if not METRICS_TOKEN or not header or not header.startswith("Bearer "):
+        return False
+    return hmac.compare_digest(header[len("Bearer "):].encode(), METRICS_TOKEN.encode())
+
+
+# -----------------------------------
+#  cursor يسجل عدد الاستعلامات ووقتها وأبطأ استعلام داخل الطلب الحالي
+class InstrumentedCursor(extensions.cursor):
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record(query, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record(query, time.perf_counter() - started)
+
+
+def _record(query, elapsed):
+    if not has_app_context():
+        return
+
+    stats = g.get("sql_stats")
+    if stats is None:
+        stats = g.sql_stats = {"count": 0, "time": 0.0, "slowest": (0.0, None), "statements": []}
+
+    stats["count"] += 1
+    stats["time"] += elapsed
+    if elapsed > stats["slowest"][0]:
+        stats["slowest"] = (elapsed, query)
+
+    if SLOW_REQUEST_MS > 0:
+        stats["statements"].append((round(elapsed * 1000, 2), _one_line(query)))
+
+
+def _one_line(query):
+    text = query.decode() if isinstance(query, bytes) else str(query)
+    # تعليقات SQL (-- 0 ...) تخرب القراءة لما يصير الاستعلام سطر واحد
+    text = re.sub(r"--[^\n]*", "", text)
+    return " ".join(text.split())
+
+
+# -----------------------------------
+def _before_request():
+    g.request_started = time.perf_counter()
+
+
+def _empty_stats():
+    return {"count": 0, "time": 0.0, "slowest": (0.0, None), "statements": []}
+
+
+def _after_request(response):
+    # هنا الـ headers بس؛ العدّ في _teardown_request
+    started = g.get("request_started")
+    if started is None:
+        return response
+
+    g.response_status = response.status_code
+    elapsed = time.perf_counter() - started
+    stats = g.get("sql_stats") or _empty_stats()
+
+    response.headers["X-Query-Count"] = str(stats["count"])
+    response.headers["Server-Timing"] = (
+        f'db;dur={stats["time"] * 1000:.2f};desc="{stats["count"]} queries", '
+        f'app;dur={elapsed * 1000:.2f}'
+    )
+    return response
+
+
+def _teardown_request(exc):
+    # teardown يتنفذ لكل طلب؛ after_request ما يتنفذ لو الـ view رمى exception وانتشر
+    # (debug / PROPAGATE_EXCEPTIONS) أو فشل after_request ثاني، وهذي بالضبط الـ 500 اللي نبي نشوفها
+    started = g.get("request_started")
+    if started is None:
+        return
+
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    status = 500 if exc is not None else g.get("response_status", 500)
+    stats = g.get("sql_stats") or _empty_stats()
+
+    REQUEST_DURATION.observe((route, request.method), elapsed)
+    REQUESTS.inc((route, request.method, str(status)))
+    REQUEST_DB_TIME.observe((route,), stats["time"])
+    DB_QUERIES.inc((route,), stats["count"])
+
+    if SLOW_REQUEST_MS > 0 and elapsed * 1000 >= SLOW_REQUEST_MS:
+        slowest_time, slowest_query = stats["slowest"]
+        slow_log.warning(
+            "slow request %s %s %.1fms (db %.1fms in %d queries, slowest %.1fms: %s)\n%s",
+            request.method,
+            request.path,
+            elapsed * 1000,
+            stats["time"] * 1000,
+            stats["count"],
+            slowest_time * 1000,
+            _one_line(slowest_query) if slowest_query else "-",
+            "\n".join(f"  {ms}ms  {sql}" for ms, sql in stats["statements"]),
+        )
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+# -----------------------------------
+#  مدة وحالة كل تشغيل للمهام الخلفية
+def timed_job(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            status = "ok"
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                status = "error"
+                raise
+            finally:
+                JOB_DURATION.observe((name,), time.perf_counter() - started)
+                JOB_RUNS.inc((name, status))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,63 @@
+from pathlib import Path
+
+import psycopg2
+
+from db import DB_CONFIG
+
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+
+# -----------------------------------
+#  تشغيل ملفات migrations/*.sql بالترتيب، وكل ملف ينحفظ رقمه في schema_migrations
+def pending_migrations(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version     TEXT PRIMARY KEY,
+            applied_at  TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    applied = {r[0] for r in cursor.fetchall()}
+
+    return [
+        path for path in sorted(MIGRATIONS_DIR.glob("*.sql"))
+        if path.stem not in applied
+    ]
+
+
+def migrate(conn):
+    cursor = conn.cursor()
+
+    # قفل يمنع تشغيل migrate من أكثر من مكان بنفس الوقت
+    cursor.execute("SELECT pg_advisory_lock(hashtext('schema_migrations'))")
+    try:
+        pending = pending_migrations(cursor)
+        conn.commit()
+
+        for path in pending:
+            # كل migration في transaction لحاله
+            cursor.execute(path.read_text(encoding="utf-8"))
+            cursor.execute(
+                "INSERT INTO schema_migrations (version) VALUES (%s)",
+                (path.stem,)
+            )
+            conn.commit()
+            print("applied", path.stem)
+
+        return [path.stem for path in pending]
+    finally:
+        conn.rollback()
+        cursor.execute("SELECT pg_advisory_unlock(hashtext('schema_migrations'))")
+        conn.commit()
+
+
+if __name__ == '__main__':
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        applied = migrate(conn)
+    finally:
+        conn.close()
+
+    if not applied:
+        print("schema is up to date")
@@ -0,0 +1,47 @@
+-- الجداول اللي يعتمد عليها app.py
+-- IF NOT EXISTS عشان القواعد الموجودة من قبل ما تتأثر
+
+CREATE TABLE IF NOT EXISTS employees (
+    employee_id   INTEGER PRIMARY KEY,
+    name          TEXT    NOT NULL,
+    password      TEXT    NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS it_team (
+    employee_id          INTEGER PRIMARY KEY REFERENCES employees (employee_id),
+    specialization       TEXT    NOT NULL,
+    availability_status  TEXT    NOT NULL DEFAULT 'متاح',
+    workload             INTEGER NOT NULL DEFAULT 0,
+    max_load             INTEGER NOT NULL DEFAULT 5
+);
+
+CREATE TABLE IF NOT EXISTS tickets (
+    ticket_id        SERIAL    PRIMARY KEY,
+    employee_id      INTEGER   NOT NULL REFERENCES employees (employee_id),
+    title            TEXT      NOT NULL,
+    description      TEXT,
+    category         TEXT,
+    priority         TEXT,
+    status           TEXT      NOT NULL DEFAULT 'New',
+    created_at       TIMESTAMP NOT NULL DEFAULT NOW(),
+    assigned_to      INTEGER   REFERENCES employees (employee_id),
+    rejected_by      INTEGER   REFERENCES employees (employee_id),
+    rejected_reason  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    message_id    SERIAL    PRIMARY KEY,
+    ticket_id     INTEGER   NOT NULL REFERENCES tickets (ticket_id),
+    sender_id     INTEGER   NOT NULL REFERENCES employees (employee_id),
+    message_text  TEXT      NOT NULL,
+    sent_at       TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id           SERIAL    PRIMARY KEY,
+    receiver_id  INTEGER   NOT NULL REFERENCES employees (employee_id),
+    ticket_id    INTEGER   REFERENCES tickets (ticket_id),
+    message      TEXT      NOT NULL,
+    is_read      BOOLEAN   NOT NULL DEFAULT FALSE,
+    created_at   TIMESTAMP NOT NULL DEFAULT NOW()
+);
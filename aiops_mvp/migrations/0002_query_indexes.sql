@@ -0,0 +1,28 @@
+-- indexes مطابقة لشكل الاستعلامات في app.py و assignment.py
+
+-- my_tickets: WHERE employee_id = ? ORDER BY created_at DESC, ticket_id DESC
+CREATE INDEX IF NOT EXISTS tickets_owner_created_idx
+    ON tickets (employee_id, created_at DESC, ticket_id DESC);
+
+-- dashboard + resolved list: WHERE assigned_to = ? AND status IN (...) ORDER BY created_at DESC, ticket_id DESC
+CREATE INDEX IF NOT EXISTS tickets_assignee_status_created_idx
+    ON tickets (assigned_to, status, created_at DESC, ticket_id DESC);
+
+-- reassign_expired: WHERE status = 'New' AND created_at <= ? ORDER BY created_at
+CREATE INDEX IF NOT EXISTS tickets_new_created_idx
+    ON tickets (created_at)
+    WHERE status = 'New';
+
+-- chat history: WHERE ticket_id = ? ORDER BY sent_at DESC, message_id DESC
+CREATE INDEX IF NOT EXISTS messages_ticket_sent_idx
+    ON messages (ticket_id, sent_at DESC, message_id DESC);
+
+-- get_notifications: WHERE receiver_id = ? AND is_read = FALSE ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS notifications_unread_idx
+    ON notifications (receiver_id, created_at DESC)
+    WHERE is_read = FALSE;
+
+-- capacity index resync + batch assignment: WHERE availability_status = 'متاح'
+CREATE INDEX IF NOT EXISTS it_team_available_idx
+    ON it_team (specialization, workload)
+    WHERE availability_status = 'متاح';
@@ -0,0 +1,21 @@
+-- حوادث الشذوذ في CPU (alerts.py): كل حادثة = قراءات شاذة متقاربة لنفس الجهاز + تذكرة وحدة
+
+-- حساب النظام اللي ترفع باسمه تذاكر المراقبة (كلمة مرور عشوائية = ما أحد يدخل فيه)
+INSERT INTO employees (employee_id, name, password)
+VALUES (0, 'نظام مراقبة CPU', md5(random()::text || clock_timestamp()::text))
+ON CONFLICT (employee_id) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS anomaly_incidents (
+    incident_id   SERIAL            PRIMARY KEY,
+    host          TEXT              NOT NULL,
+    started_at    TIMESTAMP         NOT NULL,
+    last_seen_at  TIMESTAMP         NOT NULL,
+    points        INTEGER           NOT NULL,
+    peak_value    DOUBLE PRECISION,
+    ticket_id     INTEGER           REFERENCES tickets (ticket_id),
+    created_at    TIMESTAMP         NOT NULL DEFAULT NOW()
+);
+
+-- آخر حادثة لكل جهاز: WHERE host = ANY(?) ORDER BY host, last_seen_at DESC
+CREATE INDEX IF NOT EXISTS anomaly_incidents_host_last_idx
+    ON anomaly_incidents (host, last_seen_at DESC);
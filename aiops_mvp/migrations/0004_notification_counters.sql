@@ -0,0 +1,13 @@
+-- عدد التنبيهات غير المقروءة لكل موظف: يتحدّث مع كل إضافة/قراءة بدل COUNT على notifications
+
+CREATE TABLE IF NOT EXISTS notification_counters (
+    receiver_id  INTEGER  PRIMARY KEY REFERENCES employees (employee_id),
+    unread       INTEGER  NOT NULL DEFAULT 0
+);
+
+INSERT INTO notification_counters (receiver_id, unread)
+SELECT receiver_id, COUNT(*)
+FROM notifications
+WHERE is_read = FALSE
+GROUP BY receiver_id
+ON CONFLICT (receiver_id) DO UPDATE SET unread = EXCLUDED.unread;
@@ -0,0 +1,63 @@
+-- notifications مقسّم شهرياً على created_at: الاحتفاظ (retention.py) يحذف/يأرشف شهر كامل بدل DELETE صف صف
+-- النقل مرة وحدة داخل transaction الـ migration (الجدول مقفل لين تخلص)
+
+ALTER TABLE notifications RENAME TO notifications_old;
+ALTER TABLE notifications_old RENAME CONSTRAINT notifications_pkey TO notifications_old_pkey;
+ALTER INDEX IF EXISTS notifications_unread_idx RENAME TO notifications_old_unread_idx;
+
+-- نفس الـ sequence (الـ ids تكمل من حيث وقفت)؛ نفكه من الجدول القديم عشان ما ينحذف معه
+ALTER SEQUENCE notifications_id_seq OWNED BY NONE;
+
+CREATE TABLE notifications (
+    id           INTEGER   NOT NULL DEFAULT nextval('notifications_id_seq'),
+    receiver_id  INTEGER   NOT NULL REFERENCES employees (employee_id),
+    ticket_id    INTEGER   REFERENCES tickets (ticket_id),
+    message      TEXT      NOT NULL,
+    is_read      BOOLEAN   NOT NULL DEFAULT FALSE,
+    created_at   TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE notifications_id_seq OWNED BY notifications.id;
+
+-- أي صف برا الأشهر الموجودة (ساعة السيرفر غلط مثلاً) ينكتب هنا بدل ما يفشل الـ INSERT
+CREATE TABLE notifications_default PARTITION OF notifications DEFAULT;
+
+-- شهر لكل partition من أقدم تنبيه لين شهرين قدام (retention.ensure_partitions يكمل بعدها)
+DO $$
+DECLARE
+    month DATE;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', LEAST(COALESCE(MIN(created_at), NOW()), NOW())),
+            date_trunc('month', NOW()) + INTERVAL '2 months',
+            INTERVAL '1 month'
+        )::date
+        FROM notifications_old
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF notifications FOR VALUES FROM (%L) TO (%L)',
+            'notifications_p' || to_char(month, 'YYYY_MM'),
+            month,
+            (month + INTERVAL '1 month')::date
+        );
+    END LOOP;
+END $$;
+
+INSERT INTO notifications (id, receiver_id, ticket_id, message, is_read, created_at)
+SELECT id, receiver_id, ticket_id, message, is_read, created_at
+FROM notifications_old;
+
+DROP TABLE notifications_old;
+
+-- get_notifications: WHERE receiver_id = ? AND is_read = FALSE ORDER BY created_at DESC
+CREATE INDEX notifications_unread_idx
+    ON notifications (receiver_id, created_at DESC)
+    WHERE is_read = FALSE;
+
+-- حذف تذكرة يفحص notifications بالـ FK؛ بدون index كان Seq Scan على الجدول كله
+CREATE INDEX notifications_ticket_idx
+    ON notifications (ticket_id);
+
+CREATE SCHEMA IF NOT EXISTS archive;
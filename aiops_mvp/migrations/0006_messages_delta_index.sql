@@ -0,0 +1,5 @@
+-- الشات اللحظي يطلب الرسائل بعد آخر message_id شافه المتصفح:
+-- WHERE ticket_id = ? AND message_id > ? ORDER BY message_id
+-- messages_ticket_sent_idx مرتب بـ sent_at فكان يمشي على كل رسائل التذكرة
+CREATE INDEX IF NOT EXISTS messages_ticket_id_idx
+    ON messages (ticket_id, message_id);
@@ -0,0 +1,17 @@
+-- سجل تشغيلات مهام القائد (jobs.JobRunner): مين شغّلها، متى، وكم أخذت
+CREATE TABLE IF NOT EXISTS job_runs (
+    id           BIGSERIAL        PRIMARY KEY,
+    job          TEXT             NOT NULL,
+    runner       TEXT             NOT NULL,
+    started_at   TIMESTAMP        NOT NULL,
+    duration_ms  DOUBLE PRECISION NOT NULL,
+    status       TEXT             NOT NULL,
+    error        TEXT
+);
+
+-- /api/jobs: آخر تشغيلات كل مهمة، والتنظيف اليومي بـ started_at
+CREATE INDEX IF NOT EXISTS job_runs_job_started_idx
+    ON job_runs (job, started_at DESC);
+
+CREATE INDEX IF NOT EXISTS job_runs_started_idx
+    ON job_runs (started_at);
@@ -0,0 +1,32 @@
+-- أي تغيير على عضوية it_team أو التخصص ينشر NOTIFY على قناة roles، فكل worker
+-- يلغي الصلاحية المحفوظة في الـ session لهذا الموظف (auth.py) بدل ما ينتظر ROLE_TTL_SECONDS.
+-- trigger عشان يمسك التعديل من أي مكان (SQL يدوي، seed، أدوات إدارة) مو بس من التطبيق
+
+CREATE OR REPLACE FUNCTION notify_role_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        -- employee_id null = الكل
+        PERFORM pg_notify('roles', json_build_object('employee_id', NULL)::text);
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('roles', json_build_object('employee_id', OLD.employee_id)::text);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND (TG_OP = 'INSERT' OR NEW.employee_id <> OLD.employee_id) THEN
+        PERFORM pg_notify('roles', json_build_object('employee_id', NEW.employee_id)::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- UPDATE OF: تغيّر الحمل (workload) كل شوي وما له علاقة بالصلاحية
+DROP TRIGGER IF EXISTS it_team_role_change ON it_team;
+CREATE TRIGGER it_team_role_change
+    AFTER INSERT OR DELETE OR UPDATE OF employee_id, specialization ON it_team
+    FOR EACH ROW EXECUTE FUNCTION notify_role_change();
+
+DROP TRIGGER IF EXISTS it_team_role_truncate ON it_team;
+CREATE TRIGGER it_team_role_truncate
+    AFTER TRUNCATE ON it_team
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_role_change();
@@ -0,0 +1,15 @@
+-- حالة كل جهاز لـ /api/anomaly/score (anomaly.py): نافذة الـ rolling + آخر النتائج.
+-- بالقاعدة بدل ذاكرة الـ process عشان قراءات الجهاز توصل أي worker وتكمل نفس السلسلة
+CREATE TABLE IF NOT EXISTS anomaly_host_state (
+    host          TEXT       PRIMARY KEY,
+    model         TEXT       NOT NULL,
+    feature_cols  TEXT[]     NOT NULL,
+    state         JSON       NOT NULL,
+    points        BIGINT     NOT NULL,
+    recent        JSON       NOT NULL,
+    updated_at    TIMESTAMP  NOT NULL DEFAULT NOW()
+);
+
+-- تنظيف الأجهزة اللي وقفت ترسل (anomaly.expire_hosts)
+CREATE INDEX IF NOT EXISTS anomaly_host_state_updated_idx
+    ON anomaly_host_state (updated_at);
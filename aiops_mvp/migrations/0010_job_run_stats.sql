@@ -0,0 +1,3 @@
+-- نتيجة التشغيل اللي ترجعها المهمة (مثلاً إعادة التوزيع: كم تذكرة انتهت وتوزعت وكم أخذ القفل)،
+-- عشان /api/jobs يعرضها من أي worker مو بس من ذاكرة القائد
+ALTER TABLE job_runs ADD COLUMN IF NOT EXISTS stats JSON;
@@ -0,0 +1,462 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+from db import DB_CONFIG, PoolTimeout, notify_db, web_db
+
+
+# قناة PostgreSQL اللي تنشر عليها كل التنبيهات (LISTEN/NOTIFY)
+CHANNEL = "notifications"
+
+# كل كم ثانية نرسل keepalive للمتصفح حتى لا ينقطع الاتصال
+KEEPALIVE_SECONDS = 15
+
+# أقصى عدد تنبيهات معلّقة لكل مشترك قبل ما نتجاهل الجديد
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# كم id أخير يتذكره كل stream عشان ما يرسل نفس الحدث مرتين (الـ snapshot + NOTIFY وصل بعده)
+STREAM_SEEN_IDS = 1000
+
+# التنبيهات اللي تجي خلال كذا ms تنكتب بجملة INSERT وحدة
+NOTIFY_FLUSH_MS = float(os.environ.get("NOTIFY_FLUSH_MS", "50"))
+NOTIFY_BATCH_SIZE = int(os.environ.get("NOTIFY_BATCH_SIZE", "500"))
+
+# كم تنبيه غير مقروء نرجّع بالقائمة (العدد الكامل من notification_counters)
+UNREAD_LIST_LIMIT = int(os.environ.get("NOTIFY_UNREAD_LIST_LIMIT", "50"))
+
+# تنبيه الموظف لما تنوزّع عليه تذكرة (من الفورم أو من حوادث الـ CPU في alerts.py)
+ASSIGNED_MESSAGE = "📥 تم تحويل بلاغ جديد لك"
+
+log = logging.getLogger("aiops.notifications")
+
+
+# -----------------------------------
+#  bus داخل الـ process يوزّع التنبيهات على المتصفحات المتصلة
+class NotificationBus:
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, receiver_id, q=None):
+        # q: أي كائن فيه put_nowait (asgi.py يمرر واحد يوصّل للـ event loop)
+        if q is None:
+            q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(receiver_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, receiver_id, q):
+        with self._lock:
+            queues = self._subscribers.get(receiver_id)
+            if queues is None:
+                return
+            queues.discard(q)
+            if not queues:
+                del self._subscribers[receiver_id]
+
+    def publish(self, receiver_id, event):
+        with self._lock:
+            queues = list(self._subscribers.get(receiver_id, ()))
+
+        for q in queues:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # متصفح بطيء: يكفيه الـ snapshot لما يعيد الاتصال
+                pass
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(qs) for qs in self._subscribers.values())
+
+
+bus = NotificationBus()
+
+
+# -----------------------------------
+#  listener واحد لكل process يستقبل NOTIFY من كل الـ workers
+#  key: الحقل اللي يحدد مين يستلم الحدث (الموظف هنا، التذكرة في chat.py)
+class NotificationListener(threading.Thread):
+
+    def __init__(self, bus, channel=CHANNEL, key="receiver_id"):
+        super().__init__(name=f"{channel}-listener", daemon=True)
+        self.bus = bus
+        self.channel = channel
+        self.key = key
+
+    def _connect(self):
+        conn = psycopg2.connect(**DB_CONFIG)
+        conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel}")
+        return conn
+
+    def run(self):
+        # الـ thread لازم يبقى حي: لو مات كل المتصفحات على هذا الـ worker توقف توصلها الأحداث بصمت
+        backoff = 1
+        while True:
+            try:
+                conn = self._connect()
+                backoff = 1
+                self._listen(conn)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                log.warning("%s listener: connection lost, reconnecting in %ss: %s", self.channel, backoff, e)
+            except Exception:
+                log.exception("%s listener failed, reconnecting in %ss", self.channel, backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _listen(self, conn):
+        try:
+            while True:
+                if select.select([conn], [], [], KEEPALIVE_SECONDS) == ([], [], []):
+                    continue
+
+                conn.poll()
+                while conn.notifies:
+                    self._dispatch(conn.notifies.pop(0))
+        finally:
+            conn.close()
+
+    def _dispatch(self, notify):
+        # payload خربان (JSON غلط، مفتاح ناقص، ...) يتسجل ويتجاهل؛ ما يوقف الباقي
+        try:
+            event = json.loads(notify.payload)
+            self.bus.publish(event[self.key], event)
+        except Exception:
+            log.exception("%s listener: bad payload %.200r", self.channel, notify.payload)
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def ensure_listener():
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = NotificationListener(bus)
+                _listener.start()
+
+
+# -----------------------------------
+#  كتابة دفعة تنبيهات بجملة وحدة: INSERT متعدد + تحديث العدادات + NOTIFY لكل تنبيه
+#  (يوصل للمستمعين بعد الـ commit فقط)
+_INSERT_NOTIFICATIONS = """
+    WITH created AS (
+        INSERT INTO notifications (receiver_id, ticket_id, message, is_read, created_at)
+        SELECT receiver_id, ticket_id, message, FALSE, NOW()
+        FROM unnest(%(receivers)s::int[], %(tickets)s::int[], %(messages)s::text[])
+             AS n(receiver_id, ticket_id, message)
+        RETURNING id, receiver_id, ticket_id, message
+    ),
+    counted AS (
+        INSERT INTO notification_counters AS c (receiver_id, unread)
+        SELECT receiver_id, COUNT(*) FROM created GROUP BY receiver_id
+        ON CONFLICT (receiver_id) DO UPDATE SET unread = c.unread + EXCLUDED.unread
+        RETURNING c.receiver_id, c.unread
+    )
+    SELECT id, pg_notify(%(channel)s, json_build_object(
+        'id', id, 'receiver_id', receiver_id, 'ticket_id', ticket_id,
+        'message', message, 'unread', unread
+    )::text)
+    FROM (
+        SELECT created.*, counted.unread
+        FROM created JOIN counted USING (receiver_id)
+        ORDER BY created.id
+    ) n
+"""
+
+
+def write_notifications(cursor, rows):
+    # rows: [(receiver_id, ticket_id, message), ...] — يرجع الـ ids بنفس الترتيب
+    receivers, tickets, messages = zip(*rows)
+    cursor.execute(_INSERT_NOTIFICATIONS, {
+        "receivers": list(receivers),
+        "tickets": list(tickets),
+        "messages": list(messages),
+        "channel": CHANNEL,
+    })
+    return [row[0] for row in cursor.fetchall()]
+
+
+def send_notification(cursor, receiver_id, ticket_id, message):
+    # داخل transaction المستدعي (ينلغى معه لو صار rollback)
+    return write_notifications(cursor, [(receiver_id, ticket_id, message)])[0]
+
+
+# -----------------------------------
+#  كاتب بالخلفية: الـ routes تحط الصف بعد الـ commit وترجع فوراً،
+#  وهو يجمع اللي يوصل خلال flush_ms ويكتبهم دفعة وحدة بـ write(cursor, rows)
+class BatchWriter(threading.Thread):
+
+    def __init__(self, pool, write, name, flush_ms=NOTIFY_FLUSH_MS, batch_size=NOTIFY_BATCH_SIZE):
+        super().__init__(name=name, daemon=True)
+        self.pool = pool
+        self.write = write
+        self.flush_seconds = flush_ms / 1000
+        self.batch_size = batch_size
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self._queue = queue.Queue()
+        self._running = False
+        self._start_lock = threading.Lock()
+
+    def put(self, row):
+        if not self._running:
+            with self._start_lock:
+                if not self._running:
+                    self._running = True
+                    self.start()
+        self._queue.put(row)
+
+    def flush(self):
+        # ينتظر لين ينكتب كل اللي بالطابور
+        if self._running:
+            self._queue.join()
+
+    def close(self, timeout=5):
+        if self._running and self.is_alive():
+            self._queue.put(None)
+            self.join(timeout)
+
+    def run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._write(batch)
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch, attempts=3):
+        for attempt in range(attempts):
+            try:
+                with self.pool.connection() as conn:
+                    self.write(conn.cursor(), batch)
+                    conn.commit()
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout):
+                # الاتصال طاح: نعيد نفس الدفعة (الـ pool يفتح اتصال جديد)
+                log.exception("%s: write failed (attempt %s/%s)", self.name, attempt + 1, attempts)
+                time.sleep(0.2 * 2 ** attempt)
+            except psycopg2.Error:
+                # صف غلط (مثلاً موظف محذوف) ما يضيّع الدفعة كلها: نكتبهم واحد واحد
+                if len(batch) > 1:
+                    for row in batch:
+                        self._write([row], attempts=1)
+                    return
+                log.exception("%s: dropped %r", self.name, batch[0])
+                break
+            except Exception:
+                # أي خطأ ثاني (مثلاً صف بشكل غلط) ما يوقف الـ thread؛ بدونه الطابور يتكدس للأبد
+                log.exception("%s: dropped %s rows", self.name, len(batch))
+                break
+
+        self.dropped += len(batch)
+
+
+class NotificationWriter(BatchWriter):
+
+    def __init__(self, pool, flush_ms=NOTIFY_FLUSH_MS, batch_size=NOTIFY_BATCH_SIZE):
+        super().__init__(pool, write_notifications, "notification-writer", flush_ms, batch_size)
+
+    def send(self, receiver_id, ticket_id, message):
+        self.put((receiver_id, ticket_id, message))
+
+
+notifier = NotificationWriter(notify_db)
+
+# التنبيهات اللي بالطابور تنكتب قبل ما يطلع الـ process
+atexit.register(notifier.close)
+
+
+# -----------------------------------
+#  القراءة: قائمة محدودة + العدد من notification_counters (بدون COUNT)
+def fetch_unread(cursor, receiver_id, limit=UNREAD_LIST_LIMIT):
+    cursor.execute("""
+        SELECT id, ticket_id, message
+        FROM notifications
+        WHERE receiver_id=%s AND is_read=FALSE
+        ORDER BY created_at DESC
+        LIMIT %s
+    """, (receiver_id, limit))
+
+    return cursor.fetchall()
+
+
+def unread_count(cursor, receiver_id):
+    cursor.execute("SELECT unread FROM notification_counters WHERE receiver_id=%s", (receiver_id,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def mark_read(cursor, receiver_id, ids=(), up_to=None):
+    # ids: تنبيهات محددة، up_to: كل التنبيهات لين هذا الـ id — بجملة وحدة مع العداد
+    cursor.execute("""
+        WITH marked AS (
+            UPDATE notifications
+            SET is_read = TRUE
+            WHERE receiver_id = %(receiver)s
+              AND is_read = FALSE
+              AND (id = ANY(%(ids)s) OR id <= %(up_to)s)
+            RETURNING id
+        )
+        INSERT INTO notification_counters AS c (receiver_id, unread)
+        VALUES (%(receiver)s, 0)
+        ON CONFLICT (receiver_id) DO UPDATE
+            SET unread = GREATEST(c.unread - (SELECT COUNT(*) FROM marked), 0)
+        RETURNING (SELECT COUNT(*) FROM marked), c.unread
+    """, {"receiver": receiver_id, "ids": list(ids), "up_to": up_to})
+
+    marked, unread = cursor.fetchone()
+    return {"marked": marked, "unread": unread}
+
+
+def rebuild_unread_counters(cursor):
+    # إعادة بناء العدادات من الصفر (بعد seed أو تعديل يدوي على notifications)
+    cursor.execute("""
+        WITH actual AS (
+            SELECT receiver_id, COUNT(*) AS unread
+            FROM notifications
+            WHERE is_read = FALSE
+            GROUP BY receiver_id
+        ),
+        cleared AS (
+            UPDATE notification_counters c
+            SET unread = 0
+            WHERE unread <> 0
+              AND NOT EXISTS (SELECT 1 FROM actual a WHERE a.receiver_id = c.receiver_id)
+        )
+        INSERT INTO notification_counters AS c (receiver_id, unread)
+        SELECT receiver_id, unread FROM actual
+        ON CONFLICT (receiver_id) DO UPDATE SET unread = EXCLUDED.unread
+    """)
+
+
+# -----------------------------------
+#  Server-Sent Events: snapshot واحد عند الاتصال ثم push فقط
+def _sse(event, data, event_id=None):
+    # event_id: المتصفح يرجّعه بـ Last-Event-ID إذا انقطع الاتصال ورجع
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class RecentIds:
+    # set محدود: آخر maxlen id بس (الـ stream يعيش ساعات، فالـ set العادي يكبر بلا حد).
+    # مو high-water id لأن الـ commits من workers مختلفة ممكن توصل بغير ترتيب الـ id
+
+    def __init__(self, ids=(), maxlen=STREAM_SEEN_IDS):
+        self._order = deque(maxlen=maxlen)
+        self._ids = set()
+        for event_id in ids:
+            self.add(event_id)
+
+    def __contains__(self, event_id):
+        return event_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, event_id):
+        if event_id in self._ids:
+            return
+        if len(self._order) == self._order.maxlen:
+            self._ids.discard(self._order[0])
+        self._order.append(event_id)
+        self._ids.add(event_id)
+
+
+# منطق كل stream بكلاس: start (قراءة من القاعدة عند الاتصال) و render (حدث من الـ bus -> chunk)
+# run_stream يشغّله بـ thread (Flask)، و asgi.py يشغّل نفس الكلاس بدون thread لكل اتصال
+class NotificationStream:
+
+    def __init__(self, receiver_id):
+        self.bus = bus
+        self.key = receiver_id
+        self.done = False
+        self.seen = RecentIds()
+
+    def listen(self):
+        ensure_listener()
+
+    def start(self):
+        # اتصال قصير من الـ pool؛ ما نمسكه طول مدة الـ stream
+        with web_db.connection() as conn:
+            cursor = conn.cursor()
+            unread = fetch_unread(cursor, self.key)
+            count = unread_count(cursor, self.key)
+            conn.rollback()
+
+        self.seen = RecentIds(row[0] for row in unread)
+        return [_sse("snapshot", {
+            "count": count,
+            "notifications": [list(row) for row in unread],
+        })]
+
+    def render(self, event):
+        if event["id"] in self.seen:
+            return None
+        self.seen.add(event["id"])
+
+        # العنصر الرابع = عدد غير المقروء بعد هذا التنبيه
+        return _sse("notification", [event["id"], event["ticket_id"], event["message"], event.get("unread")])
+
+
+def run_stream(stream):
+    stream.listen()
+
+    # نشترك قبل start حتى ما يضيع أي حدث بينهم
+    q = stream.bus.subscribe(stream.key)
+    try:
+        yield from stream.start()
+
+        while not stream.done:
+            try:
+                event = q.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+
+            chunk = stream.render(event)
+            if chunk:
+                yield chunk
+    finally:
+        stream.bus.unsubscribe(stream.key, q)
+
+
+def stream_notifications(receiver_id):
+    return run_stream(NotificationStream(receiver_id))
@@ -0,0 +1,48 @@
+import os
+from datetime import datetime
+
+
+# عدد العناصر في الصفحة الأولى وفي كل "عرض المزيد"
+PAGE_SIZE = int(os.environ.get("PAGE_SIZE", "20"))
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# -----------------------------------
+#  keyset pagination: الـ cursor هو (الوقت، المعرّف) لآخر عنصر ظهر
+def encode_cursor(ts, row_id):
+    return f"{ts.isoformat()}_{row_id}"
+
+
+def decode_cursor(value):
+    # None بس لما ما فيه cursor (الصفحة الأولى)؛ cursor خربان خطأ، وإلا العميل يلف على الصفحة الأولى للأبد
+    if not value:
+        return None
+
+    try:
+        ts, row_id = value.rsplit("_", 1)
+        return datetime.fromisoformat(ts), int(row_id)
+    except ValueError:
+        raise InvalidCursor(f"invalid cursor: {value!r}") from None
+
+
+def page_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return PAGE_SIZE
+
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def split_page(rows, limit, ts_index, id_index):
+    # نجيب limit + 1 صف؛ وجود الصف الزايد يعني فيه صفحة بعدها
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[ts_index], last[id_index])
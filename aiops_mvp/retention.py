@@ -0,0 +1,249 @@
+import argparse
+import os
+import re
+from datetime import date, datetime, timedelta
+
+import psycopg2
+from psycopg2 import errors, sql
+
+
+# التنبيهات المقروءة تنشال بعد كذا يوم، وغير المقروءة (تذاكر قديمة ما أحد فتحها) بعد كذا
+NOTIFY_READ_RETENTION_DAYS = int(os.environ.get("NOTIFY_READ_RETENTION_DAYS", "90"))
+NOTIFY_UNREAD_RETENTION_DAYS = int(os.environ.get("NOTIFY_UNREAD_RETENTION_DAYS", "365"))
+
+# drop = حذف الـ partition، archive = فصله ونقله لـ schema archive (يبقى للتقارير)
+RETENTION_MODE = os.environ.get("RETENTION_MODE", "drop")
+ARCHIVE_SCHEMA = os.environ.get("RETENTION_ARCHIVE_SCHEMA", "archive")
+
+# كم شهر قدام نجهّز partitions
+PARTITION_MONTHS_AHEAD = int(os.environ.get("NOTIFY_PARTITION_MONTHS_AHEAD", "2"))
+
+# كل كم ساعة تشتغل المهمة في app.py
+RETENTION_INTERVAL_HOURS = float(os.environ.get("RETENTION_INTERVAL_HOURS", "6"))
+
+# حذف/فصل partition يقفل الجدول الأب؛ إذا ما حصلنا القفل بسرعة نخليه للمرة الجاية بدل ما نوقف الطلبات
+RETENTION_LOCK_TIMEOUT = os.environ.get("RETENTION_LOCK_TIMEOUT", "2s")
+
+PARENT = "notifications"
+_PARTITION_NAME = re.compile(r"^notifications_p(\d{4})_(\d{2})$")
+
+
+def _month(d):
+    return date(d.year, d.month, 1)
+
+
+def _next_month(d):
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT}_p{month:%Y_%m}"
+
+
+def partitions(cursor):
+    # [(الاسم, أول الشهر, أول الشهر اللي بعده)] مرتبة؛ الـ default ما يدخل
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (PARENT,))
+
+    result = []
+    for (name,) in cursor.fetchall():
+        match = _PARTITION_NAME.match(name)
+        if match:
+            month = date(int(match.group(1)), int(match.group(2)), 1)
+            result.append((name, month, _next_month(month)))
+    return sorted(result, key=lambda p: p[1])
+
+
+# -----------------------------------
+#  partitions للأشهر الجاية (وأي شهر قديم نحتاجه، مثلاً seed)
+def ensure_partitions(cursor, start=None, months_ahead=PARTITION_MONTHS_AHEAD):
+    existing = {p[0] for p in partitions(cursor)}
+    month = _month(start or date.today())
+    last = _month(date.today())
+    for _ in range(months_ahead):
+        last = _next_month(last)
+
+    months = set()
+    while month <= last:
+        months.add(month)
+        month = _next_month(month)
+
+    # أي شهر نزل بالـ default (برا المدى) ياخذ partition هو بعد
+    cursor.execute("SELECT DISTINCT date_trunc('month', created_at)::date FROM notifications_default")
+    months.update(row[0] for row in cursor.fetchall())
+
+    created = []
+    for month in sorted(months):
+        name = partition_name(month)
+        if name not in existing:
+            _create_partition(cursor, name, month, _next_month(month))
+            created.append(name)
+    return created
+
+
+def _create_partition(cursor, name, lo, hi):
+    # صفوف الشهر اللي نزلت بالـ default (قبل ما يكون له partition) لازم تطلع قبل، وإلا CREATE يفشل
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS _moved_notifications
+            (LIKE notifications) ON COMMIT DROP
+    """)
+    cursor.execute("""
+        WITH moved AS (
+            DELETE FROM notifications_default
+            WHERE created_at >= %s AND created_at < %s
+            RETURNING *
+        )
+        INSERT INTO _moved_notifications SELECT * FROM moved
+    """, (lo, hi))
+
+    cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+        sql.Identifier(name), sql.Identifier(PARENT)
+    ), (lo, hi))
+
+    cursor.execute("INSERT INTO notifications SELECT * FROM _moved_notifications")
+    cursor.execute("TRUNCATE _moved_notifications")
+
+
+# -----------------------------------
+#  الاحتفاظ: الشهر اللي كله مقروء وأقدم من الحد ينشال كامل (DROP/DETACH بدون DELETE)
+def expire_partitions(conn, today=None, read_days=NOTIFY_READ_RETENTION_DAYS,
+                      unread_days=NOTIFY_UNREAD_RETENTION_DAYS, mode=RETENTION_MODE):
+    today = today or date.today()
+    read_cutoff = today - timedelta(days=read_days)
+    unread_cutoff = today - timedelta(days=unread_days)
+    cursor = conn.cursor()
+
+    stats = {"dropped": [], "archived": [], "purged_read": 0, "skipped_locked": []}
+    for name, _, hi in partitions(cursor):
+        if hi > read_cutoff:
+            break
+        table = sql.Identifier(name)
+
+        try:
+            cursor.execute("SET LOCAL lock_timeout = %s", (RETENTION_LOCK_TIMEOUT,))
+            cursor.execute(sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(table))
+
+            if hi > unread_cutoff:
+                cursor.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {} WHERE is_read = FALSE)").format(table))
+                if cursor.fetchone()[0]:
+                    # فيه غير مقروء لسا ضمن المدة: نحذف المقروء بس والباقي يستنى unread_cutoff
+                    cursor.execute(sql.SQL("DELETE FROM {} WHERE is_read = TRUE").format(table))
+                    stats["purged_read"] += cursor.rowcount
+                    conn.commit()
+                    continue
+
+            # غير المقروء اللي بيروح مع الشهر ينقص من العدادات
+            cursor.execute(sql.SQL("""
+                UPDATE notification_counters c
+                SET unread = GREATEST(c.unread - d.n, 0)
+                FROM (
+                    SELECT receiver_id, COUNT(*) AS n
+                    FROM {}
+                    WHERE is_read = FALSE
+                    GROUP BY receiver_id
+                ) d
+                WHERE c.receiver_id = d.receiver_id
+            """).format(table))
+
+            if mode == "archive":
+                cursor.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(sql.Identifier(PARENT), table))
+                cursor.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(ARCHIVE_SCHEMA)))
+                cursor.execute(sql.SQL("ALTER TABLE {} SET SCHEMA {}").format(table, sql.Identifier(ARCHIVE_SCHEMA)))
+                stats["archived"].append(name)
+            else:
+                cursor.execute(sql.SQL("DROP TABLE {}").format(table))
+                stats["dropped"].append(name)
+            conn.commit()
+
+        except errors.LockNotAvailable:
+            conn.rollback()
+            stats["skipped_locked"].append(name)
+
+    return stats
+
+
+# -----------------------------------
+#  ضغط التكرار: نفس التنبيه (نفس المستلم + التذكرة + النص) غير مقروء أكثر من مرة
+#  يبقى الأحدث بس (مثلاً 20 "رسالة جديدة من فلان" على نفس التذكرة)
+def compact_unread(cursor):
+    cursor.execute("""
+        WITH dupes AS (
+            SELECT id, created_at
+            FROM (
+                SELECT
+                    id, created_at,
+                    row_number() OVER (
+                        PARTITION BY receiver_id, ticket_id, message
+                        ORDER BY created_at DESC, id DESC
+                    ) AS rn
+                FROM notifications
+                WHERE is_read = FALSE AND ticket_id IS NOT NULL
+            ) s
+            WHERE rn > 1
+        ),
+        deleted AS (
+            DELETE FROM notifications n
+            USING dupes d
+            WHERE n.id = d.id
+              AND n.created_at = d.created_at
+              AND n.is_read = FALSE
+            RETURNING n.receiver_id
+        ),
+        counts AS (
+            SELECT receiver_id, COUNT(*) AS n FROM deleted GROUP BY receiver_id
+        ),
+        counted AS (
+            UPDATE notification_counters c
+            SET unread = GREATEST(c.unread - counts.n, 0)
+            FROM counts
+            WHERE c.receiver_id = counts.receiver_id
+        )
+        SELECT COALESCE(SUM(n), 0) FROM counts
+    """)
+    return int(cursor.fetchone()[0])
+
+
+# -----------------------------------
+#  المهمة كاملة؛ تشتغل عند قائد الـ scheduler (jobs.py)، والقفل يمنع تداخلها مع تشغيل يدوي (CLI)
+def run_retention(conn, today=None, mode=RETENTION_MODE):
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_lock(hashtext('notifications_retention'))")
+    if not cursor.fetchone()[0]:
+        conn.rollback()
+        return None
+
+    try:
+        created = ensure_partitions(cursor)
+        conn.commit()
+
+        compacted = compact_unread(cursor)
+        conn.commit()
+
+        stats = expire_partitions(conn, today=today, mode=mode)
+        stats["created"] = created
+        stats["compacted"] = compacted
+        return stats
+    finally:
+        conn.rollback()
+        cursor.execute("SELECT pg_advisory_unlock(hashtext('notifications_retention'))")
+        conn.commit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Create, compact and expire notification partitions")
+    parser.add_argument("--mode", choices=("drop", "archive"), default=RETENTION_MODE)
+    parser.add_argument("--today", type=lambda s: datetime.strptime(s, "%Y-%m-%d").date(),
+                        help="pretend it is this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    from db import DB_CONFIG
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        print(run_retention(conn, today=args.today, mode=args.mode))
+    finally:
+        conn.close()
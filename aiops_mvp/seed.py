@@ -0,0 +1,161 @@
+import argparse
+from datetime import date, timedelta
+
+import psycopg2
+
+from db import DB_CONFIG
+from notifications import rebuild_unread_counters
+from retention import ensure_partitions
+
+
+CATEGORIES = ["Software", "Hardware", "Network", "Data Science", "Cloud Computing", "Other"]
+PRIORITIES = ["Low", "Medium", "High"]
+
+# كلمة المرور لكل الموظفين الوهميين (يستخدمها الـ benchmark لتسجيل الدخول)
+SEED_PASSWORD = "password"
+
+
+# -----------------------------------
+#  بيانات وهمية بأحجام قابلة للتعديل لاختبار الأداء و EXPLAIN
+#  الموظفين 1..it_staff هم فريق الـ IT والباقي موظفين عاديين
+def seed(conn, employees=20000, it_staff=200, tickets=200000, messages=500000,
+         notifications=500000, seed_value=0.42):
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT setseed(%s)", (seed_value,))
+    cursor.execute("""
+        TRUNCATE notifications, messages, tickets, it_team, employees
+        RESTART IDENTITY CASCADE
+    """)
+
+    cursor.execute("""
+        INSERT INTO employees (employee_id, name, password)
+        SELECT g, 'Employee ' || g, %s
+        FROM generate_series(1, %s) g
+    """, (SEED_PASSWORD, employees))
+
+    # الـ TRUNCATE يمسح حساب النظام (migrations/0003) اللي ترفع باسمه تذاكر المراقبة
+    cursor.execute("""
+        INSERT INTO employees (employee_id, name, password)
+        VALUES (0, 'نظام مراقبة CPU', md5(random()::text || clock_timestamp()::text))
+    """)
+
+    cursor.execute("""
+        INSERT INTO it_team (employee_id, specialization, availability_status, workload, max_load)
+        SELECT 
+            g,
+            (%(categories)s::text[])[1 + g %% cardinality(%(categories)s::text[])],
+            CASE WHEN g %% 10 = 0 THEN 'غير متاح' ELSE 'متاح' END,
+            0,
+            5
+        FROM generate_series(1, %(it_staff)s) g
+    """, {"categories": CATEGORIES, "it_staff": it_staff})
+
+    # تذاكر آخر 3 أيام مفتوحة (New / In Progress)، والأقدم منها محلولة أو مرفوضة
+    cursor.execute("""
+        INSERT INTO tickets 
+            (employee_id, title, description, category, priority, status, created_at, assigned_to)
+        SELECT 
+            %(it_staff)s + 1 + (g %% (%(employees)s - %(it_staff)s)),
+            'Ticket ' || g,
+            'Seeded ticket ' || g,
+            (%(categories)s::text[])[1 + g %% cardinality(%(categories)s::text[])],
+            (%(priorities)s::text[])[1 + g %% cardinality(%(priorities)s::text[])],
+            CASE 
+                WHEN age < INTERVAL '3 days' AND r < 0.5 THEN 'New'
+                WHEN age < INTERVAL '3 days' THEN 'In Progress'
+                WHEN r < 0.15 THEN 'Rejected'
+                ELSE 'Resolved'
+            END,
+            NOW() - age,
+            1 + (g %% %(it_staff)s)
+        FROM (
+            SELECT g, random() AS r, random() * INTERVAL '365 days' AS age
+            FROM generate_series(1, %(tickets)s) g
+        ) s
+    """, {
+        "categories": CATEGORIES,
+        "priorities": PRIORITIES,
+        "employees": employees,
+        "it_staff": it_staff,
+        "tickets": tickets,
+    })
+
+    cursor.execute("""
+        INSERT INTO messages (ticket_id, sender_id, message_text, sent_at)
+        SELECT 
+            t.ticket_id,
+            CASE WHEN g %% 2 = 0 THEN t.employee_id ELSE t.assigned_to END,
+            'Seeded message ' || g,
+            t.created_at + (g %% 500) * INTERVAL '1 minute'
+        FROM generate_series(1, %s) g
+        JOIN tickets t ON t.ticket_id = 1 + (g %% %s)
+    """, (messages, tickets))
+
+    # notifications مقسّم شهرياً: نجهّز أشهر السنة اللي فاتت قبل الإدخال
+    ensure_partitions(cursor, start=date.today() - timedelta(days=366))
+
+    # 10% من التنبيهات غير مقروءة
+    cursor.execute("""
+        INSERT INTO notifications (receiver_id, ticket_id, message, is_read, created_at)
+        SELECT 
+            t.employee_id,
+            t.ticket_id,
+            'Seeded notification ' || g,
+            g %% 10 <> 0,
+            t.created_at + (g %% 500) * INTERVAL '1 minute'
+        FROM generate_series(1, %s) g
+        JOIN tickets t ON t.ticket_id = 1 + (g %% %s)
+    """, (notifications, tickets))
+    rebuild_unread_counters(cursor)
+
+    # الحمل الحالي لكل موظف = تذاكره المفتوحة، مع سعة فاضية للتوزيع
+    cursor.execute("""
+        UPDATE it_team it
+        SET workload = c.n,
+            max_load = c.n + 5
+        FROM (
+            SELECT assigned_to, COUNT(*) AS n
+            FROM tickets
+            WHERE status IN ('New', 'In Progress')
+            GROUP BY assigned_to
+        ) c
+        WHERE it.employee_id = c.assigned_to
+    """)
+
+    conn.commit()
+
+    conn.autocommit = True
+    cursor.execute("ANALYZE")
+    conn.autocommit = False
+
+
+def add_arguments(parser):
+    parser.add_argument("--employees", type=int, default=20000)
+    parser.add_argument("--it-staff", type=int, default=200)
+    parser.add_argument("--tickets", type=int, default=200000)
+    parser.add_argument("--messages", type=int, default=500000)
+    parser.add_argument("--notifications", type=int, default=500000)
+
+
+def seed_from_args(conn, args):
+    seed(
+        conn,
+        employees=args.employees,
+        it_staff=args.it_staff,
+        tickets=args.tickets,
+        messages=args.messages,
+        notifications=args.notifications,
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Seed the tickets database with synthetic data")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        seed_from_args(conn, args)
+    finally:
+        conn.close()
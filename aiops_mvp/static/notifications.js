@@ -0,0 +1,123 @@
+// جرس التنبيهات المشترك بين الصفحات: SSE من /notifications/stream،
+// والـ polling فقط للمتصفحات اللي ما تدعمها
+document.addEventListener("DOMContentLoaded", function () {
+
+    const bell       = document.getElementById("notifBell");
+    const dropdown   = document.getElementById("notifDropdown");
+    const notifList  = document.getElementById("notifList");
+    const notifCount = document.getElementById("notifCount");
+
+    if (!bell || !dropdown || !notifList || !notifCount) {
+        console.error("أحد عناصر التنبيهات غير موجود في الصفحة");
+        return;
+    }
+
+    bell.addEventListener("click", function (e) {
+        e.stopPropagation();
+        dropdown.style.display = (dropdown.style.display === "block") ? "none" : "block";
+    });
+
+    document.addEventListener("click", function () {
+        dropdown.style.display = "none";
+    });
+
+    let items = [];
+    let unread = 0;   // العدد الكامل من السيرفر (القائمة فيها آخر التنبيهات بس)
+
+    // تنبيهات لحظية عبر SSE، والـ polling فقط للمتصفحات اللي ما تدعمها
+    if (window.EventSource) {
+        const stream = new EventSource("/notifications/stream");
+
+        stream.addEventListener("snapshot", e => {
+            const data = JSON.parse(e.data);
+            items = data.notifications;
+            unread = data.count;
+            renderNotifications();
+        });
+
+        stream.addEventListener("notification", e => {
+            const n = JSON.parse(e.data);
+            unread = (n[3] != null) ? n[3] : unread + 1;
+            items.unshift(n);
+            renderNotifications();
+        });
+    } else {
+        loadNotifications();
+        setInterval(loadNotifications, 5000);
+    }
+
+    function loadNotifications() {
+        fetch("/get_notifications")
+            .then(res => res.json())
+            .then(data => {
+                items = data.notifications;
+                unread = data.count;
+                renderNotifications();
+            });
+    }
+
+    // قراءة تنبيه أو أكثر بطلب واحد؛ keepalive عشان يكمل حتى لو انتقلنا لصفحة ثانية
+    function markRead(body) {
+        return fetch("/notifications/mark_read", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify(body),
+            keepalive: true
+        })
+            .then(res => res.json())
+            .then(data => {
+                unread = data.unread;
+                renderNotifications();
+            });
+    }
+
+    function renderNotifications() {
+        notifList.innerHTML = "";
+
+        if (unread > 0) {
+            notifCount.style.display = "inline-block";
+            notifCount.innerText = unread;
+        } else {
+            notifCount.style.display = "none";
+        }
+
+        if (items.length === 0) {
+            notifList.innerHTML = "<p>لا توجد تنبيهات</p>";
+            return;
+        }
+
+        if (items.length > 1) {
+            let readAll = document.createElement("div");
+            readAll.className = "notif-item";
+            readAll.innerText = "✔️ تحديد الكل كمقروء";
+
+            readAll.onclick = e => {
+                e.stopPropagation();
+                const upTo = Math.max(...items.map(n => n[0]));
+                items = [];
+                markRead({ up_to: upTo });
+            };
+
+            notifList.appendChild(readAll);
+        }
+
+        items.forEach(n => {
+            let notifId  = n[0];
+            let ticketId = n[1];
+            let message  = n[2];
+
+            if (!ticketId) return;
+
+            let div = document.createElement("div");
+            div.className = "notif-item";
+            div.innerText = message;
+
+            div.onclick = () => {
+                markRead({ ids: [notifId] });
+                window.location.href = `/chat/${ticketId}`;
+            };
+
+            notifList.appendChild(div);
+        });
+    }
+});
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# الـ modules تستورد بعض بأسمائها (مثل تشغيلها من aiops_mvp)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
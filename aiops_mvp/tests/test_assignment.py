@@ -0,0 +1,47 @@
+from assignment import CapacityIndex
+
+
+def _index(rows):
+    index = CapacityIndex()
+    index.load(rows)
+    return index
+
+
+def test_pick_skips_full_least_loaded_agent():
+    # الأقل حملاً (1) ممتلئ بسعته (1)، والثاني حمله أكبر بس عنده مكان
+    index = _index([
+        (1, "Network", 1, 1),
+        (2, "Network", 3, 5),
+    ])
+    assert index.pick("Network") == 2
+
+
+def test_pick_returns_none_when_all_full():
+    index = _index([
+        (1, "Network", 2, 2),
+        (2, "Network", 5, 5),
+    ])
+    assert index.pick("Network") is None
+
+
+def test_agent_that_fills_up_is_skipped_and_returns_on_release():
+    index = _index([
+        (1, "Network", 0, 1),
+        (2, "Network", 2, 5),
+    ])
+    assert index.pick("Network") == 1
+
+    index.set_workload(1, 1)
+    assert index.pick("Network") == 2
+
+    index.set_workload(1, 0)
+    assert index.pick("Network") == 1
+
+
+def test_lower_max_load_marks_agent_full():
+    index = _index([
+        (1, "Network", 1, 5),
+        (2, "Network", 2, 5),
+    ])
+    index.set_workload(1, 1, max_load=1)
+    assert index.pick("Network") == 2
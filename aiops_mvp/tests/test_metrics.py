@@ -0,0 +1,57 @@
+import pytest
+from flask import Flask
+
+import metrics
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/ok')
+    def ok():
+        return "ok"
+
+    @app.route('/boom')
+    def boom():
+        raise RuntimeError("boom")
+
+    return app
+
+
+def _count(route, status):
+    return metrics.REQUESTS._values.get((route, "GET", status), 0)
+
+
+def test_success_is_counted(app):
+    before = _count("/ok", "200")
+    response = app.test_client().get('/ok')
+    assert response.status_code == 200
+    assert "X-Query-Count" in response.headers
+    assert _count("/ok", "200") == before + 1
+
+
+@pytest.mark.parametrize("propagate", [False, True])
+def test_unhandled_error_is_counted(app, propagate):
+    # propagate=True مثل debug: Flask ما ينفذ after_request أبداً
+    app.config["PROPAGATE_EXCEPTIONS"] = propagate
+    before = _count("/boom", "500")
+
+    if propagate:
+        with pytest.raises(RuntimeError):
+            app.test_client().get('/boom')
+    else:
+        assert app.test_client().get('/boom').status_code == 500
+
+    assert _count("/boom", "500") == before + 1
+
+
+def test_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "s3cret")
+    assert metrics.token_ok("Bearer s3cret")
+    assert not metrics.token_ok("Bearer nope")
+    assert not metrics.token_ok(None)
+
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "")
+    assert not metrics.token_ok("Bearer ")
@@ -0,0 +1,22 @@
+from notifications import RecentIds
+
+
+def test_recent_ids_remembers_seeded_and_added():
+    seen = RecentIds([1, 2])
+    seen.add(5)
+    assert 1 in seen and 5 in seen and 3 not in seen
+
+
+def test_recent_ids_is_bounded():
+    seen = RecentIds(maxlen=3)
+    for event_id in range(10):
+        seen.add(event_id)
+    assert len(seen) == 3
+    assert 6 not in seen and 9 in seen
+
+
+def test_recent_ids_ignores_repeats():
+    seen = RecentIds(maxlen=2)
+    for event_id in (1, 1, 1, 2):
+        seen.add(event_id)
+    assert 1 in seen and 2 in seen
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+import pytest
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+def test_round_trip():
+    ts = datetime(2026, 3, 1, 12, 30, 5, 123456)
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
+
+
+@pytest.mark.parametrize("value", [None, ""])
+def test_missing_cursor_is_first_page(value):
+    assert decode_cursor(value) is None
+
+
+@pytest.mark.parametrize("value", ["garbage", "2026-03-01T12:30:05_x", "nope_42", "_42"])
+def test_malformed_cursor_raises(value):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(value)